@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from eews_analysis.schema import LIST_FIELDS, MISSING_VALUES, explode_field
+
+# Aggregations shared by all charts. Every column is turned into string
+# labels once (missing answers dropped, list answers exploded), and the
+# sample sizes, value counts and path crosstabs the charts need are computed
+# from those labels and memoized. Row subsets (e.g. an event window) reuse
+# the parent's labels instead of re-filtering the frame. No plotly here, so
+# the tables can be checked and timed on their own.
+
+MISSING_LABELS = MISSING_VALUES + ('nan', 'None')
+
+
+def _format_label(value):
+    # Typed numeric answers (e.g. MMI 5.0) should still label as "5".
+    if isinstance(value, (float, np.floating)):
+        return f"{value:g}"
+    return str(value)
+
+
+def _label_values(series):
+    # Factorize first so each distinct value is formatted once, not each row.
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    labels = np.array([_format_label(value) for value in uniques] + [None], dtype=object)
+    labels[np.isin(labels, MISSING_LABELS)] = None
+    return pd.Series(labels[codes], index=series.index, name=series.name)
+
+
+def _has_lists(series):
+    return series.dtype == object and series.map(lambda value: isinstance(value, list)).any()
+
+
+def column_labels(series):
+    name = series.name
+    if name in LIST_FIELDS:
+        labels = explode_field(series, name).astype(str)
+    elif _has_lists(series):
+        labels = _label_values(series.explode())
+    else:
+        labels = _label_values(series)
+    return labels[labels.notna()].rename(name)
+
+
+class AggregationCube:
+    def __init__(self, df, parent=None):
+        self.df = df
+        self._parent = parent
+        self._labels = {}
+        self._value_counts = {}
+        self._path_counts = {}
+        self._numeric = {}
+        self._subsets = {}
+
+    def labels(self, column):
+        if column not in self._labels:
+            if self._parent is not None:
+                parent_labels = self._parent.labels(column)
+                self._labels[column] = parent_labels[parent_labels.index.isin(self.df.index)]
+            else:
+                self._labels[column] = column_labels(self.df[column])
+        return self._labels[column]
+
+    def sample_size(self, column):
+        return len(self.labels(column))
+
+    def row_count(self, column):
+        # Posts with at least one valid answer (differs from sample_size for list fields).
+        return self.labels(column).index.nunique()
+
+    def value_counts(self, column):
+        if column not in self._value_counts:
+            self._value_counts[column] = self.labels(column).value_counts()
+        return self._value_counts[column]
+
+    def path_counts(self, path):
+        key = tuple(path)
+        if key not in self._path_counts:
+            frame = self.labels(path[0]).to_frame()
+            for column in path[1:]:
+                frame = frame.merge(self.labels(column).to_frame(), left_index=True, right_index=True)
+            self._path_counts[key] = frame.groupby(list(path), sort=True).size().reset_index(name='count')
+        return self._path_counts[key]
+
+    def numeric(self, column):
+        if column not in self._numeric:
+            self._numeric[column] = pd.to_numeric(self.df[column], errors='coerce').dropna()
+        return self._numeric[column]
+
+    def subset(self, name, mask):
+        if name not in self._subsets:
+            self._subsets[name] = AggregationCube(self.df[mask], parent=self)
+        return self._subsets[name]
+
+    def take(self, name, positions):
+        # Small row slices (event windows) label their own rows: cheaper than
+        # matching the parent's labels against the slice's index.
+        if name not in self._subsets:
+            self._subsets[name] = AggregationCube(self.df.iloc[positions])
+        return self._subsets[name]
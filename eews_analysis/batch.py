@@ -0,0 +1,163 @@
+import json
+import os
+import time
+
+from vertexai.batch_prediction import BatchPredictionJob
+
+from eews_analysis import config
+from eews_analysis.checkpoint import new_run_id
+from eews_analysis.prompts import (
+    PROMPT_INSTRUCTION, EXAMPLE_1_URI, EXAMPLE_1_OUTPUT, EXAMPLE_2_URI, EXAMPLE_2_OUTPUT, SAFETY_CATEGORIES,
+    generation_settings
+)
+from eews_analysis.repair import parse_response
+
+# Offline extraction through batch prediction: every pending screenshot
+# becomes one line of a JSONL request file, a backend runs the job, and the
+# JSONL predictions are parsed back with the same cleaning as online mode.
+
+RUNNING = "RUNNING"
+SUCCEEDED = "SUCCEEDED"
+FAILED = "FAILED"
+
+
+def gcs_uri(path):
+    return f"gs://{config.BUCKET}/{path}"
+
+
+def blob_path(uri):
+    return uri[len(f"gs://{config.BUCKET}/"):]
+
+
+def _file_part(uri):
+    return {"fileData": {"fileUri": uri, "mimeType": "image/png"}}
+
+
+def _camel_case(key):
+    first, *rest = key.split("_")
+    return first + "".join(word.title() for word in rest)
+
+
+def build_request(image_uri):
+    parts = [
+        {"text": PROMPT_INSTRUCTION},
+        _file_part(EXAMPLE_1_URI),
+        {"text": EXAMPLE_1_OUTPUT},
+        _file_part(EXAMPLE_2_URI),
+        {"text": EXAMPLE_2_OUTPUT},
+        _file_part(image_uri),
+    ]
+    return {
+        "request": {
+            "contents": [{"role": "user", "parts": parts}],
+            "generationConfig": {_camel_case(key): value for key, value in generation_settings().items()},
+            "safetySettings": [{"category": category, "threshold": "BLOCK_NONE"} for category in SAFETY_CATEGORIES],
+        }
+    }
+
+
+def request_image_uri(record):
+    return record["request"]["contents"][-1]["parts"][-1]["fileData"]["fileUri"]
+
+
+def response_text(record):
+    candidates = (record.get("response") or {}).get("candidates") or []
+    if not candidates:
+        return None
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts)
+
+
+def write_requests(bucket, blob_names, job_dir):
+    lines = [json.dumps(build_request(gcs_uri(blob_name)), ensure_ascii=False) for blob_name in blob_names]
+    requests_path = os.path.join(job_dir, "requests.jsonl")
+    bucket.blob(requests_path).upload_from_string("\n".join(lines) + "\n", content_type="application/jsonl")
+    print(f"Wrote {len(lines)} batch requests to {gcs_uri(requests_path)}")
+    return requests_path
+
+
+class VertexBatchBackend:
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def submit(self, input_uri, output_uri_prefix):
+        job = BatchPredictionJob.submit(
+            source_model=self.model_name,
+            input_dataset=input_uri,
+            output_uri_prefix=output_uri_prefix,
+        )
+        print(f"Submitted batch prediction job {job.resource_name}")
+        return job
+
+    def poll(self, job):
+        job.refresh()
+        if not job.has_ended:
+            return RUNNING, None
+        if job.has_succeeded:
+            return SUCCEEDED, job.output_location
+        return FAILED, str(job.error)
+
+
+def read_predictions(storage_client, output_uri):
+    prefix = blob_path(output_uri.rstrip("/")) + "/"
+    for blob in storage_client.list_blobs(config.BUCKET, prefix=prefix):
+        if not blob.name.endswith(".jsonl"):
+            continue
+        for line in blob.download_as_string().decode("utf-8").splitlines():
+            if line.strip():
+                yield json.loads(line)
+
+
+def ingest_predictions(storage_client, output_uri, on_result=None, repair_stats=None, on_failure=None, expected=()):
+    # expected: the file names that were submitted; any without an output line failed too.
+    results = {}
+    failed = {}
+    for record in read_predictions(storage_client, output_uri):
+        file_name = os.path.basename(request_image_uri(record))
+        text = response_text(record)
+        if text is None:
+            # Blocked candidates come back with a finish reason but no text.
+            candidates = (record.get("response") or {}).get("candidates") or [{}]
+            failed[file_name] = (record.get("status") or candidates[0].get("finishReason") or "empty response", None)
+            continue
+        try:
+            result_data = parse_response(text, repair_stats)
+        except Exception as e:
+            failed[file_name] = (e, text)
+            continue
+        results[file_name] = result_data
+        if on_result:
+            on_result(file_name, result_data)
+    for file_name in expected:
+        if file_name not in results and file_name not in failed:
+            failed[file_name] = ("no prediction in the batch output", None)
+
+    for file_name, (reason, text) in failed.items():
+        print(f"Error processing {file_name}: {reason}")
+        if on_failure:
+            on_failure(file_name, reason, text)
+    return results
+
+
+def run_batch(storage_client, bucket, blob_names, backend, on_result=None, poll_interval=None, repair_stats=None,
+              on_failure=None):
+    poll_interval = poll_interval if poll_interval is not None else config.BATCH_POLL_SECONDS
+    job_dir = os.path.join(config.OUTPUT_PATH, config.BATCH_DIRNAME, new_run_id())
+
+    requests_path = write_requests(bucket, blob_names, job_dir)
+    job = backend.submit(gcs_uri(requests_path), gcs_uri(os.path.join(job_dir, "predictions")))
+
+    started = time.monotonic()
+    while True:
+        state, detail = backend.poll(job)
+        if state != RUNNING:
+            break
+        print(f"--- Batch job running ({time.monotonic() - started:.0f}s elapsed) ---")
+        time.sleep(poll_interval)
+
+    if state == FAILED:
+        raise RuntimeError(f"Batch prediction job failed: {detail}")
+
+    print(f"Batch job finished. Ingesting predictions from {detail}")
+    return ingest_predictions(storage_client, detail, on_result=on_result, repair_stats=repair_stats, on_failure=on_failure,
+                              expected=[os.path.basename(blob_name) for blob_name in blob_names])
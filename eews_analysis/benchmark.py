@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from eews_analysis import config
+from eews_analysis.aggregate import AggregationCube
+from eews_analysis.clean_data import build_remove_mask
+from eews_analysis.local import LocalStorageClient
+from eews_analysis.results_store import read_results, write_results_frame
+from eews_analysis.synthetic import SIZES, generate_frame, parse_size
+from eews_analysis.visualize import build_chart_jobs, preprocess_data, render_charts
+
+# Times the clean / visualize stages on a synthetic corpus held in a local
+# directory bucket and writes the timings as JSON (one file per run, named
+# by commit) so runs on different commits can be diffed.
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS; it only ever grows, so each
+    # stage reports the process peak up to the end of that stage.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(results, rows, stage, fn, *args):
+    started = time.perf_counter()
+    value = fn(*args)
+    seconds = time.perf_counter() - started
+    results.append({"rows": rows, "stage": stage, "seconds": round(seconds, 4), "peak_rss_mb": round(peak_rss_mb(), 1)})
+    print(f"--- {rows} rows | {stage:<12} {seconds:8.2f}s  peak RSS {peak_rss_mb():8.1f} MB ---")
+    return value
+
+
+@contextmanager
+def local_caches(root):
+    # Point every local cache except BENCHMARK_DIR into the run's temporary
+    # directory, so a run neither starts warm nor leaves files behind.
+    originals = {}
+    for name in dir(config):
+        value = getattr(config, name)
+        if name != "BENCHMARK_DIR" and isinstance(value, str) and value.startswith(config.CACHE_DIR + os.sep):
+            originals[name] = value
+            setattr(config, name, os.path.join(root, os.path.relpath(value, config.CACHE_DIR)))
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(config, name, value)
+
+
+def warm_cube(df):
+    cube = AggregationCube(df)
+    for column in df.columns:
+        cube.value_counts(column)
+    return cube
+
+
+def run_size(rows, seed, render, workers, results):
+    with tempfile.TemporaryDirectory(prefix="eews-bench-") as root, local_caches(os.path.join(root, "cache")):
+        bucket = LocalStorageClient(root).bucket(config.BUCKET)
+
+        frame = timed(results, rows, "generate", generate_frame, rows, seed)
+        timed(results, rows, "write", write_results_frame, bucket, frame)
+        del frame
+
+        raw = timed(results, rows, "load", read_results, bucket)
+        timed(results, rows, "clean_masks", build_remove_mask, raw)
+        del raw
+
+        typed = timed(results, rows, "load_typed", read_results, bucket, None, None, True)
+        df = timed(results, rows, "preprocess", preprocess_data, typed)
+        timed(results, rows, "aggregate", warm_cube, df)
+        jobs = timed(results, rows, "chart_build", build_chart_jobs, df)
+        if render:
+            timed(results, rows, "render", render_charts, jobs, bucket, workers, True)
+
+
+def run(sizes, seed=0, render=False, workers=None, output=None):
+    commit = git_commit()
+    results = []
+    for rows in sizes:
+        run_size(rows, seed, render, workers, results)
+
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "seed": seed,
+        "render": render,
+        "results": results,
+    }
+    if output is None:
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        output = os.path.join(config.BENCHMARK_DIR, f"{timestamp}-{commit or 'nocommit'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results saved to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark clean_data / visualize on a synthetic corpus.")
+    parser.add_argument("--sizes", nargs="+", default=["1k", "100k"], help="row counts or any of: " + ", ".join(SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--render", action="store_true", help="also render the charts (needs Kaleido for PNGs)")
+    parser.add_argument("--workers", type=int, default=None, help="chart rendering processes")
+    parser.add_argument("--output", default=None, help="results file (default: BENCHMARK_DIR/<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    run([parse_size(size) for size in args.sizes], args.seed, args.render, args.workers, args.output)
@@ -0,0 +1,132 @@
+import threading
+from collections import Counter
+
+import pandas as pd
+
+from eews_analysis import config
+from eews_analysis.filters import evaluate
+from eews_analysis.prompts import SCREEN_FIELDS
+from eews_analysis.repair import repair_response
+from eews_analysis.usage import TokenUsage
+
+# Two-stage extraction. Each screening stage answers only the fields the
+# filter rules look at (SCREEN_FIELDS); a file whose answers would be removed
+# by CASCADE_RULES is not sent to the full 40-field extraction. Stages run in
+# order and any of them can drop a file; one that fails or does not know
+# (UNKNOWN answers are never removed) lets the file through. Screened-out
+# files stay pending in the manifest rather than being recorded anywhere, so
+# the decision is taken again, from the response cache, on every run: they
+# are deferred, and escalate as soon as the rules change or the cascade is
+# turned off. A stage is any object with a name and
+# screen(image, file_name, image_hash, metrics) -> {field: answer}.
+
+SCREENED_OUT = object()  # extract_file's result for a file the cascade dropped
+
+
+def screen_rules(rules=None):
+    rules = config.CASCADE_RULES if rules is None else rules
+    return [rule for rule in rules if rule["column"] in SCREEN_FIELDS]
+
+
+class ModelScreen:
+    # A short prompt on a cheaper model. generate(context, image, file_name,
+    # usage, metrics) makes the call, so retries and rate limiting stay with
+    # the caller.
+
+    def __init__(self, context, generate, cache=None, name=None):
+        self.context = context
+        self.generate = generate
+        self.cache = cache
+        self.name = name or f"screen ({config.CASCADE_SCREEN_MODEL})"
+        self.usage = TokenUsage()
+
+    def screen(self, image, file_name, image_hash=None, metrics=None):
+        if self.cache is not None and image_hash:
+            fields = self.cache.get(image_hash)
+            if fields is not None:
+                return fields
+        response = self.generate(self.context, image, file_name, self.usage, metrics)
+        record, _ = repair_response(response.text)
+        fields = {key: record[key] for key in SCREEN_FIELDS}
+        if self.cache is not None and image_hash:
+            self.cache.put(image_hash, fields)
+        return fields
+
+    def close(self):
+        self.context.close()
+
+
+class Cascade:
+    def __init__(self, stages, rules=None):
+        self.stages = list(stages)
+        self.rules = screen_rules(rules)
+        self.counts = {stage.name: Counter() for stage in self.stages}
+        self.skipped_by = Counter()
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    def removed_by(self, fields):
+        result = evaluate(pd.DataFrame([fields]), self.rules)
+        return [name for name, removed in zip(result.names, result.masks[0]) if removed]
+
+    def screen(self, image, file_name, image_hash=None, metrics=None):
+        # The names of the rules that drop the file, or [] to escalate it.
+        for stage in self.stages:
+            try:
+                removed_by = self.removed_by(stage.screen(image, file_name, image_hash, metrics))
+            except Exception as e:
+                print(f"--- Screen '{stage.name}' failed for {file_name} ({e}), escalating ---")
+                if metrics is not None:
+                    metrics.record_error("screen", e)
+                with self._lock:
+                    self.counts[stage.name]["errors"] += 1
+                continue
+            with self._lock:
+                self.counts[stage.name]["skipped" if removed_by else "passed"] += 1
+                self.skipped_by.update(removed_by)
+            if removed_by:
+                return removed_by
+        with self._lock:
+            self.escalated += 1
+        return []
+
+    def savings(self, full_usage):
+        # In tokens of the extraction model: what the dropped files would have cost
+        # at this run's average, against what every screen call cost.
+        skipped = sum(counts["skipped"] for counts in self.counts.values())
+        per_file = (full_usage.prompt_tokens + full_usage.output_tokens) / full_usage.requests if full_usage.requests else 0
+        spent = sum(stage.usage.prompt_tokens + stage.usage.output_tokens
+                    for stage in self.stages if getattr(stage, "usage", None) is not None)
+        avoided = skipped * per_file
+        return {"skipped": skipped, "avoided_tokens": avoided, "screen_tokens": spent,
+                "net_tokens": avoided - spent * config.CASCADE_SCREEN_COST_RATIO}
+
+    def print_report(self, full_usage):
+        print("\n--- Cascade ---")
+        for stage in self.stages:
+            counts = self.counts[stage.name]
+            screened = counts["passed"] + counts["skipped"] + counts["errors"]
+            pass_rate = (counts["passed"] + counts["errors"]) / screened if screened else 0.0
+            print(f"   {stage.name}: {screened} screened, {pass_rate:.1%} passed, {counts['skipped']} skipped, "
+                  f"{counts['errors']} errors (escalated)")
+        for rule, count in self.skipped_by.most_common():
+            print(f"      dropped by {rule}: {count}")
+        print(f"   full extraction: {self.escalated} escalated")
+        savings = self.savings(full_usage)
+        if full_usage.requests:
+            print(f"   ~{savings['avoided_tokens']:,.0f} extraction tokens avoided, {savings['screen_tokens']:,} screen tokens "
+                  f"spent (x{config.CASCADE_SCREEN_COST_RATIO} price): net saving ~{savings['net_tokens']:,.0f} extraction tokens.")
+
+    def record_metrics(self, metrics):
+        for name, counts in self.counts.items():
+            for outcome in ("passed", "skipped", "errors"):
+                metrics.inc("cascade_screened_total", counts[outcome], stage=name, outcome=outcome)
+        metrics.inc("cascade_escalated_total", self.escalated)
+        for stage in self.stages:
+            if getattr(stage, "usage", None) is not None:
+                metrics.inc("cascade_screen_tokens_total", stage.usage.prompt_tokens + stage.usage.output_tokens, stage=stage.name)
+
+    def close(self):
+        for stage in self.stages:
+            if hasattr(stage, "close"):
+                stage.close()
@@ -0,0 +1,160 @@
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+from eews_analysis import config
+from eews_analysis.results_store import write_results
+
+# Results are checkpointed as append-only NDJSON shards under
+# OUTPUT_PATH/SHARDS_DIRNAME. Every shard "<run>-<seq>.ndjson" gets a sidecar
+# "<run>-<seq>.keys" listing its file names, uploaded after the shard itself,
+# so resuming only needs the small key files and a half-written flush is
+# never counted as done.
+
+SHARD_SUFFIX = ".ndjson"
+KEYS_SUFFIX = ".keys"
+
+
+def shards_prefix():
+    return os.path.join(config.OUTPUT_PATH, config.SHARDS_DIRNAME) + "/"
+
+
+def results_path():
+    return os.path.join(config.OUTPUT_PATH, config.RESULTS_FILENAME)
+
+
+def results_keys_path():
+    return os.path.join(config.OUTPUT_PATH, config.RESULTS_KEYS_FILENAME)
+
+
+def new_run_id():
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return f"{timestamp}-{uuid.uuid4().hex[:6]}"
+
+
+class ShardWriter:
+    def __init__(self, bucket, run_id=None, flush_every=None, flush_interval=None, clock=time.monotonic):
+        self.bucket = bucket
+        self.run_id = run_id or new_run_id()
+        self.flush_every = flush_every or config.CHECKPOINT_FLUSH_RECORDS
+        self.flush_interval = flush_interval or config.CHECKPOINT_FLUSH_SECONDS
+        self.records_written = 0
+        self._clock = clock
+        self._buffer = []
+        self._sequence = 0
+        self._last_flush = clock()
+
+    def add(self, file_name, result_data):
+        self._buffer.append((file_name, result_data))
+        if len(self._buffer) >= self.flush_every or self._clock() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = self._clock()
+        if not self._buffer:
+            return
+
+        shard_name = os.path.join(shards_prefix(), f"{self.run_id}-{self._sequence:05d}")
+        lines = [json.dumps({"key": file_name, "value": result_data}, ensure_ascii=False)
+                 for file_name, result_data in self._buffer]
+        keys = [file_name for file_name, _ in self._buffer]
+
+        self.bucket.blob(shard_name + SHARD_SUFFIX).upload_from_string(
+            "\n".join(lines) + "\n", content_type="application/x-ndjson")
+        self.bucket.blob(shard_name + KEYS_SUFFIX).upload_from_string(
+            "\n".join(keys) + "\n", content_type="text/plain")
+
+        self.records_written += len(self._buffer)
+        self._sequence += 1
+        self._buffer = []
+        print(f"--- Checkpointed {self.records_written} results to gs://{config.BUCKET}/{shard_name}{SHARD_SUFFIX} ---")
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _split_lines(data):
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    return [line for line in data.splitlines() if line.strip()]
+
+
+def list_shards(storage_client):
+    blobs = storage_client.list_blobs(config.BUCKET, prefix=shards_prefix())
+    shard_names = []
+    key_names = []
+    for blob in blobs:
+        if blob.name.endswith(SHARD_SUFFIX):
+            shard_names.append(blob.name)
+        elif blob.name.endswith(KEYS_SUFFIX):
+            key_names.append(blob.name)
+    return sorted(shard_names), sorted(key_names)
+
+
+def read_completed_keys(storage_client, bucket):
+    completed = set()
+
+    keys_blob = bucket.blob(results_keys_path())
+    if keys_blob.exists():
+        completed.update(_split_lines(keys_blob.download_as_string()))
+    else:
+        results_blob = bucket.blob(results_path())
+        if results_blob.exists():
+            # Results file predates the keys sidecar: parse it once and write the sidecar.
+            print(f"No key index found for gs://{config.BUCKET}/{results_path()}. Building it once...")
+            existing_keys = list(json.loads(results_blob.download_as_string()).keys())
+            keys_blob.upload_from_string("\n".join(existing_keys) + "\n", content_type="text/plain")
+            completed.update(existing_keys)
+
+    _, key_names = list_shards(storage_client)
+    for key_name in key_names:
+        completed.update(_split_lines(bucket.blob(key_name).download_as_string()))
+    return completed
+
+
+def read_shard(bucket, shard_name):
+    records = {}
+    for line in _split_lines(bucket.blob(shard_name).download_as_string()):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # A torn final line from an interrupted upload; its key was never published.
+            continue
+        records[record["key"]] = record["value"]
+    return records
+
+
+def compact_shards(storage_client, bucket):
+    shard_names, key_names = list_shards(storage_client)
+    published = {name[:-len(KEYS_SUFFIX)] for name in key_names}
+    shard_names = [name for name in shard_names if name[:-len(SHARD_SUFFIX)] in published]
+    if not shard_names:
+        print("No result shards to compact.")
+        return None
+
+    output_dict = {}
+    results_blob = bucket.blob(results_path())
+    if results_blob.exists():
+        output_dict = json.loads(results_blob.download_as_string())
+
+    for shard_name in shard_names:
+        output_dict.update(read_shard(bucket, shard_name))
+
+    write_results(bucket, output_dict)
+
+    # Only delete after the canonical file is written; a crash here just re-merges the same records.
+    for shard_name in shard_names:
+        base_name = shard_name[:-len(SHARD_SUFFIX)]
+        bucket.blob(shard_name).delete()
+        bucket.blob(base_name + KEYS_SUFFIX).delete()
+
+    print(f"Compacted {len(shard_names)} shards into gs://{config.BUCKET}/{results_path()} ({len(output_dict)} entries).")
+    return output_dict
@@ -1,14 +1,75 @@
-import json
 import os
-from google.cloud import storage
+import sys
+import time
 import pandas as pd
-from datetime import datetime
-import numpy as np
 from eews_analysis import config
-
-def clean_data():
+from eews_analysis.concurrency import map_concurrent
+from eews_analysis.deadletter import TRANSIENT, classify
+from eews_analysis.filters import evaluate, rule_columns, save_filter_index
+from eews_analysis.manifest import InputManifest
+from eews_analysis.metrics import Metrics, instrument_storage
+from eews_analysis.results_store import read_results, read_removed_keys
+from eews_analysis.schema import FIELDS
+
+def build_remove_mask(df, rules=None):
+    return pd.Series(evaluate(df, rules).remove_mask, index=df.index)
+
+def plan_moves(filenames, locations):
+    moves = []
+    missing = []
+    for filename in filenames:
+        blob_name = locations.get(filename)
+        if blob_name:
+            moves.append((blob_name, os.path.join(config.DELETED_FILES_PATH, filename)))
+        else:
+            missing.append(filename)
+    return moves, missing
+
+def move_blob(bucket, blob_name, destination_path, sleep=time.sleep):
+    # Returns "moved", "missing" (the source vanished) or the final error.
+    copied = False
+    for attempt in range(config.MOVE_MAX_RETRIES + 1):
+        try:
+            source_blob = bucket.blob(blob_name)
+            if not copied:
+                bucket.copy_blob(source_blob, bucket, destination_path)
+                copied = True
+            source_blob.delete()
+            return "moved"
+        except Exception as e:
+            if type(e).__name__ == "NotFound" or isinstance(e, FileNotFoundError):
+                # After the copy, a missing source means an earlier delete went through.
+                return "moved" if copied else "missing"
+            if classify(e) != TRANSIENT or attempt == config.MOVE_MAX_RETRIES:
+                return e
+            sleep(config.MOVE_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+def move_files(bucket, moves, workers=None, metrics=None):
+    # Copy + delete is two round-trips per file; run them on a thread pool.
+    workers = workers or config.MOVE_WORKERS
+    outcomes = {"moved": [], "missing": [], "failed": []}
+    for _, (blob_name, destination_path), outcome in map_concurrent(
+        lambda move: move_blob(bucket, *move), moves, workers
+    ):
+        if isinstance(outcome, Exception):
+            print(f"   - Error moving '{blob_name}': {outcome}")
+            if metrics is not None:
+                metrics.record_error("move", outcome)
+            outcomes["failed"].append(blob_name)
+        else:
+            if outcome == "missing":
+                print(f"   - Warning: '{blob_name}' disappeared before it could be moved.")
+            outcomes[outcome].append(blob_name)
+    return outcomes
+
+def clean_data(dry_run=False, workers=None, storage_client=None):
+    metrics = Metrics("clean_data")
     try:
-        storage_client = storage.Client(project=config.PROJECT_ID)
+        if storage_client is None:
+            # Imported here so build_remove_mask loads without the GCS client.
+            from google.cloud import storage
+            storage_client = storage.Client(project=config.PROJECT_ID)
+        storage_client = instrument_storage(storage_client, metrics)
         bucket = storage_client.bucket(config.BUCKET)
         print("GCS Client initialized successfully.")
     except Exception as e:
@@ -17,91 +78,92 @@ def clean_data():
 
     source_path = os.path.join(config.OUTPUT_PATH, config.RESULTS_FILENAME)
 
+    rules = config.FILTER_RULES
     print(f"\n--- Step 2: Loading data from {source_path} ---")
+    stage_started = time.perf_counter()
     try:
         source_blob = bucket.blob(source_path)
         if not source_blob.exists():
-            raise FileNotFoundError(f"Source file not found at gs://{config.bucket}/{source_path}")
+            raise FileNotFoundError(f"Source file not found at gs://{config.BUCKET}/{source_path}")
 
-        json_data_string = source_blob.download_as_string()
-        all_data = json.loads(json_data_string)
-        df = pd.DataFrame.from_dict(all_data, orient='index')
+        # Only the columns the rules look at.
+        df = read_results(bucket, columns=[column for column in rule_columns(rules) if column in FIELDS])
+        previously_removed = read_removed_keys(bucket)
         print(f"Successfully loaded data for {len(df)} entries.")
     except Exception as e:
         print(f"Could not load JSON data. Reason: {e}.")
+        metrics.record_error("load", e)
         df = None
+    metrics.add_stage_time("load", time.perf_counter() - stage_started)
 
     if df is not None:
-        print("\n--- Step 3: Filtering data based on magnitude and date criteria ---")
-        initial_rows = len(df)
-
-        df['mag_numeric'] = pd.to_numeric(df['magnitude_on_alert_screenshot'], errors='coerce')
-        df['post_datetime_dt'] = pd.to_datetime(df['post_datetime'], errors='coerce')
-        df['alert_time_dt'] = pd.to_datetime(df['alert_time'], errors='coerce')
-
-        magnitude_remove_mask = ((df['mag_numeric'] > 6.2) | (df['mag_numeric'] <= 4.5))
-
-        start_bound = datetime(2025, 4, 1)
-        end_bound = datetime(2025, 6, 1)
-        post_date_remove_mask = ((df['post_datetime_dt'] < start_bound) | (df['post_datetime_dt'] >= end_bound))
-        alert_date_remove_mask = ((df['alert_time_dt'] < start_bound) | (df['alert_time_dt'] >= end_bound))
-        date_remove_mask = post_date_remove_mask | alert_date_remove_mask
-
-        combined_remove_mask = magnitude_remove_mask | date_remove_mask
-
-        df_to_remove = df[combined_remove_mask]
-        df_to_keep = df[~combined_remove_mask]
-
-        filenames_to_remove = df_to_remove.index.tolist()
-
-        print(f"Filtering complete.")
-        print(f"   - Entries to keep: {len(df_to_keep)}")
-        print(f"   - Entries to remove: {len(df_to_remove)}")
+        print(f"\n--- Step 3: Filtering data with {len(rules)} rules ---")
+        with metrics.stage("filter"):
+            result = evaluate(df, rules)
+
+        print("Filtering complete.")
+        result.print_report()
+        metrics.inc("entries_kept_total", len(result.kept))
+        metrics.inc("entries_removed_total", len(result.removed))
+        for name, counts in result.rule_counts().items():
+            metrics.inc("entries_removed_by_rule_total", counts["removed"], rule=name)
+
+        # Screenshots of entries removed by an earlier run were already moved, unless the move failed:
+        # the manifest only forgets a screenshot once it has left the input folders.
+        manifest = InputManifest.load(bucket)
+        still_in_inputs = manifest.locations()
+        filenames_to_remove = [filename for filename in result.removed
+                               if filename not in previously_removed or filename in still_in_inputs]
+        retried = previously_removed.intersection(filenames_to_remove)
+        restored = previously_removed.intersection(result.kept)
+        if restored:
+            print(f"   - {len(restored)} entries removed by an earlier run are kept by the current rules; "
+                  f"move their screenshots back from {config.DELETED_FILES_PATH}/ to extract them again.")
 
     if df is not None and filenames_to_remove:
-        print(f"\n--- Step 4: Moving {len(filenames_to_remove)} PNG files to gs://{config.OUTPUTS_PATH}/{config.DELETED_FILES_PATH}/ ---")
-
-        moved_count = 0
-        for filename in filenames_to_remove:
-            source_path_1 = os.path.join(config.INPUT_PATH_1, filename)
-            source_path_2 = os.path.join(config.INPUT_PATH_2, filename)
-
-            source_blob = None
-            source_blob_gcs = bucket.blob(source_path_1)
-            if source_blob_gcs.exists():
-                source_blob = source_blob_gcs
-            else:
-                source_blob_gcs = bucket.blob(source_path_2)
-                if source_blob_gcs.exists():
-                    source_blob = source_blob_gcs
-
-            if source_blob:
-                destination_path = os.path.join(config.DELETED_FILES_PATH, filename)
-                bucket.copy_blob(source_blob, bucket, destination_path)
-                source_blob.delete()
-                moved_count += 1
-            else:
-                print(f"   - Warning: Could not find source PNG file for '{filename}' in either input folder.")
-
-        print(f"Successfully moved {moved_count} PNG files.")
-
-    if df is not None:
-        print(f"\n--- Step 5: Saving data ---")
-
-        original_blob = bucket.blob(source_path)
-        if original_blob.exists():
-            backup_path = os.path.join(config.OUTPUT_PATH, config.BACKUP_FILENAME)
-            bucket.rename_blob(original_blob, new_name=backup_path)
-            print(f"Original data archived to: gs://{config.BUCKET}/{backup_path}")
-
-        df_to_keep = df_to_keep.drop(columns=['mag_numeric', 'post_datetime_dt', 'alert_time_dt'])
-        cleaned_data_dict = df_to_keep.to_dict(orient='index')
-
-        json_string = json.dumps(cleaned_data_dict, indent=2)
-        bucket.blob(source_path).upload_from_string(json_string, content_type="application/json")
-
-        print(f"Cleaned data for {len(df_to_keep)} entries saved to: gs://{config.BUCKET}/{source_path}")
+        print(f"\n--- Step 4: Moving {len(filenames_to_remove)} PNG files to gs://{config.BUCKET}/{config.DELETED_FILES_PATH}/ ---")
+        if retried:
+            print(f"   - {len(retried)} of them were removed by an earlier run whose move did not finish.")
+
+        stage_started = time.perf_counter()
+        # One listing refreshes the manifest instead of probing each input folder per file.
+        manifest.refresh(storage_client)
+        moves, missing = plan_moves(filenames_to_remove, manifest.locations())
+        for filename in missing:
+            print(f"   - Warning: Could not find source PNG file for '{filename}' in either input folder.")
+
+        if dry_run:
+            for blob_name, destination_path in moves:
+                print(f"   - Would move gs://{config.BUCKET}/{blob_name} -> {destination_path}")
+            print(f"Dry run: {len(moves)} PNG files would be moved, {len(missing)} not found.")
+        else:
+            outcomes = move_files(bucket, moves, workers, metrics)
+            for blob_name in outcomes["moved"] + outcomes["missing"]:
+                manifest.remove(blob_name)
+            manifest.save(bucket)
+            missing_count = len(missing) + len(outcomes["missing"])
+            metrics.inc("files_moved_total", len(outcomes["moved"]))
+            metrics.inc("files_missing_total", missing_count)
+            metrics.inc("files_move_failed_total", len(outcomes["failed"]))
+            print(f"Successfully moved {len(outcomes['moved'])} PNG files "
+                  f"({missing_count} not found, {len(outcomes['failed'])} failed).")
+        metrics.add_stage_time("move", time.perf_counter() - stage_started)
+
+    if df is not None and dry_run:
+        print("\nDry run: the filter index was not changed.")
+
+    if df is not None and not dry_run:
+        # The results themselves are left as they are; readers drop the removed keys.
+        print("\n--- Step 5: Saving the filter index ---")
+        with metrics.stage("save"):
+            save_filter_index(bucket, result, rules)
+
+    metrics.print_summary()
+    metrics.write()
 
 
 if __name__ == "__main__":
-    clean_data()
\ No newline at end of file
+    # Same flags as `eews clean`.
+    from eews_analysis.cli import main as cli
+
+    sys.exit(cli(["clean", *sys.argv[1:]]))
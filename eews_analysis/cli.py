@@ -0,0 +1,104 @@
+import argparse
+import sys
+
+from eews_analysis import config
+from eews_analysis.workers import worker_spec
+
+# The `eews` entry point. Subcommands import their pipeline module inside the
+# handler, so parsing arguments (and `--help`) never loads vertexai, the GCS
+# client, pandas, numpy or plotly, and `eews status` adds only the GCS client;
+# `eews check-startup` keeps it that way (see startup.py).
+
+
+def run_extract(args):
+    from eews_analysis import process_data
+
+    if args.merge:
+        process_data.merge_worker_results()
+    elif args.batch:
+        process_data.process_all_tweets_batch()
+    elif args.redrive:
+        process_data.redrive_failed(include_permanent=args.include_permanent, show_progress=args.progress,
+                                    preprocess=args.preprocess)
+    else:
+        process_data.process_all_tweets(show_progress=args.progress, preprocess=args.preprocess, worker=args.worker,
+                                        screen=args.cascade)
+
+
+def run_clean(args):
+    from eews_analysis.clean_data import clean_data
+
+    clean_data(dry_run=args.dry_run, workers=args.workers)
+
+
+def run_visualize(args):
+    from eews_analysis.visualize import main as visualize
+
+    visualize(args.workers, args.force, args.progress, args.output_dir, args.dashboard)
+
+
+def run_status(args):
+    from google.cloud import storage
+    from eews_analysis import deadletter, manifest
+
+    bucket = storage.Client(project=config.PROJECT_ID).bucket(config.BUCKET)
+    manifest.print_status(bucket)
+    deadletter.print_status(bucket)
+
+
+def run_check_startup(args):
+    from eews_analysis.startup import check_startup
+
+    return 0 if check_startup(args.budget_ms) else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="eews", description="EEWS social media analysis pipeline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", help="extract structured data from tweet screenshots")
+    extract.add_argument("--batch", action="store_true", help="submit pending files as one batch prediction job")
+    extract.add_argument("--redrive", action="store_true", help="retry only the dead-lettered (failed) files")
+    extract.add_argument("--include-permanent", action="store_true", help="with --redrive, also retry permanent failures")
+    extract.add_argument("--progress", action="store_true", help="show a live progress line with throughput and ETA")
+    extract.add_argument("--preprocess", action="store_true", default=None,
+                         help="trim, downscale and re-encode screenshots locally before sending them (needs Pillow)")
+    extract.add_argument("--cascade", action="store_true", default=None,
+                         help="screen each screenshot with a cheaper model first and skip files the filters would remove")
+    extract.add_argument("--worker", type=worker_spec, default=None, metavar="I/N",
+                         help="extract only partition I of N (0-based); run N of these, then --merge")
+    extract.add_argument("--merge", action="store_true", help="merge the workers' result shards and dead letters")
+    extract.set_defaults(handler=run_extract)
+
+    clean = commands.add_parser("clean", help="filter the results and move the removed screenshots")
+    clean.add_argument("--dry-run", action="store_true", help="report per-rule removals and planned moves without changing anything")
+    clean.add_argument("--workers", type=int, default=None, help="parallel copy/delete workers")
+    clean.set_defaults(handler=run_clean)
+
+    visualize = commands.add_parser("visualize", help="render the analysis charts")
+    visualize.add_argument("--workers", type=int, default=None, help="chart rendering processes (default: CHART_WORKERS)")
+    visualize.add_argument("--force", action="store_true", help="re-render every chart, ignoring the chart manifest")
+    visualize.add_argument("--dashboard", action="store_true", help="bundle the sunbursts and event charts into one compressed dashboard")
+    visualize.add_argument("--output-dir", default=None, help="write charts to this local directory instead of the GCS bucket")
+    visualize.add_argument("--progress", action="store_true", help="show a live progress line with throughput and ETA")
+    visualize.set_defaults(handler=run_visualize)
+
+    status = commands.add_parser("status", help="show the input manifest and dead letter counts")
+    status.set_defaults(handler=run_status)
+
+    check = commands.add_parser("check-startup", help="fail if the CLI imports heavy modules or starts too slowly")
+    check.add_argument("--budget-ms", type=float, default=None, help="import time budget (default: CLI_IMPORT_BUDGET_MS)")
+    check.set_defaults(handler=run_check_startup)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "worker", None) and (args.batch or args.redrive):
+        parser.error("--worker only applies to a normal extraction run")
+    return args.handler(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
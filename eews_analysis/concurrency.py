@@ -0,0 +1,101 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from eews_analysis import config
+
+QUOTA_ERROR_NAMES = {"ResourceExhausted", "TooManyRequests"}
+
+
+def is_quota_error(error):
+    if type(error).__name__ in QUOTA_ERROR_NAMES:
+        return True
+    return "429" in str(error) or "quota" in str(error).lower()
+
+
+class AdaptiveRateLimiter:
+    # Token bucket whose refill rate follows AIMD: every success adds a little
+    # rate back, every quota error halves it (at most once per cooldown window,
+    # so a burst of 429s from requests already in flight counts as one signal).
+
+    def __init__(self, rate, min_rate, max_rate, increase_step, decrease_factor,
+                 burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase_step = float(increase_step)
+        self.decrease_factor = float(decrease_factor)
+        self.burst = float(burst) if burst is not None else max(1.0, self.rate)
+        self.tokens = self.burst
+        self.throttle_count = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._last_refill = clock()
+        self._last_decrease = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            rate=config.REQUESTS_PER_SECOND,
+            min_rate=config.MIN_REQUESTS_PER_SECOND,
+            max_rate=config.MAX_REQUESTS_PER_SECOND,
+            increase_step=config.RATE_INCREASE_STEP,
+            decrease_factor=config.RATE_DECREASE_FACTOR,
+        )
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill(self._clock())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            self._sleep(wait_time)
+
+    def on_success(self):
+        with self._lock:
+            # Spread the additive increase over one second's worth of requests.
+            self.rate = min(self.max_rate, self.rate + self.increase_step / max(self.rate, 1.0))
+
+    def on_throttle(self):
+        with self._lock:
+            now = self._clock()
+            cooldown = 1.0 / self.rate
+            if self._last_decrease is not None and now - self._last_decrease < cooldown:
+                return
+            self._last_decrease = now
+            self.throttle_count += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.tokens = min(self.tokens, 0.0)
+
+
+def map_concurrent(fn, items, max_in_flight):
+    # Yields (index, item, result) in completion order while never holding more
+    # than max_in_flight submitted calls, so huge item lists are consumed lazily.
+    items = iter(enumerate(items))
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        pending = {}
+
+        def submit_next():
+            for index, item in items:
+                pending[executor.submit(fn, item)] = (index, item)
+                return True
+            return False
+
+        for _ in range(max_in_flight):
+            if not submit_next():
+                break
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, item = pending.pop(future)
+                submit_next()
+                yield index, item, future.result()
@@ -1,3 +1,5 @@
+import os
+
 # -- Google Cloud Settings --
 PROJECT_ID = "analyzing-eews"
 LOCATION = "us-central1"
@@ -13,11 +15,134 @@ VISUALIZATION_PATH = "VISUALIZATIONS_3"
 # -- File Names --
 RESULTS_FILENAME = "test_results.json"
 BACKUP_FILENAME = "test_results_original_backup.json"
+RESULTS_KEYS_FILENAME = "test_results.keys"
+RESULTS_PARQUET_FILENAME = "test_results.parquet"
+SHARDS_DIRNAME = "shards"
+MANIFEST_FILENAME = "input_manifest.json"
+BATCH_DIRNAME = "batch"
+CHART_MANIFEST_FILENAME = "chart_manifest.json"
+FILTER_INDEX_FILENAME = "filter_index.json"
+EVENTS_FILENAME = "detected_events.csv"
 
 # -- Model & Generation Settings --
-MODEL_NAME = "gemini-1.5-flash-001"
+MODEL_NAME = "gemini-2.0-flash-001"
 GENERATION_CONFIG = {
     "max_output_tokens": 8192,
     "temperature": 0.2,
     "top_p": 0.95,
-}
\ No newline at end of file
+}
+USE_STRUCTURED_OUTPUT = True
+MAX_REREQUESTS = 1
+
+# -- Extraction Concurrency & Rate Limiting --
+MAX_IN_FLIGHT = 8
+REQUESTS_PER_SECOND = 2.0
+MIN_REQUESTS_PER_SECOND = 0.2
+MAX_REQUESTS_PER_SECOND = 10.0
+RATE_INCREASE_STEP = 0.5
+RATE_DECREASE_FACTOR = 0.5
+MAX_QUOTA_RETRIES = 5
+
+# -- Checkpointing --
+CHECKPOINT_FLUSH_RECORDS = 50
+CHECKPOINT_FLUSH_SECONDS = 60
+
+# -- Local Caches --
+# Everything written to local disk lives under CACHE_DIR.
+CACHE_DIR = ".eews_cache"
+
+# -- Response Cache --
+RESPONSE_CACHE_DIR = os.path.join(CACHE_DIR, "responses")
+RESPONSE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# -- Context Caching --
+USE_CONTEXT_CACHE = True
+CONTEXT_CACHE_TTL_SECONDS = 3600
+CONTEXT_CACHE_REFRESH_MARGIN_SECONDS = 300
+
+# -- Batch Prediction --
+BATCH_POLL_SECONDS = 60
+
+# -- Cleaning --
+# Rows matching any rule are removed (rule kinds are described in filters.py).
+FILTER_RULES = [
+    {"name": "magnitude", "kind": "range", "column": "magnitude_on_alert_screenshot", "min": 4.5, "max": 6.2},
+    {"name": "post_date", "kind": "date_window", "column": "post_datetime", "windows": [("2025-04-01", "2025-06-01")]},
+    {"name": "alert_date", "kind": "date_window", "column": "alert_time", "windows": [("2025-04-01", "2025-06-01")]},
+]
+MOVE_WORKERS = 16
+MOVE_MAX_RETRIES = 3
+MOVE_RETRY_BACKOFF_SECONDS = 1.0
+
+# -- Cascade --
+# An optional cheap first pass over each screenshot; files the screen shows
+# would be removed by CASCADE_RULES are not sent to the full extraction.
+CASCADE_ENABLED = False
+CASCADE_SCREEN_MODEL = "gemini-2.0-flash-lite-001"
+CASCADE_SCREEN_MAX_OUTPUT_TOKENS = 256
+CASCADE_SCREEN_COST_RATIO = 0.25  # screen model's token price relative to MODEL_NAME's, for the savings report
+CASCADE_RULES = FILTER_RULES + [
+    # visualize only charts AEA alerts (and posts whose source is unknown).
+    {"name": "alert_source", "kind": "allow", "column": "alert_source", "values": ["AEA"]},
+]
+
+# -- Columnar Results --
+PARQUET_ROW_GROUP_SIZE = 50000
+
+# -- Visualization --
+CHART_WORKERS = os.cpu_count() or 1
+UPLOAD_WORKERS = 8
+UPLOAD_MAX_RETRIES = 3
+UPLOAD_RETRY_BACKOFF_SECONDS = 1.0
+DASHBOARD_EXPORT = False  # one compressed dashboard instead of standalone sunburst / event files
+
+# -- Events --
+EVENT_GAP_MINUTES = 60  # alerts further apart than this belong to different events
+EVENT_MAGNITUDE_TOLERANCE = 0.5
+EVENT_MIN_ALERTS = 10
+EVENT_POST_WINDOW_HOURS = 48  # posts this long after an event's last alert still belong to it
+
+# -- Benchmarks --
+BENCHMARK_DIR = os.path.join(CACHE_DIR, "benchmarks")
+
+# -- Metrics --
+METRICS_DIR = os.path.join(CACHE_DIR, "metrics")
+METRICS_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# -- Sharded Extraction --
+WORKER_DEAD_LETTERS_DIRNAME = "worker_dead_letters"
+
+# -- Dead Letters --
+DEAD_LETTER_FILENAME = "dead_letters.json"
+DEAD_LETTER_MAX_ATTEMPTS = 5
+DEAD_LETTER_BACKOFF_SECONDS = 30
+DEAD_LETTER_MAX_BACKOFF_SECONDS = 3600
+DEAD_LETTER_MAX_WAIT_SECONDS = 600
+DEAD_LETTER_MAX_TEXT_CHARS = 4000
+
+# -- Image Preprocessing --
+PREPROCESS_IMAGES = False
+PREPROCESS_CACHE_DIR = os.path.join(CACHE_DIR, "images")
+PREPROCESS_MAX_LONG_EDGE = 1536
+PREPROCESS_FORMAT = "WEBP"
+PREPROCESS_QUALITY = 85
+PREPROCESS_TRIM_TOLERANCE = 10
+PREPROCESS_TILE_ASPECT = 3.0  # split screenshots taller than this many widths; 0 disables
+PREPROCESS_TILE_OVERLAP = 0.05
+
+# -- Locations --
+LOCATION_CACHE_PATH = os.path.join(CACHE_DIR, "locations.json")
+LOCATION_UNMATCHED_REPORT = os.path.join(CACHE_DIR, "unmatched_locations.csv")
+LOCATION_MAX_EDIT_RATIO = 0.25
+# Districts kept as their own label instead of being folded into their province.
+LOCATION_KEEP_DISTRICTS = ("Silivri",)
+# Whole-value overrides (case and diacritics ignored), applied before the gazetteer.
+LOCATION_ALIASES = {
+    "Antalya, Mugla, Izmir": "Izmir",
+    "eastern mediterranean sea": "eastern mediterranean",
+    "Near the coast of Turkey": "Edge of the marked area",
+    "Turkey": "Edge of the marked area",
+}
+
+# -- CLI --
+CLI_IMPORT_BUDGET_MS = 150  # cold-start import time allowed for `eews --help` / `eews status` modules
@@ -0,0 +1,79 @@
+import datetime
+import threading
+import time
+
+from vertexai.generative_models import Content, GenerativeModel, Part
+from vertexai.preview import caching
+
+from eews_analysis import config
+
+# Every extraction request shares the same prefix (instructions, two example
+# screenshots and their outputs); only the final image changes. A context
+# holds that prefix once and exposes generate(image, ...), so callers do not
+# care whether the prefix is resent or served from a server-side cache.
+# The image may also be a list of parts (a tiled screenshot).
+
+
+def image_parts(image):
+    return list(image) if isinstance(image, (list, tuple)) else [image]
+
+
+class PrefixContext:
+    # Sends the full prefix with every request. Used when context caching is
+    # disabled or unavailable, and to wrap local fakes.
+
+    def __init__(self, model, prefix):
+        self.model = model
+        self.prefix = list(prefix)
+
+    def generate(self, image, **kwargs):
+        return self.model.generate_content(self.prefix + image_parts(image), **kwargs)
+
+    def close(self):
+        pass
+
+
+class VertexCachedContext:
+    def __init__(self, model_name, prefix, ttl_seconds=None):
+        self.ttl = datetime.timedelta(seconds=ttl_seconds or config.CONTEXT_CACHE_TTL_SECONDS)
+        parts = [Part.from_text(item) if isinstance(item, str) else item for item in prefix]
+        self.cached_content = caching.CachedContent.create(
+            model_name=model_name,
+            contents=[Content(role="user", parts=parts)],
+            ttl=self.ttl,
+            display_name="eews-extraction-prefix",
+        )
+        self.model = GenerativeModel.from_cached_content(cached_content=self.cached_content)
+        self._expires_at = time.monotonic() + self.ttl.total_seconds()
+        self._lock = threading.Lock()
+        print(f"Created context cache {self.cached_content.resource_name} (ttl {self.ttl}).")
+
+    def _extend_if_expiring(self):
+        # Long runs outlive the TTL; push the expiry out before it lapses.
+        if time.monotonic() < self._expires_at - config.CONTEXT_CACHE_REFRESH_MARGIN_SECONDS:
+            return
+        with self._lock:
+            if time.monotonic() < self._expires_at - config.CONTEXT_CACHE_REFRESH_MARGIN_SECONDS:
+                return
+            self.cached_content.update(ttl=self.ttl)
+            self._expires_at = time.monotonic() + self.ttl.total_seconds()
+
+    def generate(self, image, **kwargs):
+        self._extend_if_expiring()
+        return self.model.generate_content(image_parts(image), **kwargs)
+
+    def close(self):
+        try:
+            self.cached_content.delete()
+        except Exception as e:
+            print(f"Could not delete context cache {self.cached_content.resource_name}: {e}")
+
+
+def open_context(model_name, prefix):
+    if config.USE_CONTEXT_CACHE:
+        try:
+            return VertexCachedContext(model_name, prefix)
+        except Exception as e:
+            # e.g. the prefix is below the model's minimum cacheable token count.
+            print(f"Context caching unavailable, sending the full prompt with each request. Reason: {e}")
+    return PrefixContext(GenerativeModel(model_name), prefix)
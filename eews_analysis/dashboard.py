@@ -0,0 +1,96 @@
+import gzip
+import html
+import json
+
+from plotly.offline import get_plotlyjs
+
+# Bundles many figures into one gzip-compressed HTML document instead of one
+# standalone file each. plotly.js is embedded once, layout templates shared
+# by several figures are stored once, and every figure's JSON sits in an
+# inert <script type="application/json"> tag that is only parsed and plotted
+# the first time its tab is opened. The page is served with
+# Content-Encoding: gzip, so browsers decompress it transparently.
+
+FILE_TYPE = 'html.gz'
+CONTENT_ENCODING = 'gzip'
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: Arial, sans-serif; margin: 0; }}
+nav {{ position: sticky; top: 0; background: #f4f4f4; border-bottom: 1px solid #ccc; padding: 6px; z-index: 10; }}
+nav button {{ margin: 2px; padding: 6px 10px; border: 1px solid #bbb; background: white; cursor: pointer; }}
+nav button.active {{ background: #1a73e8; color: white; border-color: #1a73e8; }}
+section {{ display: none; padding: 10px; }}
+section.active {{ display: block; }}
+.chart {{ height: 650px; margin-bottom: 20px; }}
+</style>
+<script>{plotlyjs}</script>
+</head>
+<body>
+<nav>{buttons}</nav>
+{sections}
+<script type="application/json" id="templates">{templates}</script>
+{figures}
+<script>
+var templates = JSON.parse(document.getElementById('templates').textContent);
+function showTab(index) {{
+  document.querySelectorAll('nav button').forEach(function (button, i) {{ button.classList.toggle('active', i === index); }});
+  document.querySelectorAll('section').forEach(function (section, i) {{ section.classList.toggle('active', i === index); }});
+  document.querySelectorAll('section')[index].querySelectorAll('.chart:not([data-plotted])').forEach(function (div) {{
+    var figure = JSON.parse(document.getElementById('figure-' + div.dataset.figure).textContent);
+    if (figure.template !== null) figure.layout.template = templates[figure.template];
+    Plotly.newPlot(div, figure.data, figure.layout, {{responsive: true}});
+    div.dataset.plotted = '1';
+  }});
+}}
+showTab(0);
+</script>
+</body>
+</html>
+"""
+
+
+def bundle(title, tabs):
+    # tabs: [(tab name, [chart job, ...]), ...] -> one chart job of FILE_TYPE.
+    payload = {'title': title, 'tabs': []}
+    for name, jobs in tabs:
+        if jobs:
+            payload['tabs'].append({'name': name, 'charts': [[job[0], json.loads(job[2])] for job in jobs]})
+    return title, FILE_TYPE, json.dumps(payload, sort_keys=True)
+
+
+def script_json(value):
+    # JSON is safe inside a <script> tag once "</" can no longer close it.
+    return json.dumps(value, separators=(',', ':')).replace('</', '<\\/')
+
+
+def render(payload_json):
+    payload = json.loads(payload_json)
+    templates, template_ids, figures = [], {}, []
+    buttons, sections = [], []
+    for tab_index, tab in enumerate(payload['tabs']):
+        buttons.append(f'<button onclick="showTab({tab_index})">{html.escape(tab["name"])}</button>')
+        divs = []
+        for chart_title, figure in tab['charts']:
+            template = figure['layout'].pop('template', None)
+            template_id = None
+            if template is not None:
+                key = json.dumps(template, sort_keys=True)
+                if key not in template_ids:
+                    template_ids[key] = len(templates)
+                    templates.append(template)
+                template_id = template_ids[key]
+            figure_index = len(figures)
+            figures.append(f'<script type="application/json" id="figure-{figure_index}">'
+                           f'{script_json({"data": figure["data"], "layout": figure["layout"], "template": template_id})}</script>')
+            divs.append(f'<div class="chart" data-figure="{figure_index}" title="{html.escape(chart_title)}"></div>')
+        sections.append(f'<section>{"".join(divs)}</section>')
+
+    page = PAGE.format(title=html.escape(payload['title']), plotlyjs=get_plotlyjs(), buttons="".join(buttons),
+                       sections="\n".join(sections), templates=script_json(templates), figures="\n".join(figures))
+    # mtime=0 keeps the bytes identical for identical figures, so the upload dedups on md5.
+    return gzip.compress(page.encode('utf-8'), mtime=0)
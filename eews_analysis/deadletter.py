@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from eews_analysis import config
+from eews_analysis.concurrency import is_quota_error
+
+# Failed extractions, keyed by blob name, with the error class and message,
+# how many times the file has failed and the last response text. Normal runs
+# leave dead-lettered files alone; "process_data --redrive" retries only the
+# transient ones, with exponential backoff and an attempt cap. Permanent
+# failures (safety blocks, unreadable images) are never retried automatically.
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+PERMANENT_ERROR_CLASSES = (
+    "InvalidArgument", "NotFound", "PermissionDenied", "FailedPrecondition", "BadRequest", "UnidentifiedImageError",
+)
+PERMANENT_MESSAGE_PATTERNS = (
+    "safety", "blocked", "prohibited_content", "recitation",
+    "unable to process input image", "invalid image", "unsupported mime", "not_found",
+)
+
+
+def dead_letter_path():
+    return os.path.join(config.OUTPUT_PATH, config.DEAD_LETTER_FILENAME)
+
+
+class BatchPredictionError(Exception):
+    # A per-line failure reported in batch prediction output.
+    pass
+
+
+def classify(error):
+    if is_quota_error(error):
+        return TRANSIENT
+    message = str(error).lower()
+    if type(error).__name__ in PERMANENT_ERROR_CLASSES or any(pattern in message for pattern in PERMANENT_MESSAGE_PATTERNS):
+        return PERMANENT
+    return TRANSIENT
+
+
+def response_text(response):
+    # Blocked responses raise on .text; keep whatever describes them instead.
+    if response is None:
+        return None
+    try:
+        text = response.text
+    except Exception:
+        text = repr(response)
+    return text[:config.DEAD_LETTER_MAX_TEXT_CHARS] if text else text
+
+
+def backoff_seconds(attempts):
+    return min(config.DEAD_LETTER_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0), config.DEAD_LETTER_MAX_BACKOFF_SECONDS)
+
+
+class DeadLetterQueue:
+    def __init__(self, entries=None, clock=time.time):
+        self.entries = entries or {}
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, bucket, path=None, clock=time.time):
+        blob = bucket.blob(path or dead_letter_path())
+        if not blob.exists():
+            return cls(clock=clock)
+        return cls(json.loads(blob.download_as_string()), clock=clock)
+
+    def save(self, bucket, path=None):
+        with self._lock:
+            data = json.dumps(self.entries, indent=2, ensure_ascii=False)
+        bucket.blob(path or dead_letter_path()).upload_from_string(data, content_type="application/json")
+
+    def record(self, blob_name, error, text=None):
+        category = classify(error)
+        now = self._clock()
+        with self._lock:
+            entry = self.entries.get(blob_name) or {"file_name": os.path.basename(blob_name), "attempts": 0, "first_failed": now}
+            entry["attempts"] += 1
+            entry.update(
+                error_class=type(error).__name__,
+                error=str(error)[:config.DEAD_LETTER_MAX_TEXT_CHARS],
+                category=category,
+                last_response=text[:config.DEAD_LETTER_MAX_TEXT_CHARS] if text else text,
+                last_failed=now,
+                next_attempt_after=now + backoff_seconds(entry["attempts"]),
+            )
+            self.entries[blob_name] = entry
+        return category
+
+    def resolve(self, blob_name):
+        with self._lock:
+            return self.entries.pop(blob_name, None) is not None
+
+    def adopt(self, blob_names):
+        # Failures recorded only as "failed" in the manifest (before this queue existed).
+        now = self._clock()
+        with self._lock:
+            for blob_name in blob_names:
+                self.entries.setdefault(blob_name, {
+                    "file_name": os.path.basename(blob_name), "attempts": 0, "first_failed": now,
+                    "error_class": None, "error": None, "category": TRANSIENT, "last_response": None,
+                    "last_failed": now, "next_attempt_after": now,
+                })
+
+    def prune(self, known_blob_names):
+        with self._lock:
+            stale = [name for name in self.entries if name not in known_blob_names]
+            for name in stale:
+                del self.entries[name]
+        return stale
+
+    def _retryable(self, entry, include_permanent):
+        if entry["attempts"] >= config.DEAD_LETTER_MAX_ATTEMPTS:
+            return False
+        return entry["category"] == TRANSIENT or include_permanent
+
+    def due(self, include_permanent=False):
+        now = self._clock()
+        with self._lock:
+            return sorted(name for name, entry in self.entries.items()
+                          if self._retryable(entry, include_permanent) and entry["next_attempt_after"] <= now)
+
+    def seconds_until_next(self, include_permanent=False):
+        now = self._clock()
+        with self._lock:
+            waits = [entry["next_attempt_after"] - now for entry in self.entries.values()
+                     if self._retryable(entry, include_permanent)]
+        return max(min(waits), 0) if waits else None
+
+    def counts(self):
+        with self._lock:
+            counts = Counter(entry["category"] for entry in self.entries.values())
+            exhausted = sum(1 for entry in self.entries.values() if entry["attempts"] >= config.DEAD_LETTER_MAX_ATTEMPTS)
+        return {TRANSIENT: counts.get(TRANSIENT, 0), PERMANENT: counts.get(PERMANENT, 0), "exhausted": exhausted}
+
+
+def print_status(bucket):
+    dead_letters = DeadLetterQueue.load(bucket)
+    counts = dead_letters.counts()
+    print(f"Dead letters gs://{config.BUCKET}/{dead_letter_path()}: {len(dead_letters.entries)} files "
+          f"({counts[TRANSIENT]} transient, {counts[PERMANENT]} permanent, {counts['exhausted']} out of attempts)")
+    by_class = Counter((entry["category"], entry["error_class"]) for entry in dead_letters.entries.values())
+    for (category, error_class), count in sorted(by_class.items(), key=lambda item: -item[1]):
+        print(f"   - {category:<9} {error_class}: {count}")
+    return counts
+
+
+if __name__ == "__main__":
+    from google.cloud import storage
+
+    storage_client = storage.Client(project=config.PROJECT_ID)
+    print_status(storage_client.bucket(config.BUCKET))
@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from eews_analysis import config
+from eews_analysis.schema import DATETIME_FORMAT
+
+# Splits the corpus into earthquakes. Records carrying both an alert time and
+# a magnitude anchor the detection: sorted by alert time, a gap longer than
+# EVENT_GAP_MINUTES starts a new event, and within that span magnitudes are
+# split wherever neighbouring values (sorted) differ by more than
+# EVENT_MAGNITUDE_TOLERANCE. Each event's posts are then every record posted
+# between its first alert and EVENT_POST_WINDOW_HOURS after its last one,
+# sliced from one sorted post-time index with searchsorted. Windows of
+# events close in time may overlap.
+
+EVENT_COLUMNS = ["name", "start", "end", "magnitude", "alerts", "posts"]
+
+
+def detect_events(df, gap_minutes=None, tolerance=None, min_alerts=None):
+    gap_minutes = config.EVENT_GAP_MINUTES if gap_minutes is None else gap_minutes
+    tolerance = config.EVENT_MAGNITUDE_TOLERANCE if tolerance is None else tolerance
+    min_alerts = config.EVENT_MIN_ALERTS if min_alerts is None else min_alerts
+
+    times = pd.to_datetime(df['alert_time'], errors='coerce', format=DATETIME_FORMAT).to_numpy(dtype='datetime64[ns]')
+    magnitudes = pd.to_numeric(df['magnitude_on_alert_screenshot'], errors='coerce').to_numpy(dtype=float)
+    anchored = ~np.isnat(times) & ~np.isnan(magnitudes)
+    times, magnitudes = times[anchored], magnitudes[anchored]
+    if not len(times):
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    order = np.argsort(times, kind='stable')
+    times, magnitudes = times[order], magnitudes[order]
+    time_groups = np.concatenate([[0], np.cumsum(np.diff(times) > np.timedelta64(int(gap_minutes * 60), 's'))])
+
+    order = np.lexsort((magnitudes, time_groups))
+    times, magnitudes, time_groups = times[order], magnitudes[order], time_groups[order]
+    split = (np.diff(time_groups) != 0) | (np.diff(magnitudes) > tolerance)
+    clusters = np.concatenate([[0], np.cumsum(split)])
+
+    events = pd.DataFrame({'cluster': clusters, 'time': times, 'magnitude': magnitudes}).groupby('cluster').agg(
+        start=('time', 'min'), end=('time', 'max'), magnitude=('magnitude', 'median'), alerts=('time', 'size'))
+    events = events[events['alerts'] >= min_alerts].sort_values('start').reset_index(drop=True)
+    events['name'] = [f"event_{start:%Y_%m_%d_%H%M}_m{magnitude:.1f}".replace('.', '_')
+                      for start, magnitude in zip(events['start'], events['magnitude'])]
+    events['posts'] = 0
+    return events[EVENT_COLUMNS]
+
+
+class PostTimeIndex:
+    # Row positions sorted by post time; a window is two binary searches.
+
+    def __init__(self, df):
+        times = pd.to_datetime(df['post_datetime'], errors='coerce', format=DATETIME_FORMAT).to_numpy(dtype='datetime64[ns]')
+        positions = np.flatnonzero(~np.isnat(times))
+        order = np.argsort(times[positions], kind='stable')
+        self.positions = positions[order]
+        self.times = times[positions][order]
+
+    def window(self, start, end):
+        low = np.searchsorted(self.times, np.datetime64(pd.Timestamp(start), 'ns'), side='left')
+        high = np.searchsorted(self.times, np.datetime64(pd.Timestamp(end), 'ns'), side='right')
+        return self.positions[low:high]
+
+
+def event_windows(df, events, post_window_hours=None):
+    # Yields (event row, row positions of its posts) and fills in events['posts'].
+    post_window = pd.Timedelta(hours=config.EVENT_POST_WINDOW_HOURS if post_window_hours is None else post_window_hours)
+    index = PostTimeIndex(df)
+    for i, event in events.iterrows():
+        positions = index.window(event['start'], event['end'] + post_window)
+        events.at[i, 'posts'] = len(positions)
+        yield event, positions
+
+
+def print_events(events):
+    if events.empty:
+        print("No events detected (no records with both an alert time and a magnitude).")
+        return
+    print(f"Detected {len(events)} events:")
+    for _, event in events.iterrows():
+        print(f"   {event['name']:<32} {event['start']:%Y-%m-%d %H:%M} - {event['end']:%H:%M}  "
+              f"M{event['magnitude']:.1f}  {event['alerts']} alerts, {event['posts']} posts")
+
+
+def save_events(bucket, events):
+    path = os.path.join(config.VISUALIZATION_PATH, config.EVENTS_FILENAME)
+    bucket.blob(path).upload_from_string(events.to_csv(index=False), content_type="text/csv")
+    print(f"Event list saved to gs://{config.BUCKET}/{path}")
+    return path
@@ -0,0 +1,152 @@
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from eews_analysis import config
+from eews_analysis.response_cache import fingerprint
+from eews_analysis.results_store import filter_index_path
+from eews_analysis.schema import DATETIME_FORMAT, UNKNOWN, NOT_APPLICABLE
+
+# Declarative row filters for clean_data. Each rule in config.FILTER_RULES
+# names a column and which rows it removes:
+#   range        numbers outside min..max (min exclusive, max inclusive by default)
+#   date_window  datetimes outside every [start, end) window
+#   allow        answers not in "values"
+#   deny         answers in "values"
+# Missing or unparseable values are never removed. Every rule compiles to one
+# boolean array over the frame and a row is removed when any rule removes it.
+
+RANGE = "range"
+DATE_WINDOW = "date_window"
+ALLOW = "allow"
+DENY = "deny"
+
+MISSING_VALUES = (UNKNOWN, NOT_APPLICABLE)
+
+
+def rule_columns(rules):
+    return sorted({rule["column"] for rule in rules})
+
+
+def _range_mask(series, rule):
+    values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+    remove = np.zeros(len(values), dtype=bool)
+    low, high = rule.get("min"), rule.get("max")
+    if low is not None:
+        remove |= values < low if rule.get("min_inclusive", False) else values <= low
+    if high is not None:
+        remove |= values > high if rule.get("max_inclusive", True) else values >= high
+    return remove
+
+
+def _date_window_mask(series, rule):
+    values = pd.to_datetime(series, errors="coerce", format=DATETIME_FORMAT)
+    inside = np.zeros(len(values), dtype=bool)
+    for start, end in rule["windows"]:
+        window = np.ones(len(values), dtype=bool)
+        if start is not None:
+            window &= (values >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            window &= (values < pd.Timestamp(end)).to_numpy()
+        inside |= window
+    return ~inside & values.notna().to_numpy()
+
+
+def _member_mask(series, values):
+    # List answers match when any of their items does.
+    values = set(values)
+    if series.map(lambda value: isinstance(value, (list, tuple, np.ndarray))).any():
+        return series.map(lambda value: any(item in values for item in value)
+                          if isinstance(value, (list, tuple, np.ndarray)) else value in values).to_numpy(dtype=bool)
+    return series.isin(values).to_numpy(dtype=bool)
+
+
+def _allow_mask(series, rule):
+    missing = series.isna().to_numpy() | series.isin(MISSING_VALUES).to_numpy()
+    return ~_member_mask(series, rule["values"]) & ~missing
+
+
+def _deny_mask(series, rule):
+    return _member_mask(series, rule["values"])
+
+
+RULE_KINDS = {RANGE: _range_mask, DATE_WINDOW: _date_window_mask, ALLOW: _allow_mask, DENY: _deny_mask}
+
+
+def compile_rules(rules):
+    compiled = []
+    for rule in rules:
+        if rule.get("kind") not in RULE_KINDS:
+            raise ValueError(f"Unknown filter rule kind {rule.get('kind')!r} in rule {rule.get('name')!r}")
+        compiled.append((rule["name"], rule["column"], RULE_KINDS[rule["kind"]], rule))
+    return compiled
+
+
+class FilterResult:
+    def __init__(self, index, names, masks):
+        self.index = index
+        self.names = list(names)
+        self.masks = masks
+        self.remove_mask = masks.any(axis=1)
+
+    @property
+    def removed(self):
+        return self.index[self.remove_mask]
+
+    @property
+    def kept(self):
+        return self.index[~self.remove_mask]
+
+    def removed_by(self):
+        names = np.array(self.names, dtype=object)
+        return {file_name: names[row].tolist()
+                for file_name, row in zip(self.removed, self.masks[self.remove_mask])}
+
+    def rule_counts(self):
+        only = self.masks & (self.masks.sum(axis=1) == 1)[:, None]
+        return {name: {"removed": int(self.masks[:, i].sum()), "only_this_rule": int(only[:, i].sum())}
+                for i, name in enumerate(self.names)}
+
+    def overlaps(self):
+        matrix = self.masks.T.astype(np.int64) @ self.masks.astype(np.int64)
+        return {(self.names[i], self.names[j]): int(matrix[i, j])
+                for i in range(len(self.names)) for j in range(i + 1, len(self.names)) if matrix[i, j]}
+
+    def print_report(self):
+        print(f"   - Entries to keep: {len(self.index) - int(self.remove_mask.sum())}")
+        print(f"   - Entries to remove: {int(self.remove_mask.sum())}")
+        for name, counts in self.rule_counts().items():
+            print(f"      {name:<20} removes {counts['removed']:6d}  ({counts['only_this_rule']} by this rule alone)")
+        for (first, second), count in self.overlaps().items():
+            print(f"      {first} & {second}: {count} rows removed by both")
+
+
+def evaluate(df, rules=None):
+    rules = config.FILTER_RULES if rules is None else rules
+    compiled = compile_rules(rules)
+    masks = np.zeros((len(df), len(compiled)), dtype=bool)
+    for i, (name, column, build_mask, rule) in enumerate(compiled):
+        if column in df.columns:
+            masks[:, i] = build_mask(df[column], rule)
+        else:
+            print(f"   - Warning: filter rule '{name}' skipped, column '{column}' is not in the results.")
+    return FilterResult(df.index, [name for name, _, _, _ in compiled], masks)
+
+
+def save_filter_index(bucket, result, rules=None):
+    rules = config.FILTER_RULES if rules is None else rules
+    index = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "rules": rules,
+        "rules_hash": fingerprint(rules),
+        "entries": len(result.index),
+        "kept": len(result.kept),
+        "rule_counts": result.rule_counts(),
+        "removed": result.removed_by(),
+    }
+    path = filter_index_path()
+    bucket.blob(path).upload_from_string(json.dumps(index, indent=2, default=str), content_type="application/json")
+    print(f"Filter index ({len(result.removed)} removed, {len(result.kept)} kept) saved to: gs://{config.BUCKET}/{path}")
+    return path
@@ -0,0 +1,86 @@
+# Turkish place names for location normalization: all 81 provinces, and the
+# districts of the provinces around the Marmara Sea and the other provinces
+# that show up in the tweets. Names are in Turkish spelling; matching folds
+# diacritics. Central districts named "Merkez" are left out (every province
+# has one), as is Balikesir's "Marmara", which would swallow "Marmara Region".
+
+PROVINCES = (
+    "Adana", "Adıyaman", "Afyonkarahisar", "Ağrı", "Amasya", "Ankara", "Antalya", "Artvin", "Aydın", "Balıkesir",
+    "Bilecik", "Bingöl", "Bitlis", "Bolu", "Burdur", "Bursa", "Çanakkale", "Çankırı", "Çorum", "Denizli",
+    "Diyarbakır", "Edirne", "Elazığ", "Erzincan", "Erzurum", "Eskişehir", "Gaziantep", "Giresun", "Gümüşhane",
+    "Hakkari", "Hatay", "Isparta", "Mersin", "İstanbul", "İzmir", "Kars", "Kastamonu", "Kayseri", "Kırklareli",
+    "Kırşehir", "Kocaeli", "Konya", "Kütahya", "Malatya", "Manisa", "Kahramanmaraş", "Mardin", "Muğla", "Muş",
+    "Nevşehir", "Niğde", "Ordu", "Rize", "Sakarya", "Samsun", "Siirt", "Sinop", "Sivas", "Tekirdağ", "Tokat",
+    "Trabzon", "Tunceli", "Şanlıurfa", "Uşak", "Van", "Yozgat", "Zonguldak", "Aksaray", "Bayburt", "Karaman",
+    "Kırıkkale", "Batman", "Şırnak", "Bartın", "Ardahan", "Iğdır", "Yalova", "Karabük", "Kilis", "Osmaniye", "Düzce",
+)
+
+DISTRICTS = {
+    "İstanbul": (
+        "Adalar", "Arnavutköy", "Ataşehir", "Avcılar", "Bağcılar", "Bahçelievler", "Bakırköy", "Başakşehir",
+        "Bayrampaşa", "Beşiktaş", "Beykoz", "Beylikdüzü", "Beyoğlu", "Büyükçekmece", "Çatalca", "Çekmeköy",
+        "Esenler", "Esenyurt", "Eyüpsultan", "Fatih", "Gaziosmanpaşa", "Güngören", "Kadıköy", "Kağıthane", "Kartal",
+        "Küçükçekmece", "Maltepe", "Pendik", "Sancaktepe", "Sarıyer", "Silivri", "Sultanbeyli", "Sultangazi", "Şile",
+        "Şişli", "Tuzla", "Ümraniye", "Üsküdar", "Zeytinburnu",
+    ),
+    "İzmir": (
+        "Aliağa", "Balçova", "Bayındır", "Bayraklı", "Bergama", "Beydağ", "Bornova", "Buca", "Çeşme", "Çiğli",
+        "Dikili", "Foça", "Gaziemir", "Güzelbahçe", "Karabağlar", "Karaburun", "Karşıyaka", "Kemalpaşa", "Kınık",
+        "Kiraz", "Konak", "Menderes", "Menemen", "Narlıdere", "Ödemiş", "Seferihisar", "Selçuk", "Tire", "Torbalı",
+        "Urla",
+    ),
+    "Ankara": (
+        "Akyurt", "Altındağ", "Ayaş", "Bala", "Beypazarı", "Çamlıdere", "Çankaya", "Çubuk", "Elmadağ", "Etimesgut",
+        "Evren", "Gölbaşı", "Güdül", "Haymana", "Kahramankazan", "Kalecik", "Keçiören", "Kızılcahamam", "Mamak",
+        "Nallıhan", "Polatlı", "Pursaklar", "Sincan", "Şereflikoçhisar", "Yenimahalle",
+    ),
+    "Tekirdağ": (
+        "Çerkezköy", "Çorlu", "Ergene", "Hayrabolu", "Kapaklı", "Malkara", "Marmaraereğlisi", "Muratlı", "Saray",
+        "Süleymanpaşa", "Şarköy",
+    ),
+    "Kocaeli": (
+        "Başiskele", "Çayırova", "Darıca", "Derince", "Dilovası", "Gebze", "Gölcük", "İzmit", "Kandıra", "Karamürsel",
+        "Kartepe", "Körfez",
+    ),
+    "Bursa": (
+        "Büyükorhan", "Gemlik", "Gürsu", "Harmancık", "İnegöl", "İznik", "Karacabey", "Keles", "Kestel", "Mudanya",
+        "Mustafakemalpaşa", "Nilüfer", "Orhaneli", "Orhangazi", "Osmangazi", "Yenişehir", "Yıldırım",
+    ),
+    "Muğla": (
+        "Bodrum", "Dalaman", "Datça", "Fethiye", "Kavaklıdere", "Köyceğiz", "Marmaris", "Menteşe", "Milas", "Ortaca",
+        "Seydikemer", "Ula", "Yatağan",
+    ),
+    "Antalya": (
+        "Akseki", "Aksu", "Alanya", "Demre", "Döşemealtı", "Elmalı", "Finike", "Gazipaşa", "Gündoğmuş", "İbradı", "Kaş",
+        "Kemer", "Kepez", "Konyaaltı", "Korkuteli", "Kumluca", "Manavgat", "Muratpaşa", "Serik",
+    ),
+    "Balıkesir": (
+        "Altıeylül", "Ayvalık", "Balya", "Bandırma", "Bigadiç", "Burhaniye", "Dursunbey", "Edremit", "Erdek", "Gömeç",
+        "Gönen", "Havran", "İvrindi", "Karesi", "Kepsut", "Manyas", "Savaştepe", "Sındırgı", "Susurluk",
+    ),
+    "Çanakkale": (
+        "Ayvacık", "Bayramiç", "Biga", "Bozcaada", "Çan", "Eceabat", "Ezine", "Gelibolu", "Gökçeada", "Lapseki",
+        "Yenice",
+    ),
+    "Yalova": ("Altınova", "Armutlu", "Çiftlikköy", "Çınarcık", "Termal"),
+    "Sakarya": (
+        "Adapazarı", "Akyazı", "Arifiye", "Erenler", "Ferizli", "Geyve", "Hendek", "Karapürçek", "Karasu", "Kaynarca",
+        "Kocaali", "Pamukova", "Sapanca", "Serdivan", "Söğütlü", "Taraklı",
+    ),
+    "Edirne": ("Enez", "Havsa", "İpsala", "Keşan", "Lalapaşa", "Meriç", "Süloğlu", "Uzunköprü"),
+    "Kırklareli": ("Babaeski", "Demirköy", "Kofçaz", "Lüleburgaz", "Pehlivanköy", "Pınarhisar", "Vize"),
+}
+
+# Other names people use for a province.
+PROVINCE_ALIASES = {
+    "Antep": "Gaziantep", "Maraş": "Kahramanmaraş", "Urfa": "Şanlıurfa", "Afyon": "Afyonkarahisar",
+    "İçel": "Mersin", "Constantinople": "İstanbul", "Smyrna": "İzmir",
+}
+
+# Regions and seas are recognised so they are not fuzzily matched to a similar
+# place name ("Marmara" -> "Marmaris"), but they resolve to no province.
+REGIONS = (
+    "Marmara", "Ege", "Aegean", "Akdeniz", "Mediterranean", "Karadeniz", "Black Sea", "İç Anadolu",
+    "Central Anatolia", "Doğu Anadolu", "Eastern Anatolia", "Güneydoğu Anadolu", "Southeastern Anatolia", "Anatolia",
+    "Trakya", "Thrace",
+)
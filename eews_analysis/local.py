@@ -0,0 +1,232 @@
+import base64
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+# Local stand-ins for the cloud services, used to exercise the pipeline
+# (throughput, retries, resume) without a GCP project.
+
+FAKE_RESULT = {
+    "username": "@fake_user",
+    "post_datetime": "2025-04-23T12:59",
+    "post_location": "Istanbul",
+    "warning_time_seconds": "UNKNOWN",
+    "with_alert_screenshot": "YES",
+    "alert_time": "2025-04-23T12:49",
+    "magnitude_on_alert_screenshot": "5.3",
+    "alert_type": "BE_AWARE_NOTIFICATION",
+    "alert_source": "AEA",
+    "reasoning": "Synthetic response from FakeModel.",
+}
+
+
+# Rough Gemini accounting: ~4 characters per text token, 258 tokens per image.
+IMAGE_TOKENS = 258
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+def estimate_tokens(contents):
+    return sum(len(item) // 4 if isinstance(item, str) else IMAGE_TOKENS for item in contents)
+
+
+class FakeModel:
+    def __init__(self, latency=0.05, max_requests_per_second=None, result=None, clock=time.monotonic):
+        self.latency = latency
+        self.max_requests_per_second = max_requests_per_second
+        self.result = result or FAKE_RESULT
+        self.call_count = 0
+        self.throttled_count = 0
+        self._clock = clock
+        self._recent_calls = deque()
+        self._lock = threading.Lock()
+
+    def _check_quota(self):
+        if self.max_requests_per_second is None:
+            return
+        with self._lock:
+            now = self._clock()
+            while self._recent_calls and now - self._recent_calls[0] >= 1.0:
+                self._recent_calls.popleft()
+            if len(self._recent_calls) >= self.max_requests_per_second:
+                self.throttled_count += 1
+                raise ResourceExhausted("429 Quota exceeded for aiplatform.googleapis.com/generate_content_requests")
+            self._recent_calls.append(now)
+
+    def generate_content(self, contents, generation_config=None, safety_settings=None):
+        self._check_quota()
+        with self._lock:
+            self.call_count += 1
+        time.sleep(self.latency)
+        text = "```json\n" + json.dumps(self.result, indent=2) + "\n```"
+        usage_metadata = SimpleNamespace(
+            prompt_token_count=estimate_tokens(contents),
+            candidates_token_count=len(text) // 4,
+            cached_content_token_count=0,
+        )
+        return SimpleNamespace(text=text, usage_metadata=usage_metadata)
+
+
+class FakeCachedContext:
+    # Mirrors context_cache.VertexCachedContext: the prefix is "uploaded" once
+    # and each request sends only the image, reporting the prefix as cached.
+
+    def __init__(self, model, prefix):
+        self.model = model
+        self.prefix_tokens = estimate_tokens(prefix)
+
+    def generate(self, image, **kwargs):
+        parts = list(image) if isinstance(image, (list, tuple)) else [image]
+        response = self.model.generate_content(parts, **kwargs)
+        response.usage_metadata.prompt_token_count += self.prefix_tokens
+        response.usage_metadata.cached_content_token_count = self.prefix_tokens
+        return response
+
+    def close(self):
+        pass
+
+
+class LocalBatchBackend:
+    # Stand-in for batch.VertexBatchBackend that "completes" a job from a
+    # directory of canned responses named "<screenshot>.json" (or the
+    # screenshot name without ".png"), each holding the raw model text.
+
+    def __init__(self, bucket, responses_dir):
+        self.bucket = bucket
+        self.responses_dir = responses_dir
+
+    def submit(self, input_uri, output_uri_prefix):
+        return {"input": input_uri, "output": output_uri_prefix.rstrip("/") + "/prediction-local"}
+
+    def _canned_text(self, file_name):
+        for name in (f"{file_name}.json", f"{os.path.splitext(file_name)[0]}.json"):
+            path = os.path.join(self.responses_dir, name)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    return f.read()
+        return None
+
+    def poll(self, job):
+        requests_path = job["input"].split("/", 3)[3]
+        output_lines = []
+        for line in self.bucket.blob(requests_path).download_as_string().decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            image_uri = record["request"]["contents"][-1]["parts"][-1]["fileData"]["fileUri"]
+            text = self._canned_text(os.path.basename(image_uri))
+            if text is None:
+                record["status"] = "NOT_FOUND: no canned response"
+            else:
+                record["response"] = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+                record["status"] = ""
+            output_lines.append(json.dumps(record, ensure_ascii=False))
+
+        output_path = job["output"].split("/", 3)[3] + "/predictions.jsonl"
+        self.bucket.blob(output_path).upload_from_string("\n".join(output_lines) + "\n", content_type="application/jsonl")
+        return "SUCCEEDED", job["output"]
+
+
+class LocalBlob:
+    # The subset of google.cloud.storage.Blob the pipeline uses, backed by a
+    # file under the bucket's directory.
+
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    @property
+    def path(self):
+        return os.path.join(self.bucket.root, self.name)
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    @property
+    def generation(self):
+        return os.stat(self.path).st_mtime_ns
+
+    @property
+    def md5_hash(self):
+        with open(self.path, "rb") as f:
+            return base64.b64encode(hashlib.md5(f.read()).digest()).decode("ascii")
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def download_as_string(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    download_as_bytes = download_as_string
+
+    def upload_from_string(self, data, content_type=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def upload_from_filename(self, filename, content_type=None):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        shutil.copyfile(filename, self.path)
+
+    def open(self, mode="rb"):
+        return open(self.path, mode)
+
+    def delete(self):
+        os.remove(self.path)
+
+
+class LocalBucket:
+    def __init__(self, root, name):
+        self.root = root
+        self.name = name
+
+    def blob(self, name):
+        return LocalBlob(self, name)
+
+    def copy_blob(self, blob, destination_bucket, new_name):
+        destination = destination_bucket.blob(new_name)
+        os.makedirs(os.path.dirname(destination.path), exist_ok=True)
+        shutil.copyfile(blob.path, destination.path)
+        return destination
+
+    def rename_blob(self, blob, new_name):
+        destination = self.blob(new_name)
+        os.makedirs(os.path.dirname(destination.path), exist_ok=True)
+        os.replace(blob.path, destination.path)
+        return destination
+
+    def list_blobs(self, prefix="", fields=None):
+        names = []
+        for directory, _, files in os.walk(self.root):
+            for file_name in files:
+                name = os.path.relpath(os.path.join(directory, file_name), self.root).replace(os.sep, "/")
+                if name.startswith(prefix) and ".tmp-" not in name:
+                    names.append(name)
+        return [self.blob(name) for name in sorted(names)]
+
+
+class LocalStorageClient:
+    # Stand-in for google.cloud.storage.Client: each bucket is a directory
+    # under root, object names are relative paths inside it.
+
+    def __init__(self, root):
+        self.root = root
+
+    def bucket(self, name):
+        return LocalBucket(os.path.join(self.root, name), name)
+
+    def list_blobs(self, bucket_name, prefix="", fields=None):
+        return self.bucket(bucket_name).list_blobs(prefix, fields)
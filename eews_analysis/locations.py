@@ -0,0 +1,211 @@
+import csv
+import json
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from eews_analysis import config
+from eews_analysis.gazetteer import PROVINCES, DISTRICTS, PROVINCE_ALIASES, REGIONS
+from eews_analysis.response_cache import fingerprint
+from eews_analysis.schema import UNKNOWN, NOT_APPLICABLE
+
+# Normalizes free-text locations ("Izmir karsiyaka", "Silivri, Marmara",
+# "west of Istanbul") to a province (or one of LOCATION_KEEP_DISTRICTS) using
+# the gazetteer: diacritics are folded, each comma-separated part is looked
+# up exactly, then through a trigram index ranked by edit distance. Only the
+# unique values of a column are matched; answers are memoized on disk and
+# mapped back onto the rows by their factorized codes.
+
+LOCATION_COLUMNS = ("post_location", "user_approximate_location_on_alert")
+PASSTHROUGH = (UNKNOWN, NOT_APPLICABLE)
+
+ASCII_LETTERS = str.maketrans("çğıİöşüÇĞÖŞÜâîûÂÎÛ", "cgiIosuCGOSUaiuAIU")
+SEGMENT_SEPARATORS = re.compile(r"[,/;()|]| - | and | ve ")
+STOP_WORDS = {
+    "near", "nearby", "around", "close", "to", "west", "east", "north", "south", "of", "the", "in", "at",
+    "city", "province", "district", "region", "center", "centre", "merkez", "turkey", "turkiye", "il", "ilce",
+    "sea", "coast", "area", "bolgesi", "denizi",
+}
+MIN_FUZZY_LENGTH = 4
+MAX_FUZZY_CANDIDATES = 20
+
+
+def ascii_name(text):
+    text = unicodedata.normalize("NFKD", text.translate(ASCII_LETTERS))
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def fold(text):
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", ascii_name(text).lower()).split())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(first, second):
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i]
+        for j, second_char in enumerate(second, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (first_char != second_char)))
+        previous = current
+    return previous[-1]
+
+
+class Gazetteer:
+    def __init__(self, provinces=PROVINCES, districts=DISTRICTS, aliases=PROVINCE_ALIASES, regions=REGIONS):
+        # folded name -> (label, province label, is_district); provinces win name clashes.
+        self.entries = {}
+        for province in provinces:
+            self.entries[fold(province)] = (ascii_name(province), ascii_name(province), False)
+        for alias, province in aliases.items():
+            self.entries.setdefault(fold(alias), (ascii_name(province), ascii_name(province), False))
+        for province, names in districts.items():
+            for name in names:
+                self.entries.setdefault(fold(name), (ascii_name(name), ascii_name(province), True))
+        self.regions = {" ".join(token for token in fold(region).split() if token not in STOP_WORDS) for region in regions}
+
+        self.index = defaultdict(set)
+        for name in self.entries:
+            for gram in trigrams(name):
+                self.index[gram].add(name)
+
+    def fuzzy(self, text, max_ratio):
+        shared = Counter(name for gram in trigrams(text) for name in self.index.get(gram, ()))
+        best = None
+        for name, _ in shared.most_common(MAX_FUZZY_CANDIDATES):
+            distance = edit_distance(text, name)
+            if distance > int(len(name) * max_ratio):
+                continue
+            rank = (distance, self.entries[name][2])
+            if best is None or rank < best[0]:
+                best = (rank, name)
+        return self.entries[best[1]] if best else None
+
+
+class LocationNormalizer:
+    def __init__(self, gazetteer=None, path=None, aliases=None, keep_districts=None, max_edit_ratio=None):
+        self.gazetteer = gazetteer or Gazetteer()
+        self.path = path or config.LOCATION_CACHE_PATH
+        aliases = config.LOCATION_ALIASES if aliases is None else aliases
+        self.aliases = {fold(raw): label for raw, label in aliases.items()}
+        self.keep_districts = set(config.LOCATION_KEEP_DISTRICTS if keep_districts is None else keep_districts)
+        self.max_edit_ratio = config.LOCATION_MAX_EDIT_RATIO if max_edit_ratio is None else max_edit_ratio
+        self.key = fingerprint(sorted(self.gazetteer.entries.items()), sorted(self.gazetteer.regions), self.aliases,
+                               sorted(self.keep_districts), self.max_edit_ratio)
+        self.memo = {}
+        self.unmatched = Counter()
+        self.memo_hits = 0
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return self
+        # A different gazetteer or settings invalidate every stored answer.
+        if stored.get("key") == self.key:
+            self.memo = stored["values"]
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"key": self.key, "values": self.memo}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def _match_segment(self, segment):
+        tokens = [token for token in fold(segment).split() if token not in STOP_WORDS]
+        entries = self.gazetteer.entries
+        joined = " ".join(tokens)
+        if joined in entries:
+            return [entries[joined]]
+        if joined in self.gazetteer.regions:
+            return []
+        tokens = [token for token in tokens if token not in self.gazetteer.regions]
+        matches = []
+        for first, second in zip(tokens, tokens[1:]):
+            if first + second in entries:
+                matches.append(entries[first + second])
+        for token in tokens:
+            entry = entries.get(token)
+            if entry is None and len(token) >= MIN_FUZZY_LENGTH:
+                entry = self.gazetteer.fuzzy(token, self.max_edit_ratio)
+            if entry is not None:
+                matches.append(entry)
+        return matches
+
+    def match(self, raw):
+        folded = fold(raw)
+        if folded in self.aliases:
+            return self.aliases[folded]
+        matches = []
+        for segment in SEGMENT_SEPARATORS.split(ascii_name(raw).lower()):
+            matches.extend(self._match_segment(segment))
+        if not matches:
+            return None
+        # A district names the place more precisely than its province.
+        label, province, _ = next((entry for entry in matches if entry[2]), matches[0])
+        return label if label in self.keep_districts else province
+
+    def resolve(self, raw):
+        if raw in self.memo:
+            self.memo_hits += 1
+            return self.memo[raw]
+        self.memo[raw] = self.match(raw)
+        return self.memo[raw]
+
+    def normalize_series(self, series):
+        codes, uniques = pd.factorize(series)
+        rows = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        labels = np.empty(len(uniques) + 1, dtype=object)
+        labels[-1] = np.nan
+        for i, raw in enumerate(uniques):
+            if raw in PASSTHROUGH:
+                labels[i] = raw
+                continue
+            label = self.resolve(str(raw))
+            if label is None:
+                self.unmatched[raw] += int(rows[i])
+                label = raw
+            labels[i] = label
+        # Code -1 (missing) picks the trailing NaN.
+        return pd.Series(labels[codes], index=series.index, name=series.name)
+
+    def normalize(self, df, columns=LOCATION_COLUMNS):
+        # A new frame: df is often a filtered slice of the results.
+        return df.assign(**{column: self.normalize_series(df[column]) for column in columns if column in df.columns})
+
+    def print_unmatched_report(self, limit=20):
+        if not self.unmatched:
+            print("All locations matched the gazetteer.")
+            return
+        print(f"{len(self.unmatched)} location values ({sum(self.unmatched.values())} rows) did not match the gazetteer:")
+        for raw, rows in self.unmatched.most_common(limit):
+            print(f"   {rows:6d}  {raw}")
+
+    def write_unmatched_report(self, path=None):
+        path = path or config.LOCATION_UNMATCHED_REPORT
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["value", "rows"])
+            writer.writerows(self.unmatched.most_common())
+        return path
+
+
+def normalize_locations(df, columns=LOCATION_COLUMNS):
+    normalizer = LocationNormalizer().load()
+    df = normalizer.normalize(df, columns)
+    normalizer.save()
+    normalizer.print_unmatched_report()
+    path = normalizer.write_unmatched_report()
+    print(f"Location memo: {len(normalizer.memo)} values ({normalizer.memo_hits} reused); unmatched report in {path}")
+    return df
@@ -0,0 +1,112 @@
+import json
+import os
+from collections import Counter
+
+from eews_analysis import config
+
+# Persisted index of every input screenshot, keyed by blob name. Each entry
+# records the object's generation, size and md5 plus its processing status,
+# so a run only has to diff one cheap listing against it instead of walking
+# every blob, and other steps can find a file without probing the bucket.
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+STATUSES = (PENDING, DONE, FAILED)
+
+LIST_FIELDS = "items(name,generation,size,md5Hash),nextPageToken"
+
+
+def manifest_path():
+    return os.path.join(config.OUTPUT_PATH, config.MANIFEST_FILENAME)
+
+
+class InputManifest:
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, bucket):
+        blob = bucket.blob(manifest_path())
+        if not blob.exists():
+            return cls()
+        return cls(json.loads(blob.download_as_string()))
+
+    def save(self, bucket):
+        bucket.blob(manifest_path()).upload_from_string(
+            json.dumps(self.entries, separators=(",", ":")), content_type="application/json")
+
+    def refresh(self, storage_client, prefixes=None):
+        prefixes = prefixes or (config.INPUT_PATH_1, config.INPUT_PATH_2)
+        seen = set()
+        new_count = changed_count = 0
+
+        for prefix in prefixes:
+            for blob in storage_client.list_blobs(config.BUCKET, prefix=prefix, fields=LIST_FIELDS):
+                if not blob.name.lower().endswith(".png"):
+                    continue
+                seen.add(blob.name)
+                entry = self.entries.get(blob.name)
+                if entry is None:
+                    new_count += 1
+                    entry = {"status": PENDING}
+                elif entry["generation"] != blob.generation or entry.get("md5") != blob.md5_hash:
+                    changed_count += 1
+                    entry = {"status": PENDING, "changed": True}
+                else:
+                    continue
+                entry.update(generation=blob.generation, size=blob.size, md5=blob.md5_hash)
+                self.entries[blob.name] = entry
+
+        removed = [name for name in self.entries if name not in seen]
+        for name in removed:
+            del self.entries[name]
+
+        print(f"Manifest refreshed: {new_count} new, {changed_count} changed, {len(removed)} removed, {len(self.entries)} total.")
+        return new_count, changed_count, len(removed)
+
+    def reconcile(self, completed_file_names):
+        # Results written before a crash are in the checkpoint keys but were never
+        # marked here. Overwritten blobs ("changed") still need a fresh extraction.
+        for blob_name, entry in self.entries.items():
+            if entry["status"] != DONE and not entry.get("changed") and os.path.basename(blob_name) in completed_file_names:
+                entry["status"] = DONE
+
+    def mark(self, blob_name, status):
+        entry = self.entries[blob_name]
+        entry["status"] = status
+        if status == DONE:
+            entry.pop("changed", None)
+
+    def blob_names(self, *statuses):
+        return sorted(name for name, entry in self.entries.items() if entry["status"] in statuses)
+
+    def counts(self):
+        counts = Counter(entry["status"] for entry in self.entries.values())
+        return {status: counts.get(status, 0) for status in STATUSES}
+
+    def locations(self):
+        # file name -> blob name; INPUT_PATH_1 sorts first, matching the old lookup order.
+        index = {}
+        for blob_name in sorted(self.entries):
+            index.setdefault(os.path.basename(blob_name), blob_name)
+        return index
+
+    def remove(self, blob_name):
+        self.entries.pop(blob_name, None)
+
+
+def print_status(bucket):
+    manifest = InputManifest.load(bucket)
+    counts = manifest.counts()
+    print(f"Input manifest gs://{config.BUCKET}/{manifest_path()}: {len(manifest.entries)} files")
+    for status in STATUSES:
+        print(f"   - {status}: {counts[status]}")
+    return counts
+
+
+if __name__ == "__main__":
+    from google.cloud import storage
+
+    storage_client = storage.Client(project=config.PROJECT_ID)
+    print_status(storage_client.bucket(config.BUCKET))
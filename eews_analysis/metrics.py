@@ -0,0 +1,331 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from eews_analysis import config
+
+# Run metrics for the three entry points: stage timers, latency histograms,
+# counters labelled by stage / exception type, token totals and storage
+# traffic. Each run writes "<pipeline>-<time>-<pid>-<rand>.json" plus
+# "<pipeline>.prom" (Prometheus text format, overwritten each run) under
+# METRICS_DIR.
+
+PREFIX = "eews_"
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    def __init__(self, pipeline, buckets=None):
+        self.pipeline = pipeline
+        self.buckets = buckets or config.METRICS_LATENCY_BUCKETS
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.buckets)
+            self.histograms[key].observe(value)
+
+    def add_stage_time(self, stage, seconds):
+        with self._lock:
+            total, calls = self.stages.get(stage, (0.0, 0))
+            self.stages[stage] = (total + seconds, calls + 1)
+
+    @contextmanager
+    def stage(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage_time(stage, time.perf_counter() - started)
+
+    def record_error(self, stage, error):
+        self.inc("errors_total", stage=stage, type=type(error).__name__)
+
+    def record_usage(self, usage):
+        self.inc("model_requests_total", usage.requests)
+        self.inc("model_input_tokens_total", usage.prompt_tokens)
+        self.inc("model_cached_input_tokens_total", usage.cached_tokens)
+        self.inc("model_output_tokens_total", usage.output_tokens)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "pipeline": self.pipeline,
+                "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec="seconds"),
+                "wall_seconds": round(time.time() - self.started, 3),
+                "stages": {stage: {"seconds": round(total, 4), "calls": calls}
+                           for stage, (total, calls) in sorted(self.stages.items())},
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "histograms": [{"name": name, "labels": dict(labels), "count": histogram.count,
+                                "sum": round(histogram.sum, 4),
+                                "buckets": {str(bound): count for bound, count in histogram.cumulative()}}
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+
+    def to_prometheus(self):
+        pipeline = (("pipeline", self.pipeline),)
+        lines = []
+        with self._lock:
+            lines.append(f"# TYPE {PREFIX}stage_seconds_total counter")
+            for stage, (total, _) in sorted(self.stages.items()):
+                lines.append(f"{PREFIX}stage_seconds_total{_format_labels(pipeline, [('stage', stage)])} {total:.6f}")
+            lines.append(f"# TYPE {PREFIX}stage_calls_total counter")
+            for stage, (_, calls) in sorted(self.stages.items()):
+                lines.append(f"{PREFIX}stage_calls_total{_format_labels(pipeline, [('stage', stage)])} {calls}")
+
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        lines.append(f"{PREFIX}{name}{_format_labels(pipeline + labels)} {value}")
+
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for (histogram_name, labels), histogram in sorted(self.histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    for bound, count in histogram.cumulative():
+                        lines.append(f"{PREFIX}{name}_bucket{_format_labels(pipeline + labels, [('le', bound)])} {count}")
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(pipeline + labels, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{PREFIX}{name}_sum{_format_labels(pipeline + labels)} {histogram.sum:.6f}")
+                    lines.append(f"{PREFIX}{name}_count{_format_labels(pipeline + labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def print_summary(self):
+        print(f"\n--- {self.pipeline} stage timings ---")
+        for stage, (total, calls) in sorted(self.stages.items(), key=lambda item: item[1][0], reverse=True):
+            print(f"   {total:9.2f}s  {calls:6d} calls  {stage}")
+
+    def write(self, directory=None):
+        directory = directory or config.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.fromtimestamp(self.started, timezone.utc).strftime("%Y%m%dT%H%M%S")
+        # pid + random suffix: two runs started in the same second must not overwrite each other.
+        json_path = os.path.join(directory, f"{self.pipeline}-{timestamp}-{os.getpid()}-{uuid.uuid4().hex[:6]}.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        prometheus_path = os.path.join(directory, f"{self.pipeline}.prom")
+        with open(prometheus_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        print(f"Metrics written to {json_path} and {prometheus_path}")
+        return json_path
+
+
+class ProgressLine:
+    # Single self-overwriting status line: done / total, throughput and ETA.
+
+    def __init__(self, total, label, interval=1.0, stream=sys.stderr, clock=time.monotonic):
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.failed = 0
+        self._clock = clock
+        self._started = clock()
+        self._last_draw = None
+        self._lock = threading.Lock()
+
+    def update(self, ok=True):
+        with self._lock:
+            self.done += 1
+            if not ok:
+                self.failed += 1
+            now = self._clock()
+            if self._last_draw is None or now - self._last_draw >= self.interval or self.done == self.total:
+                self._last_draw = now
+                self._draw(now)
+
+    def _draw(self, now):
+        elapsed = max(now - self._started, 1e-9)
+        rate = self.done / elapsed
+        remaining = (self.total - self.done) / rate if rate else 0
+        minutes, seconds = divmod(int(remaining), 60)
+        self.stream.write(f"\r[{self.label}] {self.done}/{self.total} ({self.failed} failed)  "
+                          f"{rate:.2f}/s  ETA {minutes:02d}:{seconds:02d}  ")
+        self.stream.flush()
+
+    def close(self):
+        if self._last_draw is not None:
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+class _CountingReader:
+    def __init__(self, f, metrics):
+        self._f = f
+        self._metrics = metrics
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        self._metrics.inc("storage_bytes_downloaded_total", len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        self._f.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._f.__exit__(*exc)
+
+
+class _InstrumentedBlob:
+    def __init__(self, blob, metrics):
+        self._blob = blob
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._blob, name)
+
+    def __setattr__(self, name, value):
+        # Blob properties (content_encoding, metadata, ...) are set on the wrapped blob.
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._blob, name, value)
+
+    def download_as_string(self, *args, **kwargs):
+        with self._metrics.stage("download"):
+            data = self._blob.download_as_string(*args, **kwargs)
+        self._metrics.inc("storage_bytes_downloaded_total", len(data))
+        return data
+
+    def upload_from_string(self, data, *args, **kwargs):
+        with self._metrics.stage("upload"):
+            self._blob.upload_from_string(data, *args, **kwargs)
+        self._metrics.inc("storage_bytes_uploaded_total", len(data.encode("utf-8") if isinstance(data, str) else data))
+
+    def upload_from_filename(self, filename, *args, **kwargs):
+        with self._metrics.stage("upload"):
+            self._blob.upload_from_filename(filename, *args, **kwargs)
+        self._metrics.inc("storage_bytes_uploaded_total", os.path.getsize(filename))
+
+    def open(self, mode="rb", *args, **kwargs):
+        f = self._blob.open(mode, *args, **kwargs)
+        return _CountingReader(f, self._metrics) if "r" in mode else f
+
+
+class _InstrumentedBucket:
+    def __init__(self, bucket, metrics):
+        self._bucket = bucket
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._bucket, name)
+
+    def blob(self, name, *args, **kwargs):
+        return _InstrumentedBlob(self._bucket.blob(name, *args, **kwargs), self._metrics)
+
+    def copy_blob(self, blob, destination_bucket, new_name=None, *args, **kwargs):
+        with self._metrics.stage("copy"):
+            return self._bucket.copy_blob(_unwrap(blob), _unwrap(destination_bucket), new_name, *args, **kwargs)
+
+    def rename_blob(self, blob, new_name, *args, **kwargs):
+        with self._metrics.stage("copy"):
+            return self._bucket.rename_blob(_unwrap(blob), new_name, *args, **kwargs)
+
+    def list_blobs(self, *args, **kwargs):
+        with self._metrics.stage("list"):
+            blobs = list(self._bucket.list_blobs(*args, **kwargs))
+        self._metrics.inc("storage_objects_listed_total", len(blobs))
+        return blobs
+
+
+class _InstrumentedClient:
+    def __init__(self, client, metrics):
+        self._client = client
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def bucket(self, name, *args, **kwargs):
+        return _InstrumentedBucket(self._client.bucket(name, *args, **kwargs), self._metrics)
+
+    def list_blobs(self, *args, **kwargs):
+        return self._count_listed(self._client.list_blobs(*args, **kwargs))
+
+    def _count_listed(self, blobs):
+        # Times and counts the listing while yielding it, so a large prefix is
+        # never held in memory; only the time spent fetching pages is counted.
+        count = 0
+        seconds = 0.0
+        iterator = iter(blobs)
+        try:
+            while True:
+                started = time.perf_counter()
+                blob = next(iterator, None)
+                seconds += time.perf_counter() - started
+                if blob is None:
+                    return
+                count += 1
+                yield blob
+        finally:
+            self._metrics.add_stage_time("list", seconds)
+            self._metrics.inc("storage_objects_listed_total", count)
+
+
+def _unwrap(obj):
+    if isinstance(obj, _InstrumentedBlob):
+        return obj._blob
+    if isinstance(obj, _InstrumentedBucket):
+        return obj._bucket
+    return obj
+
+
+def instrument_storage(storage_client, metrics):
+    # Wraps a storage client so every list / download / upload made through it
+    # is timed as a stage and its bytes counted, without touching call sites.
+    return _InstrumentedClient(storage_client, metrics)
@@ -0,0 +1,261 @@
+import argparse
+import base64
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from eews_analysis import config
+from eews_analysis.response_cache import fingerprint
+
+try:
+    from PIL import Image, ImageChops
+except ImportError:
+    Image = None
+
+# Optional stage that shrinks screenshots before they are sent to the model:
+# trims flat borders, caps the long edge, re-encodes (WebP by default) and
+# splits very tall screenshots into overlapping tiles. Output is cached on
+# disk by the source image's md5 plus the settings, so reruns skip both the
+# download and the work. Each file's bytes and estimated image tokens, before
+# and after, go into a CSV report under METRICS_DIR.
+
+MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+# Gemini 2.x image accounting: an image with both sides <= 384px is 258
+# tokens, larger images are cut into 768x768 tiles of 258 tokens each.
+TILE_TOKENS = 258
+SMALL_IMAGE_EDGE = 384
+TOKEN_TILE_EDGE = 768
+
+REPORT_FIELDS = ("file_name", "cached", "original_bytes", "bytes", "original_size", "size", "tiles",
+                 "original_tokens", "tokens", "seconds")
+
+
+def estimate_image_tokens(width, height):
+    if width <= SMALL_IMAGE_EDGE and height <= SMALL_IMAGE_EDGE:
+        return TILE_TOKENS
+    return math.ceil(width / TOKEN_TILE_EDGE) * math.ceil(height / TOKEN_TILE_EDGE) * TILE_TOKENS
+
+
+def preprocess_settings():
+    return {
+        "max_long_edge": config.PREPROCESS_MAX_LONG_EDGE,
+        "format": config.PREPROCESS_FORMAT,
+        "quality": config.PREPROCESS_QUALITY,
+        "trim_tolerance": config.PREPROCESS_TRIM_TOLERANCE,
+        "tile_aspect": config.PREPROCESS_TILE_ASPECT,
+        "tile_overlap": config.PREPROCESS_TILE_OVERLAP,
+    }
+
+
+def require_pillow():
+    if Image is None:
+        raise ImportError("Image preprocessing needs Pillow: pip install Pillow")
+
+
+def trim_borders(image, tolerance):
+    # The top-left pixel is taken as the border colour.
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    difference = ImageChops.difference(image, background).convert("L")
+    bbox = difference.point(lambda value: 255 if value > tolerance else 0).getbbox()
+    return image.crop(bbox) if bbox else image
+
+
+def split_tiles(image, aspect, overlap):
+    width, height = image.size
+    if not aspect or height <= width * aspect:
+        return [image]
+    count = math.ceil(height / (width * aspect))
+    tile_height = min(height, math.ceil(height / count * (1 + overlap)))
+    step = (height - tile_height) / (count - 1)
+    return [image.crop((0, round(i * step), width, round(i * step) + tile_height)) for i in range(count)]
+
+
+def cap_long_edge(image, max_long_edge):
+    width, height = image.size
+    scale = max_long_edge / max(width, height)
+    if scale >= 1:
+        return image
+    return image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+
+def encode(image, image_format, quality):
+    buffer = io.BytesIO()
+    if image_format == "PNG":
+        image.save(buffer, format=image_format, optimize=True)
+    else:
+        image.save(buffer, format=image_format, quality=quality)
+    return buffer.getvalue()
+
+
+def preprocess_image(data, settings):
+    require_pillow()
+    with Image.open(io.BytesIO(data)) as source:
+        original_size = source.size
+        image = source.convert("RGB")
+    image = trim_borders(image, settings["trim_tolerance"])
+    tiles = [cap_long_edge(tile, settings["max_long_edge"])
+             for tile in split_tiles(image, settings["tile_aspect"], settings["tile_overlap"])]
+    stats = {
+        "original_bytes": len(data),
+        "original_size": "x".join(map(str, original_size)),
+        "original_tokens": estimate_image_tokens(*original_size),
+        "size": ",".join("x".join(map(str, tile.size)) for tile in tiles),
+        "tokens": sum(estimate_image_tokens(*tile.size) for tile in tiles),
+        "tiles": len(tiles),
+    }
+    encoded = [encode(tile, settings["format"], settings["quality"]) for tile in tiles]
+    stats["bytes"] = sum(len(tile) for tile in encoded)
+    return encoded, stats
+
+
+class ImagePreprocessor:
+    def __init__(self, bucket, directory=None, settings=None):
+        require_pillow()
+        self.bucket = bucket
+        self.directory = directory or config.PREPROCESS_CACHE_DIR
+        self.settings = settings or preprocess_settings()
+        self.settings_key = fingerprint(self.settings)
+        self.mime_type = MIME_TYPES[self.settings["format"]]
+        self.report = []
+        self.failures = []
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _paths(self, key, count):
+        extension = self.settings["format"].lower()
+        return [os.path.join(self.directory, f"{key}-{i}.{extension}") for i in range(count)]
+
+    def _read_cached(self, key):
+        try:
+            with open(os.path.join(self.directory, f"{key}.json"), encoding="utf-8") as f:
+                stats = json.load(f)
+            tiles = []
+            for path in self._paths(key, stats["tiles"]):
+                with open(path, "rb") as f:
+                    tiles.append(f.read())
+        except (OSError, ValueError, KeyError):
+            return None, None
+        return tiles, stats
+
+    def _write_cached(self, key, tiles, stats):
+        suffix = f"{os.getpid()}-{threading.get_ident()}"
+        for path, data in zip(self._paths(key, len(tiles)), tiles):
+            with open(f"{path}.{suffix}.tmp", "wb") as f:
+                f.write(data)
+            os.replace(f"{path}.{suffix}.tmp", path)
+        # The metadata goes last: its presence marks a complete entry.
+        path = os.path.join(self.directory, f"{key}.json")
+        with open(f"{path}.{suffix}.tmp", "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(f"{path}.{suffix}.tmp", path)
+
+    def load(self, blob_name, image_hash=None):
+        started = time.perf_counter()
+        data = None
+        if not image_hash:
+            data = self.bucket.blob(blob_name).download_as_string()
+            # Same form as the blob's md5_hash, which the manifest records.
+            image_hash = base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+        key = fingerprint(image_hash, self.settings_key)
+
+        tiles, stats = self._read_cached(key)
+        cached = tiles is not None
+        if not cached:
+            if data is None:
+                data = self.bucket.blob(blob_name).download_as_string()
+            try:
+                tiles, stats = preprocess_image(data, self.settings)
+            except Exception as e:
+                # The caller sends the original screenshot instead.
+                print(f"   - Warning: could not preprocess {blob_name}, sending the original. Error: {e}")
+                with self._lock:
+                    self.failures.append(os.path.basename(blob_name))
+                return None
+            self._write_cached(key, tiles, stats)
+
+        row = dict(stats, file_name=os.path.basename(blob_name), cached=cached,
+                   seconds=round(time.perf_counter() - started, 4))
+        with self._lock:
+            self.report.append(row)
+        return tiles
+
+    def totals(self):
+        with self._lock:
+            rows = list(self.report)
+            failed = len(self.failures)
+        return {
+            "files": len(rows),
+            "cached": sum(1 for row in rows if row["cached"]),
+            "original_bytes": sum(row["original_bytes"] for row in rows),
+            "bytes": sum(row["bytes"] for row in rows),
+            "original_tokens": sum(row["original_tokens"] for row in rows),
+            "tokens": sum(row["tokens"] for row in rows),
+            "failed": failed,
+        }
+
+    def print_summary(self):
+        totals = self.totals()
+        if not totals["files"] and not totals["failed"]:
+            return
+        saved_bytes = totals["original_bytes"] - totals["bytes"]
+        saved_tokens = totals["original_tokens"] - totals["tokens"]
+        print(f"\n--- Image preprocessing: {totals['files']} files ({totals['cached']} from cache) ---")
+        print(f"   Bytes:  {totals['original_bytes']:,} -> {totals['bytes']:,} "
+              f"({saved_bytes:,} saved, {saved_bytes / max(totals['original_bytes'], 1):.0%})")
+        print(f"   Estimated image tokens:  {totals['original_tokens']:,} -> {totals['tokens']:,} "
+              f"({saved_tokens:,} saved, {saved_tokens / max(totals['original_tokens'], 1):.0%})")
+        if totals["failed"]:
+            print(f"   {totals['failed']} files could not be preprocessed and were sent as-is")
+
+    def record_metrics(self, metrics):
+        totals = self.totals()
+        metrics.inc("image_original_bytes_total", totals["original_bytes"])
+        metrics.inc("image_preprocessed_bytes_total", totals["bytes"])
+        metrics.inc("image_original_tokens_estimated_total", totals["original_tokens"])
+        metrics.inc("image_preprocessed_tokens_estimated_total", totals["tokens"])
+        metrics.inc("image_preprocess_cache_hits_total", totals["cached"])
+        metrics.inc("image_preprocess_failures_total", totals["failed"])
+
+    def write_report(self, directory=None):
+        with self._lock:
+            rows = sorted(self.report, key=lambda row: row["file_name"])
+        if not rows:
+            return None
+        directory = directory or config.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(directory, f"preprocess-{timestamp}.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Preprocessing report written to {path}")
+        return path
+
+
+if __name__ == "__main__":
+    # Try the settings on local screenshots and look at the output before
+    # turning the stage on for a run.
+    parser = argparse.ArgumentParser(description="Preprocess local screenshots with the configured settings.")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--output", default="preprocessed", help="directory for the processed images")
+    args = parser.parse_args()
+
+    settings = preprocess_settings()
+    os.makedirs(args.output, exist_ok=True)
+    for path in args.files:
+        with open(path, "rb") as f:
+            tiles, stats = preprocess_image(f.read(), settings)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        for i, data in enumerate(tiles):
+            with open(os.path.join(args.output, f"{stem}-{i}.{settings['format'].lower()}"), "wb") as f:
+                f.write(data)
+        print(f"{path}: {stats['original_size']} {stats['original_bytes']:,} B ~{stats['original_tokens']} tokens -> "
+              f"{stats['size']} {stats['bytes']:,} B ~{stats['tokens']} tokens ({stats['tiles']} tiles)")
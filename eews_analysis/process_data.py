@@ -1,317 +1,501 @@
-
-
 import os
+import sys
+import time
 import vertexai
-from vertexai.generative_models import GenerativeModel, Part, HarmCategory, HarmBlockThreshold
+from vertexai.generative_models import GenerationConfig, GenerativeModel, Part, HarmCategory, HarmBlockThreshold
 from google.cloud import storage
-import time
-import json
-import itertools
 from eews_analysis import config
+from eews_analysis.prompts import (
+    PROMPT_INSTRUCTION, EXAMPLE_1_URI, EXAMPLE_1_OUTPUT, EXAMPLE_2_URI, EXAMPLE_2_OUTPUT, SAFETY_CATEGORIES,
+    PROMPT_HASH, SCREEN_INSTRUCTION, SCREEN_PROMPT_HASH, generation_settings, screen_generation_settings
+)
+from eews_analysis.checkpoint import ShardWriter, compact_shards, read_completed_keys, shards_prefix
+from eews_analysis.manifest import InputManifest, PENDING, DONE, FAILED
+from eews_analysis.response_cache import ResponseCache, fingerprint
+from eews_analysis.context_cache import PrefixContext, open_context
+from eews_analysis.cascade import SCREENED_OUT, Cascade, ModelScreen
+from eews_analysis.usage import TokenUsage
+from eews_analysis.repair import RepairStats, UnrepairableResponse, parse_response
+from eews_analysis.batch import VertexBatchBackend, run_batch
+from eews_analysis.concurrency import AdaptiveRateLimiter, is_quota_error, map_concurrent
+from eews_analysis.metrics import Metrics, ProgressLine, instrument_storage
+from eews_analysis.deadletter import DeadLetterQueue, BatchPredictionError, response_text
+from eews_analysis.preprocess import ImagePreprocessor
+from eews_analysis.sharding import merge_workers, save_worker_dead_letters, worker_run_id
+from eews_analysis.workers import owns
+
+GENERATION_SETTINGS = generation_settings()
+GENERATION_CONFIG = GenerationConfig(**GENERATION_SETTINGS)
+
+SAFETY_SETTINGS = {getattr(HarmCategory, category): HarmBlockThreshold.BLOCK_NONE for category in SAFETY_CATEGORIES}
+
+
+def build_prefix():
+    return [
+        PROMPT_INSTRUCTION,
+        Part.from_uri(uri=EXAMPLE_1_URI, mime_type="image/png"),
+        EXAMPLE_1_OUTPUT,
+        Part.from_uri(uri=EXAMPLE_2_URI, mime_type="image/png"),
+        EXAMPLE_2_OUTPUT,
+    ]
+
+
+def build_contents(image):
+    return build_prefix() + [image]
+
+
+def build_response_cache(preprocessor=None):
+    # Preprocessed images are a different model input, so they get their own entries.
+    return ResponseCache(
+        prompt_hash=fingerprint(PROMPT_HASH, preprocessor.settings) if preprocessor else PROMPT_HASH,
+        model_name=config.MODEL_NAME,
+        generation_config=GENERATION_SETTINGS
+    )
 
-def process_all_tweets():
-    vertexai.init(project=config.PROJECT_ID, location=config.LOCATION)
-    storage_client = storage.Client(project=config.PROJECT_ID)
-    bucket = storage_client.bucket(config.BUCKET)
 
-    model = GenerativeModel("gemini-2.0-flash-001")
-
-
-
-
-    # Prompt
-
-    prompt_instruction = """
-    You are a computational social scientist analyzing the user's experiences about
-    the performance of Google’s Earthquake Early Warning system (a.k.a. Android Earthquake
-    Alert or AEA) during recent earthquakes in Turkey. Phones plugged in and stationary
-    report their availability for earthquake monitoring by AEA. An on-phone detection
-    algorithm analyzes acceleration time series for sudden changes indicative of seismic
-    P- or S-wave arrivals. Upon detecting a potential event, de-identified parameter
-    data is sent to the backend server. This detection capability is deployed as part
-    of Google Play Services, core system software, meaning it is on by default for the
-    vast majority of Android smartphones and does not require activation or installation
-    of any additional application. The servers then match the pattern of phone triggering
-    with possible seismic sources in the time-space domain. An earthquake is declared and
-    its source parameters (e.g., magnitude, hypocenter, and origin time) are estimated.
-    Upon detection of an earthquake, the intensity of the ground shaking and its potential
-    extent are estimated. For events with estimated magnitude exceeding M4.5, AEA sends
-    two distinct types of alerts to users that are within the impacted area. These include
-    “Take Action” and “Be Aware” alerts for users within the regions expected to experience
-    moderate or greater (i.e., >= MMI 5) and weak (i.e., MMI 3 or 4), respectively. The
-    “Take Action” alert takes over the entire screen of the phone, breaking through any
-    do-not-disturb settings and makes a characteristic sound designed to be attention
-    grabbing. The “Be Aware” alert appears as a notification similar to other phone or app
-    notifications, but with a characteristic sound. Once the shaking has passed, or if the
-    alert arrives after shaking, the alerts are replaced by the "Earthquake Occurred"
-    notification. The delivered alerts to the Android phone users contain a short summary
-    of the event attributes, precautionary instructions, earthquake safety info, and a short
-    user survey feedback of the alert delivery. Please use the provided examples as reference
-    and extract these information from the input tweet if available: Username; Post’s date-time
-    in YYYY-MM-DDTHH:MM format, keeping in mind that screenshots of tweets are taken in EST
-    while local time would be in Istanbul time; Geolocation (like the city or town if available);
-    How many seconds before the earthquake did they receive the alert?; Does the post include a
-    screenshot or picture of the received alert (YES, NO)?; What is the time of the issued alert --
-    in YYYY-MM-DDTHH:MM format -- shown on the attached image of the received alert to the post?;
-    What is the magnitude of the earthquake shown on the attached image of the received alert to
-    the post?; What is the distance (in miles) to the earthquake shown on the attached image of the
-    received alert to the post?; What is the language of received alert?; Does the post include
-    the alert contour and user's relative position (YES, NO, NOT_APPLICABLE)?; What is the
-    approximate location of the user (shown by blue circle marker on the alert notification)?;
-    What type of the alert they receive (BE_AWARE_NOTIFICATION, TAKE_ACTION_ALERT, UNKNOWN)?;
-    What is the alert source (AEA, EQN, ETC)?; What is the overall sentiment of the replies to
-    the post (CONFIRMATION_OF_POSITIVE_POST, CONFIRMATION_OF_NEGATIVE_POST, OPPOSITION_OF_POSITIVE_POST,
-    OPPOSITION_OF_NEGATIVE_POST, NOT_APPLICABLE)?; Did the user feel the earthquake shaking (YES, NO,
-    UNKNOWN)?; Did the alert come with a sound notification or was it just a text notification
-    (ALERT_WITH_SOUND, SILENT_NOTIFICATION, UNKNOWN)?; What action did the person take after receiving
-    the alert (DROP_COVER_HOLD_ON, EVACUATED, MOVED_TO_SAFETY, PROTECTED_OTHERS, PASSIVE_AWARE,
-    SOUGHT_INFO, WARNED_CONTACTED_OTHERS, NO_ACTION)?; What is the sentiment of the user (POSITIVE,
-    NEGATIVE, NEUTRAL, MIXED)?; Beyond general sentiment, did the user express specific emotions regarding
-    the alert or the earthquake (FEAR, ANXIETY, REASSURANCE, GRATITUDE, CONFUSION, SURPRISE,
-    ANNOYANCE)?; How helpful or unhelpful was the earthquake alert from the user's point of view
-    (NOT_HELPFUL, HELPFUL, VERY_HELPFUL, NEUTRAL)?; Did the user think the system could be improved
-    (YES, NO, UNKNOWN)?; When did the alert arrive (BEFORE_SHAKING, DURING_SHAKING, AFTER_SHAKING,
-    UNKNOWN)?; What was the level of the shaking that the user felt (STRONG, WEAK, UNKNOWN)?; What
-    was the intensity of the ground shaking in MMI scale at the user’s location based on post content
-    (1, 2, 3, 4, 5, 6, 7, 8)?; Did someone else near the user receive an earthquake alert as well
-    (YES, NO, UNKNOWN)?; Where was the user when received the alert (INDOOR, OUTDOOR, UNKNOWN)?;
-    Was the user alone or with others when receiving the alert (YES, NO, UNKNOWN)?; Was it the
-    first time the user received an alert from an earthquake alerting system (YES, NO, UNKNOWN)?;
-    What was their past experience receiving an earthquake alert (POSITIVE, NEGATIVE, NEUTRAL, UNKNOWN)?;
-    Did the user experience earthquake damage in the past (YES, NO, UNKNOWN)?; What was the user’s
-    gender (FEMALE, MALE, LIKELY_FEMALE, LIKELY_MALE, UNKNOWN)?; What specific information from the
-    alert did the user recall or mention (SAFETY_ADVICE, ESTIMATED_MAGNITUDE, ESTIMATED_DISTANCE,
-    ESTIMATED_INTENSITY_AT_THEIR_LOCATION, ALERT_SOURCE like 'Android Earthquake Alerts System)?;
-    Did the user comment on the accuracy of the information provided by the AEA (was the magnitude,
-    location, or timing perceived as correct or incorrect when compared to their experience or other
-    sources, PRECISE, INACCURATE)?; Did the user mention any technical issues with receiving or
-    viewing the alert itself (POWER_LOSS, ALERT_SCREEN_FREEZING, ALERT_SOUND_ISSUE, ALERT_NOT_APPEARING_WHEN_EXPECTED,
-    UNKNOWN)?; Did the user comment on how clear or easy to understand the alert message and any
-    instructions were (CLEAR_TO_UNDERSTAND, ALMOST_CLEAR_TO_UNDERSTAND, UNCLEAR, “UNKNOWN”)?;
-    If the user stated they took no specific protective action after receiving the alert did
-    they provide a reason why (NO_TIME, CONFUSION, DEEMED_UNNECESSARY, OTHER_REASON_FOR_NO_ACTION,
-    REASON_UNSPECIFIED)?; Did the user's post suggest a level of trust (or distrust) in the AEA system
-    for future earthquake events based on this particular experience (WILL_TRUST_MORE, WILL_TRUST_LESS,
-    NEUTRAL, UNKNOWN)?; If the user explicitly stated the alert was helpful or unhelpful, what specific
-    reasons did they give for this assessment (PROVIDED_TIME_TO_PREPARE, CONFIRMED_IT_WAS_AN_EARTHQUAKE,
-    IT_ARRIVED_TOO_LATE_TO_BE_USEFUL)?; Did the user compare the Android Earthquake Alert to any other
-    earthquake warning systems they might be aware of or other sources of earthquake information
-    (AEA_ALERT_ARRIVED_EARLIER, AEA_ALERT_ARRIVED_LATER, AEA_ALERT_WAS_MORE_PRECISE, AEA_ALERT_WAS_LESS_PRECISE,
-    UNKNOWN)? If no information is provided for a specific key, use the tag "UNKNOWN" for that key. Make sure to
-    limit your response to a JSON format containing only the following keys: “username”, “post_datetime”,
-    “post_location”, “warning_time_seconds”, “with_alert_screenshot”, “alert_time”, “magnitude_on_alert_screenshot”,
-    “distance_on_alert_screenshot_ml”, “alert_language”, “alert_screenshot_with_contour”, “user_approximate_location_on_alert”,
-    “alert_type”, “alert_source”, “reply_sentiment”, “felt_shaking”, “alert_mode”, “post_alert_action”,
-    “users_sentiment”, “users_emotion”, “helpfulness”, “system_improvement”, “alert_arrival_wrt_shaking”,
-    “shaking_level”, “shaking_intensity_mmi”, “alert_received_by_others”, “indoor_vs_outdoor”, “user's_accompany”,
-    “first_earthquake_alert_experience”, “user's_past_earthquake_experience”, “past_earthquake_damage_experience”,
-    “user's_gender”, “alert_info_recall”, “aea_info_accuracy”, “technical_issues_with_alert”, “alert_info_clearance”,
-    “reason_for_taking_no_action”, “future_trust_level”, “helpfulness_reason”, “aea_vs_others”, “reasoning”.
-    Let's walk this through step by step with sample data. Here is the input data: <example_1.png> <example_2.png>.
-    Here are the example outputs. <example_1_output.json> <example_2_output.json>
-    """
-
-
-    example_1 = Part.from_uri(
-        uri=f"gs://turkey_tweets_0/EXAMPLES/Screenshot 2025-04-24 at 9.58.23 PM.png",
-        mime_type="image/png"
-    )
+def build_preprocessor(bucket, preprocess=None):
+    if not (config.PREPROCESS_IMAGES if preprocess is None else preprocess):
+        return None
+    return ImagePreprocessor(bucket)
 
-    example_1_output = """
-    {
-    "username": "@cinnamonjemur",
-    "post_datetime": "2025-04-23T12:59",
-    "post_location": "West of Istanbul",
-    "warning_time_seconds": "UNKNOWN",
-    "with_alert_screenshot": "YES",
-    "alert_time": "2025-04-23T12:49",
-    "magnitude_on_alert_screenshot": "5.3",
-    "distance_on_alert_screenshot_ml": "88.0",
-    "alert_language": "English",
-    "alert_screenshot_with_contour": "YES",
-    "user_approximate_location_on_alert": "West of Istanbul, near the Marmara Sea coast",
-    "alert_type": "BE_AWARE_NOTIFICATION",
-    "alert_source": "AEA",
-    "reply_sentiment": "CONFIRMATION_OF_POSITIVE_POST",
-    "felt_shaking": "YES",
-    "alert_mode": "UNKNOWN",
-    "post_alert_action": "UNKNOWN",
-    "users_sentiment": "POSITIVE",
-    "users_emotion": "GRATITUDE",
-    "helpfulness": "VERY_HELPFUL",
-    "system_improvement": "NO",
-    "alert_arrival_wrt_shaking": "UNKNOWN",
-    "shaking_level": "UNKNOWN",
-    "shaking_intensity_mmi": "UNKNOWN",
-    "alert_received_by_others": "UNKNOWN",
-    "indoor_vs_outdoor": "UNKNOWN",
-    "user's_accompany": "UNKNOWN",
-    "first_earthquake_alert_experience": "UNKNOWN",
-    "user's_past_earthquake_experience": "UNKNOWN",
-    "past_earthquake_damage_experience": "UNKNOWN",
-    "user's_gender": "LIKELY_MALE",
-    "alert_info_recall": [ "ESTIMATED_MAGNITUDE", "ESTIMATED_DISTANCE", "ALERT_SOURCE" ],
-    "aea_info_accuracy": "PRECISE",
-    "technical_issues_with_alert": "UNKNOWN",
-    "alert_info_clearance": "CLEAR_TO_UNDERSTAND",
-    "reason_for_taking_no_action": "UNKNOWN",
-    "future_trust_level": "WILL_TRUST_MORE",
-    "helpfulness_reason": "CONFIRMED_IT_WAS_AN_EARTHQUAKE",
-    "aea_vs_others": "UNKNOWN",
-    "reasoning": "The user expresses positive sentiment ('çok iyi' - 'very good') and posts a screenshot of the AEA alert. The date-time of the post was converted from EST to Istanbul time (EST+7). The alert screenshot shows key details like magnitude (5.3) and distance (88.0 miles). The replies confirm the user's positive experience, with another user asking how to enable it and the original poster replying that it works automatically. The user's positive feedback and the nature of the information shared suggest they found the alert helpful and accurate, thereby increasing their trust in the system. Many fields are marked 'UNKNOWN' as the user's short tweet does not provide details on their actions, emotions, or specific experience of the shaking."
-    }
-    """
-
-    example_2 = Part.from_uri(
-        uri=f"gs://turkey_tweets_0/EXAMPLES/Screenshot 2025-05-01 at 1.29.14 PM.png",
-        mime_type="image/png"
+
+def build_cascade(screen=None, preprocessor=None):
+    if not (config.CASCADE_ENABLED if screen is None else screen):
+        return None
+    settings = screen_generation_settings()
+    generation_config = GenerationConfig(**settings)
+    limiter = AdaptiveRateLimiter.from_config()
+    cache = ResponseCache(
+        prompt_hash=fingerprint(SCREEN_PROMPT_HASH, preprocessor.settings) if preprocessor else SCREEN_PROMPT_HASH,
+        model_name=config.CASCADE_SCREEN_MODEL,
+        generation_config=settings
     )
-    example_2_output = """
-    {
-    "username": "@yigitech",
-    "post_datetime": "2025-04-24T07:30",
-    "post_location": "Marmara Region",
-    "warning_time_seconds": "21",
-    "with_alert_screenshot": "YES",
-    "alert_time": "UNKNOWN",
-    "magnitude_on_alert_screenshot": "4.6",
-    "distance_on_alert_screenshot_ml": "41.6",
-    "alert_language": "Turkish",
-    "alert_screenshot_with_contour": "NO",
-    "user_approximate_location_on_alert": "NOT_APPLICABLE",
-    "alert_type": "BE_AWARE_NOTIFICATION",
-    "alert_source": "AEA",
-    "reply_sentiment": "NOT_APPLICABLE",
-    "felt_shaking": "YES",
-    "alert_mode": "UNKNOWN",
-    "post_alert_action": "UNKNOWN",
-    "users_sentiment": "POSITIVE",
-    "users_emotion": "UNKNOWN",
-    "helpfulness": "VERY_HELPFUL",
-    "system_improvement": "NO",
-    "alert_arrival_wrt_shaking": "BEFORE_SHAKING",
-    "shaking_level": "UNKNOWN",
-    "shaking_intensity_mmi": "UNKNOWN",
-    "alert_received_by_others": "UNKNOWN",
-    "indoor_vs_outdoor": "UNKNOWN",
-    "user's_accompany": "UNKNOWN",
-    "first_earthquake_alert_experience": "UNKNOWN",
-    "user's_past_earthquake_experience": "UNKNOWN",
-    "past_earthquake_damage_experience": "UNKNOWN",
-    "user's_gender": "MALE",
-    "alert_info_recall": [ "ESTIMATED_MAGNITUDE", "ALERT_SOURCE" ],
-    "aea_info_accuracy": "PRECISE",
-    "technical_issues_with_alert": "UNKNOWN",
-    "alert_info_clearance": "UNKNOWN",
-    "reason_for_taking_no_action": "UNKNOWN",
-    "future_trust_level": "WILL_TRUST_MORE",
-    "helpfulness_reason": "PROVIDED_TIME_TO_PREPARE",
-    "aea_vs_others": "AEA_ALERT_ARRIVED_EARLIER",
-    "reasoning": "The user directly compares the performance of Google's Android alert system (AEA) with another application, 'Deprem Ağı' (Earthquake Network). The tweet explicitly states that the Android alert arrived 21 seconds before the earthquake, while the other app's alert arrived 15 seconds before, making AEA faster by 6 seconds. This constitutes a positive sentiment and a direct reason for the alert's helpfulness ('PROVIDED_TIME_TO_PREPARE'). The user provides a screenshot from the 'Deprem Ağı' app, not the AEA alert itself, which is why fields like 'alert_time' are unknown. The post time is estimated based on the earthquake time mentioned in the screenshot plus the 11 minutes mentioned in the tweet text. The user's name 'Yiğit' is male. The distance was converted from km to miles (67km ≈ 41.6 miles)."
-    }
-    """
-
-    generation_config = {
-        "max_output_tokens": 8192,
-        "temperature": 0.2,
-        "top_p": 0.95,
-    }
-
-
-    safety_settings = {
-        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-    }
 
+    def generate(context, image, file_name, usage, metrics):
+        return generate_with_retries(context, image, limiter, file_name, usage, metrics, generation_config)
 
-    # Automated Process
+    # The screening prompt is far below the minimum size for context caching.
+    context = PrefixContext(GenerativeModel(config.CASCADE_SCREEN_MODEL), [SCREEN_INSTRUCTION])
+    return Cascade([ModelScreen(context, generate, cache)])
 
-    blobs1 = storage_client.list_blobs(config.BUCKET, prefix=config.INPUT_PATH_1)
-    blobs2 = storage_client.list_blobs(config.BUCKET, prefix=config.INPUT_PATH_2)
 
-    output_dict = {}
-    output_filename = "test_results.json"
-    output_blob_path = os.path.join(config.OUTPUT_PATH, output_filename)
-    blob_to_check = bucket.blob(output_blob_path)
+def finish_cascade(cascade, usage, metrics):
+    if cascade is None:
+        return
+    cascade.print_report(usage)
+    cascade.record_metrics(metrics)
+    cascade.close()
 
-    if blob_to_check.exists():
-        print(f"Found existing results file at gs://{config.BUCKET}/{output_blob_path}. Loading...")
-        try:
-            existing_data = blob_to_check.download_as_string()
-            output_dict = json.loads(existing_data)
-        except Exception as e:
-            print(f"Could not load or parse existing results file. Starting fresh. Error: {e}")
-            output_dict = {}
 
-    all_blobs = itertools.chain(blobs1, blobs2)
+def build_image(blob_name, image_hash=None, preprocessor=None):
+    tiles = preprocessor.load(blob_name, image_hash) if preprocessor is not None else None
+    if tiles is None:
+        return Part.from_uri(
+            uri=f"gs://{config.BUCKET}/{blob_name}",
+            mime_type="image/png"
+        )
+    parts = [Part.from_data(data=tile, mime_type=preprocessor.mime_type) for tile in tiles]
+    if len(parts) == 1:
+        return parts[0]
+    return [f"The screenshot is split into {len(parts)} overlapping parts, top to bottom."] + parts
 
-    for blob in all_blobs:
-        if not blob.name.lower().endswith(".png"):
-            continue
 
-        file_name = os.path.basename(blob.name)
+def finish_preprocessing(preprocessor, metrics):
+    if preprocessor is None:
+        return
+    preprocessor.print_summary()
+    preprocessor.record_metrics(metrics)
+    preprocessor.write_report()
 
-        if file_name in output_dict:
-            print(f"--- Skipping file (already processed): {file_name} ---")
-            continue
 
-        print(f"\n--- Processing file: {file_name} ---")
+def generate_with_retries(context, image, limiter, file_name, usage=None, metrics=None, generation_config=None):
+    for attempt in range(config.MAX_QUOTA_RETRIES + 1):
+        limiter.acquire()
+        started = time.perf_counter()
         try:
-            image = Part.from_uri(
-                uri=f"gs://{config.BUCKET}/{blob.name}",
-                mime_type="image/png"
+            response = context.generate(
+                image,
+                generation_config=generation_config or GENERATION_CONFIG,
+                safety_settings=SAFETY_SETTINGS
             )
+        except Exception as e:
+            if metrics is not None:
+                metrics.observe("model_request_seconds", time.perf_counter() - started, outcome="error")
+                metrics.record_error("model_call", e)
+            if is_quota_error(e) and attempt < config.MAX_QUOTA_RETRIES:
+                limiter.on_throttle()
+                if metrics is not None:
+                    metrics.inc("retries_total", stage="model_call", type=type(e).__name__)
+                print(f"--- Quota limit hit for {file_name}, retrying at {limiter.rate:.2f} req/s ---")
+                continue
+            raise
+        if metrics is not None:
+            elapsed = time.perf_counter() - started
+            metrics.observe("model_request_seconds", elapsed, outcome="ok")
+            metrics.add_stage_time("model_call", elapsed)
+        limiter.on_success()
+        if usage is not None:
+            usage.record(response)
+        return response
+
+
+def record_failure(blob_name, error, response=None, dead_letters=None, metrics=None):
+    print(f"Error processing {os.path.basename(blob_name)}: {error}")
+    if dead_letters is not None:
+        category = dead_letters.record(blob_name, error, response_text(response))
+        if metrics is not None:
+            metrics.inc("dead_letters_total", category=category, type=type(error).__name__)
+    return None
+
+
+def extract_file(context, blob_name, limiter, cache=None, image_hash=None, usage=None, repair_stats=None, metrics=None,
+                 dead_letters=None, preprocessor=None, cascade=None):
+    file_name = os.path.basename(blob_name)
+    if cache is not None and image_hash:
+        cached_result = cache.get(image_hash)
+        if cached_result is not None:
+            print(f"--- Cache hit: {file_name} ---")
+            if metrics is not None:
+                metrics.inc("response_cache_hits_total")
+            return cached_result
+
+    preprocess_started = time.perf_counter()
+    try:
+        image = build_image(blob_name, image_hash, preprocessor)
+    except Exception as e:
+        if metrics is not None:
+            metrics.record_error("preprocess", e)
+        return record_failure(blob_name, e, None, dead_letters, metrics)
+    finally:
+        if metrics is not None and preprocessor is not None:
+            metrics.add_stage_time("preprocess", time.perf_counter() - preprocess_started)
+
+    if cascade is not None:
+        screen_started = time.perf_counter()
+        removed_by = cascade.screen(image, file_name, image_hash, metrics)
+        if metrics is not None:
+            metrics.add_stage_time("screen", time.perf_counter() - screen_started)
+        if removed_by:
+            print(f"--- Screened out: {file_name} (would be removed by {', '.join(removed_by)}) ---")
+            return SCREENED_OUT
+
+    # Malformed output is repaired locally; only responses with no usable JSON are requested again.
+    for request_attempt in range(config.MAX_REREQUESTS + 1):
+        try:
+            response = generate_with_retries(context, image, limiter, file_name, usage, metrics)
+        except Exception as e:
+            return record_failure(blob_name, e, None, dead_letters, metrics)
+        parse_started = time.perf_counter()
+        try:
+            result_data = parse_response(response.text, repair_stats)
+            break
+        except UnrepairableResponse as e:
+            if metrics is not None:
+                metrics.record_error("parse", e)
+            if request_attempt < config.MAX_REREQUESTS:
+                if repair_stats is not None:
+                    repair_stats.record_rerequest()
+                if metrics is not None:
+                    metrics.inc("retries_total", stage="parse", type=type(e).__name__)
+                print(f"--- Unrepairable response for {file_name} ({e}), requesting again ---")
+                continue
+            return record_failure(blob_name, e, response, dead_letters, metrics)
+        except Exception as e:
+            if metrics is not None:
+                metrics.record_error("parse", e)
+            return record_failure(blob_name, e, response, dead_letters, metrics)
+        finally:
+            if metrics is not None:
+                metrics.add_stage_time("parse", time.perf_counter() - parse_started)
+
+    print(f"--- Gemini Output Received: {file_name} ---")
+    if dead_letters is not None:
+        dead_letters.resolve(blob_name)
+    if cache is not None and image_hash:
+        cache.put(image_hash, result_data)
+    return result_data
+
+
+def extract_files(context, blob_names, limiter=None, max_in_flight=None, on_result=None, cache=None,
+                  image_hashes=None, usage=None, repair_stats=None, metrics=None, progress=None, dead_letters=None,
+                  preprocessor=None, cascade=None, on_screened_out=None):
+    limiter = limiter or AdaptiveRateLimiter.from_config()
+    max_in_flight = max_in_flight or config.MAX_IN_FLIGHT
+    image_hashes = image_hashes or {}
+
+    completed = []
+    for index, blob_name, result_data in map_concurrent(
+        lambda name: extract_file(context, name, limiter, cache, image_hashes.get(name), usage, repair_stats, metrics,
+                                  dead_letters, preprocessor, cascade),
+        blob_names, max_in_flight
+    ):
+        if progress is not None:
+            progress.update(ok=result_data is not None)
+        if result_data is SCREENED_OUT:
+            if on_screened_out:
+                on_screened_out(blob_name)
+        elif result_data is not None:
+            file_name = os.path.basename(blob_name)
+            completed.append((index, file_name, result_data))
+            if on_result:
+                on_result(file_name, result_data)
+
+    # Workers finish in arbitrary order; merge in listing order so reruns produce identical files.
+    completed.sort()
+    return {file_name: result_data for _, file_name, result_data in completed}
+
+
+def discover_pending(storage_client, bucket, dead_letters=None, worker=None):
+    manifest = InputManifest.load(bucket)
+    manifest.refresh(storage_client)
+
+    completed_keys = read_completed_keys(storage_client, bucket)
+    manifest.reconcile(completed_keys)
+
+    pending_blob_names = []
+    queued_file_names = set()
+    for blob_name in manifest.blob_names(PENDING, FAILED):
+        # Dead-lettered files are only retried through --redrive.
+        if dead_letters is not None and blob_name in dead_letters.entries and manifest.entries[blob_name]["status"] == FAILED:
+            continue
+        file_name = os.path.basename(blob_name)
+        if worker is not None and not owns(file_name, worker):
+            continue
+        # The same screenshot may sit in both input folders; extract it once.
+        if file_name in queued_file_names:
+            continue
+        queued_file_names.add(file_name)
+        pending_blob_names.append(blob_name)
+
+    counts = manifest.counts()
+    print(f"Manifest status: {counts[DONE]} done, {counts[PENDING]} pending, {counts[FAILED]} failed.")
+    if dead_letters is not None and dead_letters.entries:
+        print(f"Skipping {len(dead_letters.entries)} dead-lettered files (retry them with --redrive).")
+    return manifest, pending_blob_names
+
+
+def finish_run(storage_client, bucket, manifest, pending_blob_names, new_results, cache, dead_letters=None, worker=None,
+               screened_out=()):
+    cache_stats = cache.stats()
+    print(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+          f"{cache_stats['entries']} entries ({cache_stats['bytes']} bytes).")
+
+    if worker is not None:
+        # Other workers share the manifest, dead letters and results file; only the merge writes them.
+        save_worker_dead_letters(bucket, dead_letters, worker)
+        print(f"\n--- Worker {worker[0]}/{worker[1]} extracted {len(new_results)} of {len(pending_blob_names)} files into its "
+              f"own shards. Run 'eews extract --merge' once every worker has finished. ---")
+        return
+
+    new_file_names = set(new_results)
+    for blob_name in pending_blob_names:
+        # Screened-out files stay pending, so the cascade decides again next run.
+        if blob_name in screened_out:
+            continue
+        manifest.mark(blob_name, DONE if os.path.basename(blob_name) in new_file_names else FAILED)
+    manifest.reconcile(new_file_names)
+    manifest.save(bucket)
+    if dead_letters is not None:
+        dead_letters.save(bucket)
+        counts = dead_letters.counts()
+        print(f"Dead letters: {len(dead_letters.entries)} files ({counts['transient']} transient, "
+              f"{counts['permanent']} permanent, {counts['exhausted']} out of attempts).")
+
+    if not new_results:
+        print("\n---No files were processed.---")
 
-            contents = [
-                prompt_instruction,
-                example_1,
-                example_1_output,
-                example_2,
-                example_2_output,
-                image
-            ]
-
-            response = model.generate_content(
-                contents,
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
-
-            # Clean the text, since gemini sometimes uses markdown notation
-            cleaned_text = response.text.strip()
-            if cleaned_text.startswith("```json"):
-                cleaned_text = cleaned_text[7:]
-            if cleaned_text.endswith("```"):
-                cleaned_text = cleaned_text[:-3]
-
-            print("--- Gemini Output Received ---")
-            print(cleaned_text)
-            print("----------------------------")
+    # Also picks up shards left behind by an interrupted earlier run.
+    try:
+        compact_shards(storage_client, bucket)
+    except Exception as e:
+        print(f"Error compacting result shards (they remain in gs://{config.BUCKET}/{shards_prefix()}): {e}")
 
-            result_data = json.loads(cleaned_text)
-            output_dict[file_name] = result_data
 
-        except Exception as e:
-            print(f"Error processing {file_name}: {e}")
+def process_all_tweets(context=None, show_progress=False, preprocess=None, storage_client=None, worker=None, screen=None,
+                       cascade=None):
+    # worker=(I, N) extracts only this worker's partition of the pending files (see sharding.py).
+    if context is None:
+        vertexai.init(project=config.PROJECT_ID, location=config.LOCATION)
+    metrics = Metrics("process_data" if worker is None else f"process_data-w{worker[0]}of{worker[1]}")
+    storage_client = instrument_storage(storage_client or storage.Client(project=config.PROJECT_ID), metrics)
+    bucket = storage_client.bucket(config.BUCKET)
 
-        time.sleep(1)
+    # Automated Process
 
-    if output_dict:
+    dead_letters = DeadLetterQueue.load(bucket)
+    manifest, pending_blob_names = discover_pending(storage_client, bucket, dead_letters, worker)
+
+    print(f"\n--- Processing {len(pending_blob_names)} files with up to {config.MAX_IN_FLIGHT} requests in flight ---")
+    preprocessor = build_preprocessor(bucket, preprocess)
+    cache = build_response_cache(preprocessor)
+    usage = TokenUsage()
+    repair_stats = RepairStats()
+    image_hashes = {blob_name: manifest.entries[blob_name].get("md5") for blob_name in pending_blob_names}
+
+    # Only open a (billed) context cache when there is work left to do.
+    new_results = {}
+    screened_out = set()
+    if pending_blob_names:
+        context = context or open_context(config.MODEL_NAME, build_prefix())
+        cascade = cascade or build_cascade(screen, preprocessor)
+        progress = ProgressLine(len(pending_blob_names), "extract") if show_progress else None
         try:
-            output_blob = bucket.blob(output_blob_path)
-            json_string = json.dumps(output_dict, indent=2)
-            output_blob.upload_from_string(json_string, content_type="application/json")
+            with ShardWriter(bucket, run_id=worker_run_id(worker) if worker else None) as writer:
+                new_results = extract_files(
+                    context, pending_blob_names, on_result=writer.add, cache=cache,
+                    image_hashes=image_hashes, usage=usage, repair_stats=repair_stats,
+                    metrics=metrics, progress=progress, dead_letters=dead_letters, preprocessor=preprocessor,
+                    cascade=cascade, on_screened_out=screened_out.add
+                )
+        finally:
+            context.close()
+            if progress is not None:
+                progress.close()
+
+    usage.print_summary()
+    repair_stats.print_summary()
+    finish_cascade(cascade, usage, metrics)
+    finish_preprocessing(preprocessor, metrics)
+    finish_run(storage_client, bucket, manifest, pending_blob_names, new_results, cache, dead_letters, worker, screened_out)
+
+    metrics.record_usage(usage)
+    metrics.inc("files_processed_total", len(new_results))
+    metrics.inc("files_screened_out_total", len(screened_out))
+    metrics.inc("files_failed_total", len(pending_blob_names) - len(new_results) - len(screened_out))
+    metrics.print_summary()
+    metrics.write()
+
+
+def process_all_tweets_batch(backend=None, storage_client=None):
+    if backend is None:
+        vertexai.init(project=config.PROJECT_ID, location=config.LOCATION)
+    metrics = Metrics("process_data_batch")
+    storage_client = instrument_storage(storage_client or storage.Client(project=config.PROJECT_ID), metrics)
+    bucket = storage_client.bucket(config.BUCKET)
+    backend = backend or VertexBatchBackend(config.MODEL_NAME)
+
+    dead_letters = DeadLetterQueue.load(bucket)
+    manifest, pending_blob_names = discover_pending(storage_client, bucket, dead_letters)
+    cache = build_response_cache()
+    repair_stats = RepairStats()
+
+    new_results = {}
+    with ShardWriter(bucket) as writer:
+        # Cached responses never need to go into the batch job.
+        batch_blob_names = []
+        for blob_name in pending_blob_names:
+            image_hash = manifest.entries[blob_name].get("md5")
+            cached_result = cache.get(image_hash) if image_hash else None
+            if cached_result is None:
+                batch_blob_names.append(blob_name)
+                continue
+            file_name = os.path.basename(blob_name)
+            new_results[file_name] = cached_result
+            writer.add(file_name, cached_result)
+
+        if batch_blob_names:
+            print(f"\n--- Submitting {len(batch_blob_names)} files as a batch prediction job ---")
+            image_hashes = {os.path.basename(name): manifest.entries[name].get("md5") for name in batch_blob_names}
+            blob_names_by_file = {os.path.basename(name): name for name in batch_blob_names}
+
+            def on_result(file_name, result_data):
+                writer.add(file_name, result_data)
+                dead_letters.resolve(blob_names_by_file[file_name])
+                if image_hashes.get(file_name):
+                    cache.put(image_hashes[file_name], result_data)
+
+            def on_failure(file_name, reason, text):
+                error = reason if isinstance(reason, Exception) else BatchPredictionError(reason)
+                category = dead_letters.record(blob_names_by_file[file_name], error, text)
+                metrics.inc("dead_letters_total", category=category, type=type(error).__name__)
+
+            with metrics.stage("batch_job"):
+                new_results.update(run_batch(
+                    storage_client, bucket, batch_blob_names, backend, on_result=on_result, repair_stats=repair_stats,
+                    on_failure=on_failure
+                ))
+            repair_stats.print_summary()
+
+    finish_run(storage_client, bucket, manifest, pending_blob_names, new_results, cache, dead_letters)
+
+    metrics.inc("response_cache_hits_total", len(pending_blob_names) - len(batch_blob_names))
+    metrics.inc("files_processed_total", len(new_results))
+    metrics.inc("files_failed_total", len(pending_blob_names) - len(new_results))
+    metrics.print_summary()
+    metrics.write()
+
+
+def merge_worker_results(storage_client=None):
+    metrics = Metrics("merge")
+    storage_client = instrument_storage(storage_client or storage.Client(project=config.PROJECT_ID), metrics)
+    merge_workers(storage_client, storage_client.bucket(config.BUCKET))
+    metrics.print_summary()
+    metrics.write()
+
+
+def redrive_failed(context=None, include_permanent=False, show_progress=False, preprocess=None,
+                   storage_client=None, sleep=time.sleep, clock=time.time):
+    # Retries only dead-lettered files: no bucket listing, just the stored manifest and queue.
+    if context is None:
+        vertexai.init(project=config.PROJECT_ID, location=config.LOCATION)
+    metrics = Metrics("redrive")
+    storage_client = instrument_storage(storage_client or storage.Client(project=config.PROJECT_ID), metrics)
+    bucket = storage_client.bucket(config.BUCKET)
 
-            print(f"All results saved to: gs://{config.BUCKET}/{output_blob_path}")
-        except Exception as e:
-            print(f"Error saving results file: {e}")
-    else:
-        print("\n---No files were processed.---")
+    manifest = InputManifest.load(bucket)
+    dead_letters = DeadLetterQueue.load(bucket, clock=clock)
+    dead_letters.adopt(manifest.blob_names(FAILED))
+    for blob_name in dead_letters.prune(manifest.entries):
+        print(f"--- {blob_name} is no longer in the input folders, dropping it from the dead letters ---")
+
+    preprocessor = build_preprocessor(bucket, preprocess)
+    cache = build_response_cache(preprocessor)
+    usage = TokenUsage()
+    repair_stats = RepairStats()
+    new_results = {}
+    attempted = set()
+    try:
+        while True:
+            due = dead_letters.due(include_permanent)
+            if not due:
+                wait = dead_letters.seconds_until_next(include_permanent)
+                if wait is None or wait > config.DEAD_LETTER_MAX_WAIT_SECONDS:
+                    break
+                print(f"--- Waiting {wait:.0f}s before the next re-drive round ---")
+                sleep(wait)
+                continue
+
+            print(f"\n--- Re-driving {len(due)} dead-lettered files ---")
+            context = context or open_context(config.MODEL_NAME, build_prefix())
+            progress = ProgressLine(len(due), "redrive") if show_progress else None
+            with ShardWriter(bucket) as writer:
+                new_results.update(extract_files(
+                    context, due, on_result=writer.add, cache=cache,
+                    image_hashes={blob_name: manifest.entries[blob_name].get("md5") for blob_name in due},
+                    usage=usage, repair_stats=repair_stats, metrics=metrics, progress=progress,
+                    dead_letters=dead_letters, preprocessor=preprocessor
+                ))
+            if progress is not None:
+                progress.close()
+            attempted.update(due)
+            dead_letters.save(bucket)
+    finally:
+        if context is not None:
+            context.close()
+
+    usage.print_summary()
+    repair_stats.print_summary()
+    finish_preprocessing(preprocessor, metrics)
+    finish_run(storage_client, bucket, manifest, sorted(attempted), new_results, cache, dead_letters)
+
+    metrics.record_usage(usage)
+    metrics.inc("files_processed_total", len(new_results))
+    metrics.print_summary()
+    metrics.write()
 
 
 if __name__ == "__main__":
-    process_all_tweets()
-
+    # Same flags as `eews extract`.
+    from eews_analysis.cli import main as cli
 
+    sys.exit(cli(["extract", *sys.argv[1:]]))
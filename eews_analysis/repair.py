@@ -0,0 +1,191 @@
+import json
+import re
+import threading
+from collections import Counter
+
+from eews_analysis.schema import FIELDS, ENUM, MULTI_ENUM, NUMBER, NUMBER_RANGES, UNKNOWN, allowed_values
+
+# Local validation and repair of model responses. Most malformed outputs are
+# recoverable (markdown fences, chatter around the JSON, smart quotes,
+# trailing commas, values outside the enum); only responses with no usable
+# JSON object at all are worth paying for another model call.
+
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"', "‘": "'", "’": "'"})
+FENCE_PATTERN = re.compile(r"```(?:json)?", re.IGNORECASE)
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+class UnrepairableResponse(ValueError):
+    pass
+
+
+class RepairStats:
+    def __init__(self):
+        self.valid = 0
+        self.repaired = 0
+        self.rerequested = 0
+        self.unrepairable = 0
+        self.repair_kinds = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, repairs):
+        with self._lock:
+            if repairs:
+                self.repaired += 1
+                self.repair_kinds.update(kind for kind, _ in repairs)
+            else:
+                self.valid += 1
+
+    def record_rerequest(self):
+        with self._lock:
+            self.rerequested += 1
+
+    def record_unrepairable(self):
+        with self._lock:
+            self.unrepairable += 1
+
+    def summary(self):
+        parsed = self.valid + self.repaired
+        responses = parsed + self.unrepairable
+        return {
+            "responses": responses,
+            "valid": self.valid,
+            "repaired": self.repaired,
+            "unrepairable": self.unrepairable,
+            "rerequested": self.rerequested,
+            "repair_rate": self.repaired / responses if responses else 0.0,
+            "rerequest_rate": self.rerequested / responses if responses else 0.0,
+            "repair_kinds": dict(self.repair_kinds),
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"Response validation: {summary['responses']} responses, {summary['valid']} valid, "
+              f"{summary['repaired']} repaired ({summary['repair_rate']:.1%}), "
+              f"{summary['rerequested']} re-requested ({summary['rerequest_rate']:.1%}), "
+              f"{summary['unrepairable']} unrepairable.")
+        if summary["repair_kinds"]:
+            print("   - Repairs: " + ", ".join(f"{kind}={count}" for kind, count in sorted(summary["repair_kinds"].items())))
+
+
+def _extract_object_text(text, repairs):
+    stripped = FENCE_PATTERN.sub("", text).strip()
+    if stripped != text.strip() and not text.strip().startswith("```"):
+        repairs.append(("stray_fence", None))
+
+    start = stripped.find("{")
+    end = stripped.rfind("}")
+    if start == -1 or end <= start:
+        raise UnrepairableResponse("no JSON object in response")
+    if start > 0 or end < len(stripped) - 1:
+        repairs.append(("surrounding_text", None))
+    return stripped[start:end + 1]
+
+
+def _load_object(object_text, repairs):
+    attempts = [
+        (None, lambda s: s),
+        ("smart_quotes", lambda s: s.translate(SMART_QUOTES)),
+        ("trailing_comma", lambda s: TRAILING_COMMA_PATTERN.sub(r"\1", s)),
+        ("smart_quotes_and_trailing_comma", lambda s: TRAILING_COMMA_PATTERN.sub(r"\1", s.translate(SMART_QUOTES))),
+    ]
+    for kind, fix in attempts:
+        try:
+            record = json.loads(fix(object_text))
+        except json.JSONDecodeError:
+            continue
+        if kind:
+            repairs.append((kind, None))
+        if not isinstance(record, dict):
+            raise UnrepairableResponse("response JSON is not an object")
+        return record
+    raise UnrepairableResponse("response is not valid JSON")
+
+
+def _normalize_enum(value):
+    return str(value).strip().strip("\"'").upper().replace(" ", "_").replace("-", "_")
+
+
+def _repair_enum(key, value, repairs):
+    allowed = allowed_values(key)
+    if value in allowed:
+        return value
+    normalized = _normalize_enum(value)
+    if normalized in allowed:
+        repairs.append(("enum_case", key))
+        return normalized
+    repairs.append(("enum_out_of_range", key))
+    return UNKNOWN
+
+
+def _repair_value(key, value, repairs):
+    kind = FIELDS[key]["kind"]
+    if value is None:
+        repairs.append(("null_value", key))
+        return UNKNOWN
+
+    if kind == MULTI_ENUM:
+        if not isinstance(value, list):
+            return _repair_enum(key, value, repairs)
+        items = [_repair_enum(key, item, repairs) for item in value]
+        items = [item for item in items if item != UNKNOWN]
+        return items or UNKNOWN
+
+    if isinstance(value, list):
+        repairs.append(("unexpected_list", key))
+        value = value[0] if value else UNKNOWN
+
+    if kind == ENUM:
+        return _repair_enum(key, value, repairs)
+
+    if kind == NUMBER and str(value).strip().upper() not in (UNKNOWN, "NOT_APPLICABLE"):
+        match = NUMBER_PATTERN.search(str(value))
+        if not match:
+            repairs.append(("bad_number", key))
+            return UNKNOWN
+        number = float(match.group())
+        low, high = NUMBER_RANGES.get(key, (None, None))
+        if low is not None and not low <= number <= high:
+            repairs.append(("number_out_of_range", key))
+            return UNKNOWN
+        repaired = match.group() if key not in NUMBER_RANGES else str(int(round(number)))
+        if repaired != value:
+            repairs.append(("number_format", key))
+        return repaired
+
+    if not isinstance(value, str):
+        repairs.append(("non_string", key))
+        return str(value)
+    return value
+
+
+def repair_response(text):
+    repairs = []
+    record = _load_object(_extract_object_text(text or "", repairs), repairs)
+
+    repaired = {}
+    for key in FIELDS:
+        if key not in record:
+            repairs.append(("missing_key", key))
+            repaired[key] = UNKNOWN
+            continue
+        repaired[key] = _repair_value(key, record[key], repairs)
+
+    for key in record:
+        if key not in FIELDS:
+            repairs.append(("unexpected_key", key))
+
+    return repaired, repairs
+
+
+def parse_response(text, stats=None):
+    try:
+        record, repairs = repair_response(text)
+    except UnrepairableResponse:
+        if stats is not None:
+            stats.record_unrepairable()
+        raise
+    if stats is not None:
+        stats.record(repairs)
+    return record
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import threading
+
+from eews_analysis import config
+
+# Content-addressed cache of parsed model responses. The key covers the image
+# bytes (its md5), the prompt and few-shot examples, the model name and the
+# generation config, so a renamed or moved screenshot is still a hit while
+# any change to the prompt or model misses only the entries built on it.
+
+
+def fingerprint(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True, default=str)
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, directory=None, max_bytes=None, prompt_hash="", model_name="", generation_config=None):
+        self.directory = directory or config.RESPONSE_CACHE_DIR
+        self.max_bytes = max_bytes or config.RESPONSE_CACHE_MAX_BYTES
+        self.prompt_hash = prompt_hash
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._sizes = {}
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                self._sizes[entry.path] = entry.stat().st_size
+        self.total_bytes = sum(self._sizes.values())
+
+    def key(self, image_hash):
+        return fingerprint(image_hash, self.prompt_hash, self.model_name, self.generation_config)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, image_hash):
+        path = self._path(self.key(image_hash))
+        try:
+            with open(path, encoding="utf-8") as f:
+                result_data = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        # The file's mtime doubles as its LRU timestamp.
+        try:
+            os.utime(path)
+        except OSError:
+            # Evicted by another thread after the read; the result is still good.
+            pass
+        with self._lock:
+            self.hits += 1
+        return result_data
+
+    def put(self, image_hash, result_data):
+        path = self._path(self.key(image_hash))
+        data = json.dumps(result_data, ensure_ascii=False).encode("utf-8")
+        temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self._lock:
+            self.total_bytes += len(data) - self._sizes.get(path, 0)
+            self._sizes[path] = len(data)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        by_age = sorted(self._sizes, key=lambda p: os.stat(p).st_mtime if os.path.exists(p) else 0)
+        for path in by_age:
+            if self.total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.total_bytes -= self._sizes.pop(path)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._sizes),
+            "bytes": self.total_bytes,
+        }
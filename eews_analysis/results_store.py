@@ -0,0 +1,206 @@
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from eews_analysis import config
+from eews_analysis.schema import (
+    DATETIME_FORMAT, FIELDS, MULTI_ENUM, UNKNOWN, ENUM_FIELDS, CATEGORICAL_TEXT_FIELDS, apply_schema
+)
+
+# Columnar copy of the results, written next to test_results.json. Readers can
+# project just the columns they need and push date / magnitude predicates
+# down to the Parquet row groups (rows are sorted by post time, so date
+# windows skip most of the file). Typed helper columns back those predicates
+# because the extracted values themselves are strings.
+
+INDEX_COLUMN = "file_name"
+POST_TIME_COLUMN = "post_datetime_ts"
+ALERT_TIME_COLUMN = "alert_time_ts"
+MAGNITUDE_COLUMN = "magnitude"
+HELPER_COLUMNS = (POST_TIME_COLUMN, ALERT_TIME_COLUMN, MAGNITUDE_COLUMN)
+
+LIST_COLUMNS = tuple(key for key, spec in FIELDS.items() if spec["kind"] == MULTI_ENUM)
+
+
+def json_path():
+    return os.path.join(config.OUTPUT_PATH, config.RESULTS_FILENAME)
+
+
+def parquet_path():
+    return os.path.join(config.OUTPUT_PATH, config.RESULTS_PARQUET_FILENAME)
+
+
+def keys_path():
+    return os.path.join(config.OUTPUT_PATH, config.RESULTS_KEYS_FILENAME)
+
+
+def filter_index_path():
+    return os.path.join(config.OUTPUT_PATH, config.FILTER_INDEX_FILENAME)
+
+
+def read_removed_keys(bucket):
+    # Entries clean_data's filter rules removed (see filters.py); empty before the first run.
+    blob = bucket.blob(filter_index_path())
+    if not blob.exists():
+        return set()
+    return set(json.loads(blob.download_as_string())["removed"])
+
+
+def _is_null(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def _as_list(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [str(item) for item in value]
+    if _is_null(value) or value in ("UNKNOWN", "NOT_APPLICABLE"):
+        return []
+    return [str(value)]
+
+
+def _as_text(value):
+    return None if _is_null(value) else str(value)
+
+
+def records_to_table(records):
+    return frame_to_table(pd.DataFrame.from_dict(records, orient="index"))
+
+
+def frame_to_table(df):
+    df = df.copy()
+    for column in df.columns:
+        # Declared list fields, plus any other field the model answered with a list.
+        if column in LIST_COLUMNS or df[column].map(lambda value: isinstance(value, list)).any():
+            df[column] = df[column].map(_as_list)
+        else:
+            df[column] = df[column].map(_as_text)
+
+    df[POST_TIME_COLUMN] = pd.to_datetime(df.get("post_datetime"), errors="coerce", format=DATETIME_FORMAT)
+    df[ALERT_TIME_COLUMN] = pd.to_datetime(df.get("alert_time"), errors="coerce", format=DATETIME_FORMAT)
+    df[MAGNITUDE_COLUMN] = pd.to_numeric(df.get("magnitude_on_alert_screenshot"), errors="coerce")
+
+    df = df.sort_values(POST_TIME_COLUMN, kind="stable")
+    df.index.name = INDEX_COLUMN
+    return pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+
+
+def frame_to_records(df):
+    # Inverse of records_to_table for writing JSON: plain lists, None for nulls.
+    df = df.drop(columns=[column for column in HELPER_COLUMNS if column in df.columns])
+    records = {}
+    for file_name, row in df.iterrows():
+        record = {}
+        for column, value in row.items():
+            if isinstance(value, np.ndarray):
+                value = value.tolist()
+            elif value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+                value = None
+            record[column] = value
+        records[file_name] = record
+    return records
+
+
+def write_results(bucket, records, path=None):
+    path = path or json_path()
+    bucket.blob(path).upload_from_string(json.dumps(records, indent=2), content_type="application/json")
+    if path == json_path():
+        bucket.blob(keys_path()).upload_from_string("\n".join(records.keys()) + "\n", content_type="text/plain")
+        write_parquet(bucket, records)
+
+
+def write_results_frame(bucket, df, path=None):
+    # Same files as write_results, straight from a frame indexed by file name
+    # (large synthetic corpora would not fit as a dict of records).
+    path = path or json_path()
+    bucket.blob(path).upload_from_string(df.to_json(orient="index", indent=2, force_ascii=False), content_type="application/json")
+    if path == json_path():
+        bucket.blob(keys_path()).upload_from_string("\n".join(df.index) + "\n", content_type="text/plain")
+        _write_table(bucket, frame_to_table(df), parquet_path())
+
+
+def write_parquet(bucket, records, path=None):
+    _write_table(bucket, records_to_table(records), path or parquet_path())
+
+
+def _write_table(bucket, table, path):
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, row_group_size=config.PARQUET_ROW_GROUP_SIZE, compression="zstd")
+    bucket.blob(path).upload_from_string(buffer.getvalue(), content_type="application/vnd.apache.parquet")
+    print(f"Columnar results ({table.num_rows} entries) saved to: gs://{config.BUCKET}/{path}")
+
+
+def convert_json(bucket, source_path=None, destination_path=None):
+    source_path = source_path or json_path()
+    destination_path = destination_path or os.path.splitext(source_path)[0] + ".parquet"
+    records = json.loads(bucket.blob(source_path).download_as_string())
+    write_parquet(bucket, records, destination_path)
+    return destination_path
+
+
+def date_filter(column, start=None, end=None):
+    filters = []
+    if start is not None:
+        filters.append((column, ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append((column, "<", pd.Timestamp(end)))
+    return filters
+
+
+def magnitude_filter(low=None, high=None):
+    filters = []
+    if low is not None:
+        filters.append((MAGNITUDE_COLUMN, ">", low))
+    if high is not None:
+        filters.append((MAGNITUDE_COLUMN, "<=", high))
+    return filters
+
+
+def _restore_lists(value):
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    return value if value else UNKNOWN
+
+
+def read_results(bucket, columns=None, filters=None, typed=False, exclude_removed=False):
+    blob = bucket.blob(parquet_path())
+    if not blob.exists():
+        print(f"No columnar results at gs://{config.BUCKET}/{parquet_path()}. Converting the JSON results once...")
+        convert_json(bucket)
+
+    read_columns = None
+    if columns is not None:
+        read_columns = [INDEX_COLUMN] + [column for column in columns if column != INDEX_COLUMN]
+
+    # BlobReader serves ranged reads, so only the footer and the projected column chunks are fetched.
+    # Typed reads decode repeated strings straight into categoricals instead of Python objects.
+    read_dictionary = list(ENUM_FIELDS + CATEGORICAL_TEXT_FIELDS) if typed else None
+    with blob.open("rb") as f:
+        table = pq.read_table(f, columns=read_columns, filters=filters or None, read_dictionary=read_dictionary)
+
+    df = table.to_pandas().set_index(INDEX_COLUMN)
+    df.index.name = None
+    if exclude_removed:
+        removed = read_removed_keys(bucket)
+        if removed:
+            df = df[~df.index.isin(removed)]
+    if columns is None:
+        df = df.drop(columns=[column for column in HELPER_COLUMNS if column in df.columns])
+    for arrow_field in table.schema:
+        if pa.types.is_list(arrow_field.type) and arrow_field.name in df.columns:
+            df[arrow_field.name] = df[arrow_field.name].map(_restore_lists)
+    return apply_schema(df) if typed else df
+
+
+if __name__ == "__main__":
+    from google.cloud import storage
+
+    storage_client = storage.Client(project=config.PROJECT_ID)
+    bucket = storage_client.bucket(config.BUCKET)
+    for path in (json_path(), os.path.join(config.OUTPUT_PATH, config.BACKUP_FILENAME)):
+        if bucket.blob(path).exists():
+            convert_json(bucket, path)
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+# Single definition of the extraction output: every key the prompt asks for,
+# with its allowed values. It drives the model's structured-output mode, the
+# local repair pass and the typed DataFrame schema used for analysis.
+
+TEXT = "text"
+NUMBER = "number"
+DATETIME = "datetime"
+ENUM = "enum"
+MULTI_ENUM = "multi_enum"
+
+UNKNOWN = "UNKNOWN"
+NOT_APPLICABLE = "NOT_APPLICABLE"
+MISSING_VALUES = (UNKNOWN, NOT_APPLICABLE)
+
+# The prompt asks for YYYY-MM-DDTHH:MM; ISO 8601 variants (seconds, a space, no time) parse too.
+DATETIME_FORMAT = "ISO8601"
+
+YES_NO = ("YES", "NO")
+
+
+def field(kind, values=()):
+    return {"kind": kind, "values": tuple(values)}
+
+
+FIELDS = {
+    "username": field(TEXT),
+    "post_datetime": field(DATETIME),
+    "post_location": field(TEXT),
+    "warning_time_seconds": field(NUMBER),
+    "with_alert_screenshot": field(ENUM, YES_NO),
+    "alert_time": field(DATETIME),
+    "magnitude_on_alert_screenshot": field(NUMBER),
+    "distance_on_alert_screenshot_ml": field(NUMBER),
+    "alert_language": field(TEXT),
+    "alert_screenshot_with_contour": field(ENUM, YES_NO),
+    "user_approximate_location_on_alert": field(TEXT),
+    "alert_type": field(ENUM, ("BE_AWARE_NOTIFICATION", "TAKE_ACTION_ALERT")),
+    "alert_source": field(ENUM, ("AEA", "EQN", "ETC")),
+    "reply_sentiment": field(ENUM, (
+        "CONFIRMATION_OF_POSITIVE_POST", "CONFIRMATION_OF_NEGATIVE_POST",
+        "OPPOSITION_OF_POSITIVE_POST", "OPPOSITION_OF_NEGATIVE_POST",
+    )),
+    "felt_shaking": field(ENUM, YES_NO),
+    "alert_mode": field(ENUM, ("ALERT_WITH_SOUND", "SILENT_NOTIFICATION")),
+    "post_alert_action": field(ENUM, (
+        "DROP_COVER_HOLD_ON", "EVACUATED", "MOVED_TO_SAFETY", "PROTECTED_OTHERS", "PASSIVE_AWARE",
+        "SOUGHT_INFO", "WARNED_CONTACTED_OTHERS", "NO_ACTION",
+    )),
+    "users_sentiment": field(ENUM, ("POSITIVE", "NEGATIVE", "NEUTRAL", "MIXED")),
+    "users_emotion": field(ENUM, (
+        "FEAR", "ANXIETY", "REASSURANCE", "GRATITUDE", "CONFUSION", "SURPRISE", "ANNOYANCE",
+    )),
+    "helpfulness": field(ENUM, ("NOT_HELPFUL", "HELPFUL", "VERY_HELPFUL", "NEUTRAL")),
+    "system_improvement": field(ENUM, YES_NO),
+    "alert_arrival_wrt_shaking": field(ENUM, ("BEFORE_SHAKING", "DURING_SHAKING", "AFTER_SHAKING")),
+    "shaking_level": field(ENUM, ("STRONG", "WEAK")),
+    "shaking_intensity_mmi": field(NUMBER),
+    "alert_received_by_others": field(ENUM, YES_NO),
+    "indoor_vs_outdoor": field(ENUM, ("INDOOR", "OUTDOOR")),
+    "user's_accompany": field(ENUM, YES_NO),
+    "first_earthquake_alert_experience": field(ENUM, YES_NO),
+    "user's_past_earthquake_experience": field(ENUM, ("POSITIVE", "NEGATIVE", "NEUTRAL")),
+    "past_earthquake_damage_experience": field(ENUM, YES_NO),
+    "user's_gender": field(ENUM, ("FEMALE", "MALE", "LIKELY_FEMALE", "LIKELY_MALE")),
+    "alert_info_recall": field(MULTI_ENUM, (
+        "SAFETY_ADVICE", "ESTIMATED_MAGNITUDE", "ESTIMATED_DISTANCE",
+        "ESTIMATED_INTENSITY_AT_THEIR_LOCATION", "ALERT_SOURCE",
+    )),
+    "aea_info_accuracy": field(ENUM, ("PRECISE", "INACCURATE")),
+    "technical_issues_with_alert": field(ENUM, (
+        "POWER_LOSS", "ALERT_SCREEN_FREEZING", "ALERT_SOUND_ISSUE", "ALERT_NOT_APPEARING_WHEN_EXPECTED",
+    )),
+    "alert_info_clearance": field(ENUM, ("CLEAR_TO_UNDERSTAND", "ALMOST_CLEAR_TO_UNDERSTAND", "UNCLEAR")),
+    "reason_for_taking_no_action": field(ENUM, (
+        "NO_TIME", "CONFUSION", "DEEMED_UNNECESSARY", "OTHER_REASON_FOR_NO_ACTION", "REASON_UNSPECIFIED",
+    )),
+    "future_trust_level": field(ENUM, ("WILL_TRUST_MORE", "WILL_TRUST_LESS", "NEUTRAL")),
+    "helpfulness_reason": field(ENUM, (
+        "PROVIDED_TIME_TO_PREPARE", "CONFIRMED_IT_WAS_AN_EARTHQUAKE", "IT_ARRIVED_TOO_LATE_TO_BE_USEFUL",
+    )),
+    "aea_vs_others": field(ENUM, (
+        "AEA_ALERT_ARRIVED_EARLIER", "AEA_ALERT_ARRIVED_LATER", "AEA_ALERT_WAS_MORE_PRECISE", "AEA_ALERT_WAS_LESS_PRECISE",
+    )),
+    "reasoning": field(TEXT),
+}
+
+NUMBER_RANGES = {
+    "shaking_intensity_mmi": (1, 12),
+}
+
+
+def allowed_values(key):
+    # Any field may be UNKNOWN / NOT_APPLICABLE when the post does not say.
+    return FIELDS[key]["values"] + MISSING_VALUES
+
+
+def response_schema(keys=None):
+    keys = keys or tuple(FIELDS)
+    properties = {}
+    for key in keys:
+        spec = FIELDS[key]
+        if spec["kind"] == ENUM:
+            properties[key] = {"type": "STRING", "enum": list(allowed_values(key))}
+        elif spec["kind"] == MULTI_ENUM:
+            properties[key] = {"type": "ARRAY", "items": {"type": "STRING", "enum": list(allowed_values(key))}}
+        else:
+            properties[key] = {"type": "STRING"}
+    return {"type": "OBJECT", "properties": properties, "required": list(keys)}
+
+
+ENUM_FIELDS = tuple(key for key, spec in FIELDS.items() if spec["kind"] == ENUM)
+LIST_FIELDS = tuple(key for key, spec in FIELDS.items() if spec["kind"] == MULTI_ENUM)
+NUMBER_FIELDS = tuple(key for key, spec in FIELDS.items() if spec["kind"] == NUMBER)
+DATETIME_FIELDS = tuple(key for key, spec in FIELDS.items() if spec["kind"] == DATETIME)
+# Free-text answers that still repeat heavily across rows.
+CATEGORICAL_TEXT_FIELDS = ("alert_language",)
+
+
+def enum_dtype(key):
+    return pd.CategoricalDtype(categories=list(allowed_values(key)))
+
+
+def _normalize(value):
+    return str(value).strip().upper().replace(" ", "_").replace("-", "_")
+
+
+def to_enum(series, key):
+    # Recode through the (few) distinct values rather than the rows: each one
+    # is normalized once and anything outside the enum collapses to UNKNOWN.
+    dtype = enum_dtype(key)
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype("category")
+    position = {value: i for i, value in enumerate(dtype.categories)}
+    unknown_code = position[UNKNOWN]
+    recode = np.array([position.get(_normalize(value), unknown_code) for value in series.cat.categories] + [-1])
+    codes = recode[series.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=series.index, name=series.name)
+
+
+def _has_lists(series):
+    return series.dtype == object and series.map(lambda value: isinstance(value, list)).any()
+
+
+def apply_schema(df):
+    df = df.copy()
+    for key in df.columns:
+        series = df[key]
+        if key in ENUM_FIELDS and not _has_lists(series):
+            df[key] = to_enum(series, key)
+        elif key in NUMBER_FIELDS:
+            df[key] = pd.to_numeric(series, errors="coerce").astype("float64")
+        elif key in DATETIME_FIELDS:
+            df[key] = pd.to_datetime(series, errors="coerce", format=DATETIME_FORMAT)
+        elif key in CATEGORICAL_TEXT_FIELDS:
+            df[key] = series.astype("category")
+    return df
+
+
+def multi_hot(series, key):
+    categories = list(FIELDS[key]["values"])
+    position = {value: i for i, value in enumerate(categories)}
+    matrix = np.zeros((len(series), len(categories)), dtype=bool)
+    for row, value in enumerate(series.to_numpy()):
+        for item in (value if isinstance(value, (list, tuple, np.ndarray)) else (value,)):
+            column = position.get(item)
+            if column is not None:
+                matrix[row, column] = True
+    return pd.DataFrame(matrix, index=series.index, columns=categories)
+
+
+def explode_field(series, key):
+    # Exploded answers as a fixed Categorical; UNKNOWN / NOT_APPLICABLE are dropped.
+    matrix = multi_hot(series, key)
+    rows, columns = np.nonzero(matrix.to_numpy())
+    categorical = pd.Categorical.from_codes(columns, categories=matrix.columns)
+    return pd.Series(categorical, index=series.index[rows], name=series.name)
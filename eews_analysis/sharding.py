@@ -0,0 +1,145 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from eews_analysis import config
+from eews_analysis.checkpoint import compact_shards, list_shards, new_run_id, read_completed_keys, read_shard
+from eews_analysis.deadletter import DeadLetterQueue
+from eews_analysis.manifest import InputManifest, DONE, FAILED, PENDING
+from eews_analysis.workers import owns
+
+# Runs extraction as N independent workers (processes or machines) over the
+# same bucket. Files are partitioned by a CRC32 of their file name, so every
+# worker computes the same split from the same listing without coordinating,
+# and both copies of a screenshot found in the two input folders land on the
+# same worker. Workers only write their own result shards and their own
+# dead-letter file; the shared manifest, dead letters and results file are
+# written by the merge step ("eews extract --merge") once the workers finish.
+
+WORKER_FILE = re.compile(r"worker-(\d+)-of-(\d+)\.json$")
+
+
+def worker_run_id(worker):
+    index, count = worker
+    return f"{new_run_id()}-w{index}of{count}"
+
+
+def worker_dead_letters_prefix():
+    return os.path.join(config.OUTPUT_PATH, config.WORKER_DEAD_LETTERS_DIRNAME) + "/"
+
+
+def worker_dead_letters_path(worker):
+    index, count = worker
+    return f"{worker_dead_letters_prefix()}worker-{index}-of-{count}.json"
+
+
+def save_worker_dead_letters(bucket, dead_letters, worker):
+    owned = {name: entry for name, entry in dead_letters.entries.items() if owns(os.path.basename(name), worker)}
+    DeadLetterQueue(owned).save(bucket, worker_dead_letters_path(worker))
+
+
+def merge_workers(storage_client, bucket):
+    # Safe to rerun: shards are only deleted once the results file is written,
+    # and worker dead-letter files only once the shared queue is saved.
+    compact_shards(storage_client, bucket)
+
+    dead_letters = DeadLetterQueue.load(bucket)
+    worker_files = sorted(blob.name for blob in storage_client.list_blobs(config.BUCKET, prefix=worker_dead_letters_prefix())
+                          if WORKER_FILE.search(blob.name))
+    for name in worker_files:
+        worker = tuple(int(part) for part in WORKER_FILE.search(name).groups())
+        # The worker's file is the whole truth for its partition, resolved failures included.
+        for blob_name in [blob_name for blob_name in dead_letters.entries if owns(os.path.basename(blob_name), worker)]:
+            dead_letters.resolve(blob_name)
+        dead_letters.entries.update(DeadLetterQueue.load(bucket, name).entries)
+
+    manifest = InputManifest.load(bucket)
+    manifest.refresh(storage_client)
+    manifest.reconcile(read_completed_keys(storage_client, bucket))
+    for blob_name in dead_letters.entries:
+        if blob_name in manifest.entries and manifest.entries[blob_name]["status"] != DONE:
+            manifest.mark(blob_name, FAILED)
+    manifest.save(bucket)
+    dead_letters.save(bucket)
+    for name in worker_files:
+        bucket.blob(name).delete()
+
+    counts = manifest.counts()
+    print(f"Merged {len(worker_files)} worker dead-letter files. Manifest status: {counts[DONE]} done, "
+          f"{counts[PENDING]} pending, {counts[FAILED]} failed; {len(dead_letters.entries)} dead letters.")
+    return counts
+
+
+# -- Local simulation --
+# N worker processes extract a synthetic input folder in a local directory
+# bucket (local.LocalStorageClient) with a fake model, then the merge runs and
+# the results are checked: every file extracted once, none missing.
+
+def _use_local_dirs(root):
+    config.RESPONSE_CACHE_DIR = os.path.join(root, "cache", "responses")
+    config.PREPROCESS_CACHE_DIR = os.path.join(root, "cache", "images")
+    config.METRICS_DIR = os.path.join(root, "cache", "metrics")
+
+
+def _run_worker(root, worker, latency):
+    from eews_analysis import process_data
+    from eews_analysis.local import FakeCachedContext, FakeModel, LocalStorageClient
+
+    _use_local_dirs(root)
+    context = FakeCachedContext(FakeModel(latency=latency), [])
+    process_data.process_all_tweets(context=context, storage_client=LocalStorageClient(root), worker=worker)
+
+
+def simulate(files, worker_count, latency, root):
+    from eews_analysis.local import LocalStorageClient
+
+    _use_local_dirs(root)
+    storage_client = LocalStorageClient(root)
+    bucket = storage_client.bucket(config.BUCKET)
+    file_names = [f"tweet_{i:06d}.png" for i in range(files)]
+    for file_name in file_names:
+        bucket.blob(os.path.join(config.INPUT_PATH_1, file_name)).upload_from_string(os.urandom(64), content_type="image/png")
+
+    started = time.perf_counter()
+    workers = [multiprocessing.Process(target=_run_worker, args=(root, (index, worker_count), latency))
+               for index in range(worker_count)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    seconds = time.perf_counter() - started
+
+    shard_names, _ = list_shards(storage_client)
+    extracted = [key for name in shard_names for key in read_shard(bucket, name)]
+    merge_workers(storage_client, bucket)
+    merged = json.loads(bucket.blob(os.path.join(config.OUTPUT_PATH, config.RESULTS_FILENAME)).download_as_string())
+    return {
+        "workers": worker_count, "files": files, "seconds": seconds, "extracted": len(extracted),
+        "duplicates": len(extracted) - len(set(extracted)), "missing": len(set(file_names) - set(merged)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate sharded extraction on a local directory bucket.")
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency in seconds")
+    args = parser.parse_args()
+
+    reports = []
+    for worker_count in args.workers:
+        root = tempfile.mkdtemp(prefix="eews-sharding-")
+        try:
+            reports.append(simulate(args.files, worker_count, args.latency, root))
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print("\n--- Sharded extraction simulation ---")
+    for report in reports:
+        print(f"   {report['workers']:3d} workers  {report['seconds']:6.1f}s  {report['files'] / report['seconds']:7.1f} files/s  "
+              f"{report['extracted']} extracted, {report['duplicates']} duplicates, {report['missing']} missing")
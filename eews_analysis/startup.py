@@ -0,0 +1,58 @@
+import re
+import subprocess
+import sys
+
+from eews_analysis import config
+
+# Cold-start budget for the `eews` CLI. Each module in STARTUP_MODULES is
+# imported, and each STARTUP_COMMANDS argument list is parsed by the CLI, in a
+# fresh interpreter under `-X importtime`; none of them may pull in a
+# HEAVY_MODULES package, and each must stay under CLI_IMPORT_BUDGET_MS.
+# Pipeline modules (process_data, visualize, ...) are imported lazily by the
+# subcommand handlers and are not checked.
+
+STARTUP_MODULES = ("eews_analysis.cli", "eews_analysis.manifest", "eews_analysis.deadletter")
+STARTUP_COMMANDS = (
+    ("--help",), ("extract", "--help"), ("extract", "--worker", "0/2", "--help"), ("clean", "--help"),
+    ("visualize", "--help"), ("status", "--help"),
+)
+HEAVY_MODULES = ("vertexai", "google.cloud.storage", "pandas", "numpy", "plotly", "pyarrow", "PIL")
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile(*args):
+    # [(module name, self us, cumulative us, depth)] in import order for `python <args>`.
+    completed = subprocess.run([sys.executable, "-X", "importtime", *args], capture_output=True, text=True, check=True)
+    return [(match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2)
+            for match in map(IMPORT_LINE.match, completed.stderr.splitlines()) if match]
+
+
+def heavy_imports(profile):
+    names = {name for name, _, _, _ in profile}
+    return [heavy for heavy in HEAVY_MODULES if heavy in names]
+
+
+def check_startup(budget_ms=None, modules=STARTUP_MODULES, commands=STARTUP_COMMANDS):
+    budget_ms = config.CLI_IMPORT_BUDGET_MS if budget_ms is None else budget_ms
+    checks = [(module, ("-c", f"import {module}")) for module in modules]
+    checks += [(" ".join(("eews",) + tuple(argv)), ("-m", "eews_analysis.cli", *argv)) for argv in commands]
+    ok = True
+    print(f"--- Startup import check (budget {budget_ms:.0f} ms) ---")
+    for label, args in checks:
+        profile = import_profile(*args)
+        total_ms = sum(self_us for _, self_us, _, _ in profile) / 1000
+        heavy = heavy_imports(profile)
+        within_budget = total_ms <= budget_ms
+        ok = ok and within_budget and not heavy
+        print(f"   {label:<28} {total_ms:7.1f} ms  {'OK' if within_budget and not heavy else 'FAIL'}")
+        if heavy:
+            print(f"      imports heavy modules: {', '.join(heavy)}")
+        if not within_budget:
+            slowest = sorted((item for item in profile if item[3] == 0), key=lambda item: -item[2])[:5]
+            for name, _, cumulative_us, _ in slowest:
+                print(f"      {cumulative_us / 1000:7.1f} ms  {name}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_startup() else 1)
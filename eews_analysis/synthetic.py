@@ -0,0 +1,120 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from eews_analysis.schema import FIELDS, ENUM, MULTI_ENUM, UNKNOWN, NOT_APPLICABLE
+
+# Seeded synthetic corpus shaped like test_results.json: every schema key,
+# skewed enum answers, a per-field UNKNOWN rate, list answers for the
+# multi-answer fields, and post / alert times and magnitudes clustered
+# around the April 2025 event (with a tail outside the cleaning windows).
+# Used to benchmark clean_data / visualize at sizes the real bucket lacks.
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+EVENT_TIME = pd.Timestamp("2025-04-23 12:49")
+OUTSIDE_WINDOW_RATE = 0.05
+NOT_APPLICABLE_RATE = 0.02
+
+LOCATIONS = (
+    "Istanbul", "Silivri", "Izmir", "Ankara", "Bursa", "Tekirdag", "Antalya", "Mugla", "Kocaeli", "Edirne",
+    "Near Istanbul", "west of Istanbul", "Silivri, Marmara", "Izmir karsiyaka", "mugla fethiye", "Marmara Region",
+)
+LANGUAGES = ("Turkish", "English", "German")
+REASONING = (
+    "The user posts a screenshot of the AEA alert and describes feeling the shaking shortly after it arrived.",
+    "The tweet compares the arrival time of the Android alert with another earthquake app.",
+    "The user reports the alert but gives no details about their location or actions.",
+)
+
+# Fields whose real answers are far from uniform.
+ENUM_WEIGHTS = {
+    "alert_source": {"AEA": 0.85, "EQN": 0.1, "ETC": 0.05},
+    "with_alert_screenshot": {"YES": 0.6, "NO": 0.4},
+    "felt_shaking": {"YES": 0.8, "NO": 0.2},
+}
+
+
+def _answers(rng, values, n, unknown_rate, weights=None):
+    values = np.array(values, dtype=object)
+    if weights is None:
+        # A few dominant answers and a long tail, like the real responses.
+        weights = rng.dirichlet(np.full(len(values), 0.8))
+    answers = values[rng.choice(len(values), size=n, p=weights)]
+    missing = rng.random(n)
+    answers[missing < unknown_rate] = UNKNOWN
+    answers[(missing >= unknown_rate) & (missing < unknown_rate + NOT_APPLICABLE_RATE)] = NOT_APPLICABLE
+    return answers
+
+
+def _numbers(rng, values, unknown_rate, fmt):
+    answers = np.array([fmt.format(value) for value in values], dtype=object)
+    answers[rng.random(len(values)) < unknown_rate] = UNKNOWN
+    return answers
+
+
+def _post_times(rng, n):
+    # Most posts within hours of the event, a small tail up to two months either side.
+    offsets = pd.to_timedelta(rng.exponential(6 * 60, size=n), unit="min")
+    outside = rng.random(n) < OUTSIDE_WINDOW_RATE
+    offsets = offsets.where(~outside, pd.to_timedelta(rng.uniform(-60, 60, size=n), unit="D"))
+    return (EVENT_TIME + offsets).strftime("%Y-%m-%dT%H:%M").to_numpy(dtype=object)
+
+
+def _recall_lists(rng, n, key):
+    values = np.array(FIELDS[key]["values"], dtype=object)
+    picked = rng.random((n, len(values))) < rng.uniform(0.1, 0.4, size=len(values))
+    return np.array([list(values[row]) or UNKNOWN for row in picked], dtype=object)
+
+
+def generate_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for key, spec in FIELDS.items():
+        unknown_rate = rng.uniform(0.2, 0.8)
+        if spec["kind"] == ENUM:
+            weights = ENUM_WEIGHTS.get(key)
+            if weights is not None:
+                columns[key] = _answers(rng, list(weights), rows, unknown_rate * 0.3, list(weights.values()))
+            else:
+                columns[key] = _answers(rng, spec["values"], rows, unknown_rate)
+        elif spec["kind"] == MULTI_ENUM:
+            columns[key] = _recall_lists(rng, rows, key)
+
+    columns["username"] = np.array([f"@user_{i}" for i in rng.integers(0, rows, size=rows)], dtype=object)
+    columns["post_datetime"] = _post_times(rng, rows)
+    alert_times = (EVENT_TIME + pd.to_timedelta(rng.integers(-30, 90, size=rows), unit="s")).strftime("%Y-%m-%dT%H:%M")
+    columns["alert_time"] = _numbers(rng, alert_times, 0.5, "{}")
+    columns["post_location"] = _answers(rng, LOCATIONS, rows, 0.2)
+    columns["user_approximate_location_on_alert"] = _answers(rng, LOCATIONS, rows, 0.5)
+    columns["alert_language"] = _answers(rng, LANGUAGES, rows, 0.1)
+    columns["magnitude_on_alert_screenshot"] = _numbers(rng, np.clip(rng.normal(5.6, 0.6, rows), 3.0, 7.5), 0.5, "{:.1f}")
+    columns["distance_on_alert_screenshot_ml"] = _numbers(rng, rng.uniform(5, 250, rows), 0.6, "{:.1f}")
+    columns["warning_time_seconds"] = _numbers(rng, rng.gamma(2.0, 10.0, rows).astype(int), 0.6, "{}")
+    columns["shaking_intensity_mmi"] = _numbers(rng, rng.integers(2, 9, rows), 0.8, "{}")
+    columns["reasoning"] = np.array(REASONING, dtype=object)[rng.integers(0, len(REASONING), size=rows)]
+
+    index = pd.Index([f"tweet_{i:07d}.png" for i in range(rows)])
+    return pd.DataFrame({key: columns[key] for key in FIELDS}, index=index)
+
+
+def generate_records(rows, seed=0):
+    return generate_frame(rows, seed).to_dict(orient="index")
+
+
+def parse_size(size):
+    return SIZES.get(size.lower()) or int(size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic test_results.json.")
+    parser.add_argument("--rows", default="1k", help="row count or one of: " + ", ".join(SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="synthetic_results.json")
+    args = parser.parse_args()
+
+    df = generate_frame(parse_size(args.rows), args.seed)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(df.to_json(orient="index", indent=2, force_ascii=False))
+    print(f"Wrote {len(df)} synthetic entries to {args.output}")
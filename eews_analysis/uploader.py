@@ -0,0 +1,77 @@
+import base64
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from eews_analysis import config
+from eews_analysis.deadletter import TRANSIENT, classify
+
+# Uploads in-memory objects on a thread pool. Objects whose md5 matches the
+# remote copy (from one listing of the target prefix) are skipped, transient
+# storage errors are retried with backoff, and uploaded / skipped bytes are
+# counted. Works with a GCS bucket or a local.LocalBucket alike.
+
+
+def md5_base64(data):
+    # Same encoding as Blob.md5_hash.
+    return base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+
+
+def remote_md5s(bucket, prefix):
+    return {blob.name: blob.md5_hash for blob in bucket.list_blobs(prefix=prefix, fields="items(name,md5Hash),nextPageToken")}
+
+
+class ParallelUploader:
+    def __init__(self, bucket, remote_hashes=None, workers=None, sleep=time.sleep):
+        self.bucket = bucket
+        self.remote_hashes = remote_hashes or {}
+        self.uploaded = 0
+        self.uploaded_bytes = 0
+        self.skipped = 0
+        self.skipped_bytes = 0
+        self.retries = 0
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers or config.UPLOAD_WORKERS)
+
+    def submit(self, path, data, content_type, content_encoding=None):
+        # The future resolves to "uploaded" or "skipped", or raises the last error.
+        return self._executor.submit(self._upload, path, data, content_type, content_encoding)
+
+    def _upload(self, path, data, content_type, content_encoding=None):
+        if self.remote_hashes.get(path) == md5_base64(data):
+            with self._lock:
+                self.skipped += 1
+                self.skipped_bytes += len(data)
+            return "skipped"
+        for attempt in range(config.UPLOAD_MAX_RETRIES + 1):
+            try:
+                blob = self.bucket.blob(path)
+                if content_encoding:
+                    blob.content_encoding = content_encoding
+                blob.upload_from_string(data, content_type=content_type)
+                break
+            except Exception as e:
+                if classify(e) != TRANSIENT or attempt == config.UPLOAD_MAX_RETRIES:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                self._sleep(config.UPLOAD_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+        with self._lock:
+            self.uploaded += 1
+            self.uploaded_bytes += len(data)
+        return "uploaded"
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def print_summary(self):
+        print(f"Uploaded {self.uploaded} objects ({self.uploaded_bytes:,} bytes); skipped {self.skipped} "
+              f"unchanged objects ({self.skipped_bytes:,} bytes); {self.retries} retries.")
+
+    def record_metrics(self, metrics):
+        metrics.inc("uploads_total", self.uploaded)
+        metrics.inc("uploads_skipped_total", self.skipped)
+        metrics.inc("upload_bytes_skipped_total", self.skipped_bytes)
+        metrics.inc("retries_total", self.retries, stage="upload", type="transient")
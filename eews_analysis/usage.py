@@ -0,0 +1,45 @@
+import threading
+
+
+class TokenUsage:
+    # Per-request token accounting from response.usage_metadata. Cached prompt
+    # tokens are reported separately so context-cache savings can be measured.
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+        cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+        output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+            self.output_tokens += output_tokens
+        return prompt_tokens, cached_tokens, output_tokens
+
+    def summary(self):
+        requests = max(self.requests, 1)
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_tokens,
+            "uncached_prompt_tokens": self.prompt_tokens - self.cached_tokens,
+            "output_tokens": self.output_tokens,
+            "avg_prompt_tokens": self.prompt_tokens / requests,
+            "avg_output_tokens": self.output_tokens / requests,
+            "cached_fraction": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"Token usage over {summary['requests']} requests: "
+              f"{summary['prompt_tokens']} prompt ({summary['cached_prompt_tokens']} cached, "
+              f"{summary['cached_fraction']:.1%}), {summary['output_tokens']} output, "
+              f"{summary['avg_prompt_tokens']:.0f} prompt / {summary['avg_output_tokens']:.0f} output per request.")
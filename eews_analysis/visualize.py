@@ -1,37 +1,37 @@
 import json
 import os
-from google.cloud import storage
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
+import plotly.io as pio
 import numpy as np
 
-from eews_analysis import config
+from eews_analysis import config, dashboard
+from eews_analysis.aggregate import AggregationCube
+from eews_analysis.local import LocalStorageClient
+from eews_analysis.events import detect_events, event_windows, print_events, save_events
+from eews_analysis.locations import normalize_locations
+from eews_analysis.metrics import Metrics, ProgressLine, instrument_storage
+from eews_analysis.response_cache import fingerprint
+from eews_analysis.results_store import read_results
+from eews_analysis.uploader import ParallelUploader, remote_md5s
 
 def load_and_preprocess_data(bucket):
     try:
-        blob = bucket.blob(os.path.join(config.OUTPUT_PATH, config.RESULTS_FILENAME))
-        json_data_string = blob.download_as_string()
-        all_data = json.loads(json_data_string)
-        df = pd.DataFrame.from_dict(all_data, orient='index')
-        df['post_datetime'] = pd.to_datetime(df['post_datetime'], errors='coerce')
+        df = read_results(bucket, typed=True, exclude_removed=True)
         print(f"Successfully loaded data for {len(df)} entries.")
     except Exception as e:
         print(f"Could not load JSON data. Reason: {e}.")
         return None
+    return preprocess_data(df)
 
+def preprocess_data(df):
     df = df[df['alert_source'].isin(['AEA', 'UNKNOWN', 'NOT_APPLICABLE', None])]
     df.loc[df["user's_past_earthquake_experience"] == 'YES', "user's_past_earthquake_experience"] = 'UNKNOWN'
 
-    location_replacements = {
-        'Near Antalya': 'Antalya', 'Mamak': 'Ankara', 'Antalya, Mugla, Izmir': 'Izmir',
-        'Izmir karsiyaka': 'Izmir', 'Izmir guzelbache': 'Izmir', 'west of Istanbul': 'Istanbul',
-        'Near Istanbul': 'Istanbul', 'Istanbul, Turkieh': 'Istanbul', 'Silivri, Istanbul': 'Silivri',
-        'Silivri, Marmara': 'Silivri', 'near Silivri': 'Silivri', 'mugla, turkey': 'Mugla',
-        'mugla fethiye': 'Mugla', 'eastern mediterranean sea': 'eastern mediterranean',
-        'Near the coast of Turkey': 'Edge of the marked area', 'Turkey': 'Edge of the marked area',
-    }
-    df['user_approximate_location_on_alert'] = df['user_approximate_location_on_alert'].replace(location_replacements)
+    df = normalize_locations(df)
     df = df[df['user_approximate_location_on_alert'] != 'Edge of the marked area']
 
     df['location_combined'] = df['user_approximate_location_on_alert'].replace({'UNKNOWN': np.nan, 'NOT_APPLICABLE': np.nan})
@@ -45,41 +45,166 @@ def load_and_preprocess_data(bucket):
     print("Preprocessing complete.")
     return df
 
-def save_and_upload(fig, title, bucket, file_type='html'):
-    local_filename = f"{title.replace(' ', '_').replace(':', '').lower()}.{file_type}"
-    gcs_path = os.path.join(config.VISUALIZATION_PATH, local_filename)
+# Plotting functions only build figures and return chart jobs
+# (name, file_type, figure_json). Rendering, the slow part (Kaleido for PNGs),
+# runs in a process pool; the main process uploads the rendered bytes.
+# A chart manifest in VISUALIZATION_PATH keeps each chart's fingerprint, so
+# charts whose figure (filtered data, spec and title) is unchanged since the
+# last run are neither rendered nor uploaded again.
+
+CONTENT_TYPES = {'html': 'text/html', 'png': 'image/png', dashboard.FILE_TYPE: 'text/html'}
+CONTENT_ENCODINGS = {dashboard.FILE_TYPE: dashboard.CONTENT_ENCODING}
+PNG_RENDER_SETTINGS = dict(scale=2, width=1000, height=1200)
+
+def chart_job(fig, title, file_type='html'):
+    return (title, file_type, fig.to_json())
+
+def chart_filename(title, file_type):
+    return f"{title.replace(' ', '_').replace(':', '').lower()}.{file_type}"
+
+def chart_fingerprint(job):
+    title, file_type, figure_json = job
+    return fingerprint(title, file_type, figure_json, PNG_RENDER_SETTINGS if file_type == 'png' else None)
+
+def chart_manifest_path():
+    return os.path.join(config.VISUALIZATION_PATH, config.CHART_MANIFEST_FILENAME)
+
+def load_chart_manifest(bucket):
+    blob = bucket.blob(chart_manifest_path())
+    if not blob.exists():
+        return {}
+    return json.loads(blob.download_as_string())
+
+def save_chart_manifest(bucket, manifest):
+    bucket.blob(chart_manifest_path()).upload_from_string(json.dumps(manifest, indent=2, sort_keys=True), content_type="application/json")
+
+def render_chart(job):
+    title, file_type, figure_json = job
+    started = time.perf_counter()
+    try:
+        if file_type == dashboard.FILE_TYPE:
+            return title, file_type, dashboard.render(figure_json), time.perf_counter() - started, None
+        fig = pio.from_json(figure_json)
+        if file_type == 'html':
+            # A fixed div id keeps the HTML byte-identical across runs, so unchanged charts dedup on md5.
+            data = fig.to_html(div_id=chart_filename(title, 'chart').replace('.', '-')).encode('utf-8')
+        elif file_type == 'png':
+            data = fig.to_image(format='png', **PNG_RENDER_SETTINGS)
+        else:
+            raise ValueError(f"Unsupported file type: {file_type}")
+        return title, file_type, data, time.perf_counter() - started, None
+    except Exception as e:
+        return title, file_type, None, time.perf_counter() - started, (type(e).__name__, str(e))
+
+def chart_path(title, file_type):
+    return os.path.join(config.VISUALIZATION_PATH, chart_filename(title, file_type))
+
+def render_charts(jobs, bucket, workers=None, force=False, metrics=None, show_progress=False, location=None):
+    workers = workers or config.CHART_WORKERS
+    location = location or f"gs://{config.BUCKET}"
+    started = time.perf_counter()
+    timings = []
+    failures = []
+
+    previous = {} if force else load_chart_manifest(bucket)
+    fingerprints = {chart_filename(title, file_type): chart_fingerprint((title, file_type, figure_json))
+                    for title, file_type, figure_json in jobs}
+    manifest = {}
+    changed_jobs = []
+    for job in jobs:
+        filename = chart_filename(job[0], job[1])
+        if previous.get(filename) == fingerprints[filename]:
+            manifest[filename] = fingerprints[filename]
+        else:
+            changed_jobs.append(job)
+    skipped = len(jobs) - len(changed_jobs)
+    jobs = changed_jobs
 
-    if file_type == 'html':
-        fig.write_html(local_filename)
-        content_type = 'text/html'
-    elif file_type == 'png':
-        fig.write_image(local_filename, scale=2, width=1000, height=1200)
-        content_type = 'image/png'
+    remote_hashes = remote_md5s(bucket, config.VISUALIZATION_PATH) if jobs else {}
+    uploader = ParallelUploader(bucket, remote_hashes)
+    pending = []
+
+    def finish(title, file_type, seconds, stage, error):
+        if metrics is not None and error is not None:
+            metrics.inc("errors_total", stage=stage, type=error[0])
+        if error is not None:
+            print(f"Could not {stage} chart '{title}'. Reason: {error[1]}")
+            failures.append(title)
+        else:
+            # Failed charts stay out of the manifest so the next run retries them.
+            filename = chart_filename(title, file_type)
+            manifest[filename] = fingerprints[filename]
+        timings.append((title, file_type, seconds, error is None))
+
+    def handle(result):
+        title, file_type, data, seconds, error = result
+        if metrics is not None:
+            metrics.observe("chart_render_seconds", seconds, file_type=file_type)
+            metrics.add_stage_time('render', seconds)
+        if progress is not None:
+            progress.update(ok=error is None)
+        if error is not None:
+            finish(title, file_type, seconds, 'render', error)
+        else:
+            # Rendering goes on while the upload pool works through the finished charts.
+            upload = uploader.submit(chart_path(title, file_type), data, CONTENT_TYPES[file_type], CONTENT_ENCODINGS.get(file_type))
+            pending.append((upload, title, file_type, seconds))
+
+    print(f"\n--- Rendering {len(jobs)} charts with {workers} worker(s), {skipped} unchanged charts skipped ---")
+    progress = ProgressLine(len(jobs), "render") if show_progress and jobs else None
+    if workers <= 1:
+        for job in jobs:
+            handle(render_chart(job))
     else:
-        print(f"Unsupported file type: {file_type}")
-        return
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(render_chart, job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    handle(future.result())
+                except Exception as e:
+                    # The worker itself died (e.g. Kaleido crashed); only this chart is lost.
+                    title, file_type, _ = futures[future]
+                    handle((title, file_type, None, 0.0, (type(e).__name__, f"worker failed: {e}")))
 
-    bucket.blob(gcs_path).upload_from_filename(local_filename, content_type=content_type)
-    print(f"Chart '{title}' uploaded to gs://{config.BUCKET}/{gcs_path}")
+    if progress is not None:
+        progress.close()
+    for future, title, file_type, seconds in pending:
+        try:
+            status = future.result()
+        except Exception as e:
+            finish(title, file_type, seconds, 'upload', (type(e).__name__, f"upload failed: {e}"))
+            continue
+        if status == "uploaded":
+            print(f"Chart '{title}' uploaded to {location}/{chart_path(title, file_type)}")
+        finish(title, file_type, seconds, 'upload', None)
+    uploader.close()
+
+    if metrics is not None:
+        metrics.inc("charts_skipped_total", skipped)
+        uploader.record_metrics(metrics)
+    save_chart_manifest(bucket, manifest)
+    print_timing_report(timings, time.perf_counter() - started)
+    uploader.print_summary()
+    return failures
 
-    if os.path.exists(local_filename):
-        os.remove(local_filename)
+def print_timing_report(timings, wall_seconds):
+    print("\n--- Chart Rendering Times ---")
+    for title, file_type, seconds, ok in sorted(timings, key=lambda timing: timing[2], reverse=True):
+        print(f"   {seconds:7.2f}s  {file_type:<4}  {title}{'' if ok else '  (FAILED)'}")
+    render_seconds = sum(timing[2] for timing in timings)
+    failed = sum(1 for timing in timings if not timing[3])
+    print(f"Rendered {len(timings) - failed}/{len(timings)} charts in {wall_seconds:.1f}s wall time "
+          f"({render_seconds:.1f}s of rendering).")
 
-def create_sunburst(data_df, path, title, bucket, text_info=None):
+def create_sunburst(cube, path, title, text_info=None):
     font_settings = dict(family="Arial, sans-serif", size=14, color="black")
-    plot_df = data_df[path].copy()
-    
-    for col in path:
-        plot_df[col] = plot_df[col].astype(str)
-        plot_df = plot_df[~plot_df[col].isin(["UNKNOWN", "NOT_APPLICABLE", 'nan', 'None'])]
-    
-    plot_df.dropna(inplace=True)
-    if len(plot_df) < 20:
+    counts = cube.path_counts(path)
+    sample_count = int(counts['count'].sum())
+    if sample_count < 20:
         print(f"Skipping Sunburst for '{title}': Not enough valid data.")
-        return
+        return None
 
-    fig = px.sunburst(plot_df, path=path, color=path[0])
-    sample_count = len(plot_df)
+    fig = px.sunburst(counts, path=path, values='count', color=path[0])
     formatted_title = f"{title} (n={sample_count})"
     
     all_parents = set(fig.data[0].parents)
@@ -93,65 +218,56 @@ def create_sunburst(data_df, path, title, bucket, text_info=None):
     if text_info:
         fig.update_traces(textinfo=text_info)
 
-    save_and_upload(fig, title, bucket, 'html')
+    return chart_job(fig, title, 'html')
 
-def plot_sample_sizes(df, bucket):
+def plot_sample_sizes(cube):
     sample_sizes = {}
-    for col in df.columns:
+    for col in cube.df.columns:
         if col not in ["username", "post_datetime", "reasoning"]:
-            valid_data = df[col].dropna()
-            valid_data = valid_data[~valid_data.isin(["UNKNOWN", "NOT_APPLICABLE", None])]
-            if valid_data.apply(isinstance, args=(list,)).any():
-                valid_data = valid_data.explode()
-            sample_sizes[col.replace('_', ' ').title()] = len(valid_data)
+            sample_sizes[col.replace('_', ' ').title()] = cube.sample_size(col)
     
     sample_df = pd.DataFrame(list(sample_sizes.items()), columns=['Attribute', 'Sample Size (n)']).sort_values('Sample Size (n)', ascending=True)
     fig = px.bar(sample_df, x='Sample Size (n)', y='Attribute', orientation='h', title='Available Samples per Question', text='Sample Size (n)')
     fig.update_layout(font_size=14, yaxis={'categoryorder':'total ascending'})
     fig.update_traces(textposition='inside', marker_color='skyblue')
-    save_and_upload(fig, "sample_size_overview", bucket, 'png')
+    return [chart_job(fig, "sample_size_overview", 'png')]
 
-def plot_general_visualizations(df, bucket):
+def plot_general_visualizations(cube):
+    jobs = []
     excluded = {"username", "alert_language", "reasoning", "magnitude_on_alert_screenshot", "warning_time_seconds", "distance_on_alert_screenshot_ml"}
     numerical = {"shaking_intensity_mmi"}
     font_settings = dict(family="Arial, sans-serif", size=16, color="black")
 
-    for attribute in [col for col in df.columns if col not in excluded]:
-        valid_data = df[attribute].dropna()
-        valid_data = valid_data[~valid_data.isin(["UNKNOWN", "NOT_APPLICABLE", None])]
-        if valid_data.empty: continue
-
-        sample_count = len(valid_data)
-        title = f"{attribute.replace('_', ' ').title()} (n={sample_count})"
-        fig = None
-
+    for attribute in [col for col in cube.df.columns if col not in excluded]:
         try:
+            row_count = cube.row_count(attribute)
+            if row_count == 0: continue
+
+            title = f"{attribute.replace('_', ' ').title()} (n={row_count})"
             if attribute in numerical:
-                plot_data = pd.to_numeric(valid_data, errors='coerce').dropna()
+                plot_data = cube.numeric(attribute)
                 if plot_data.empty: continue
                 fig = px.histogram(plot_data, nbins=20, title=f"{title} (n={len(plot_data)})")
                 fig.update_layout(bargap=0.1, yaxis_title="Frequency", xaxis_title=attribute.replace('_', ' ').title(), showlegend=False)
             else:
-                if valid_data.apply(isinstance, args=(list,)).any():
-                    valid_data = valid_data.explode()
-                if attribute == 'alert_info_recall':
-                    valid_data = valid_data[valid_data != 'UNKNOWN']
-                
-                sample_count = len(valid_data)
-                value_counts_df = valid_data.value_counts().reset_index().head(10)
+                sample_count = cube.sample_size(attribute)
+                value_counts_df = cube.value_counts(attribute).reset_index().head(10)
                 value_counts_df.columns = ['category', 'count']
                 fig = px.pie(value_counts_df, values='count', names='category', title=title, hole=0.4)
                 fig.update_traces(textposition='inside', textinfo='percent+label', textfont_size=14)
                 fig.update_layout(annotations=[dict(text=f'n={sample_count}', x=0.5, y=0.5, font_size=24, showarrow=False)], legend_title_text='Categories')
             
-            if fig:
-                fig.update_layout(font=font_settings)
-                save_and_upload(fig, attribute, bucket, 'png')
+            fig.update_layout(font=font_settings)
+            jobs.append(chart_job(fig, attribute, 'png'))
         except Exception as e:
             print(f"Could not create plot for '{attribute}'. Reason: {e}")
+    return jobs
+
+def plot_event_specific(cube, events):
+    return [job for _, jobs in event_chart_groups(cube, events) for job in jobs]
 
-def plot_event_specific(df, bucket):
-    date_ranges = {"april_23_to_24": (datetime(2025, 4, 23), datetime(2025, 4, 24, 23, 59, 59))}
+def event_chart_groups(cube, events):
+    # Yields (event title, chart jobs) per event with posts in its window.
     hist_attrs = ["magnitude_on_alert_screenshot", "warning_time_seconds", "distance_on_alert_screenshot_ml"]
     sunburst_rels = {
         "Location and Alert Type": ["location_combined", "alert_type"], "Location and User Sentiment": ["location_combined", "users_sentiment"],
@@ -159,24 +275,27 @@ def plot_event_specific(df, bucket):
     }
     font_settings = dict(family="Arial, sans-serif", size=16, color="black")
 
-    for name, (start, end) in date_ranges.items():
-        event_df = df.dropna(subset=['post_datetime'])
-        event_df = event_df[(event_df['post_datetime'] >= start) & (event_df['post_datetime'] <= end)]
-        if event_df.empty: continue
+    for event, positions in event_windows(cube.df, events):
+        if not len(positions): continue
+        jobs = []
+        name = event['name']
+        event_cube = cube.take(name, positions)
 
-        title_prefix = f"{name.replace('_', ' ').title()}"
+        title_prefix = f"Event {event['start']:%Y-%m-%d %H%M} M{event['magnitude']:.1f}"
         for attr in hist_attrs:
-            valid_data = pd.to_numeric(event_df[attr], errors='coerce').dropna()
+            valid_data = event_cube.numeric(attr)
             if valid_data.empty: continue
             title = f"{title_prefix}: {attr.replace('_', ' ').title()}"
             fig = px.histogram(valid_data, nbins=20, title=f"{title} (n={len(valid_data)})")
             fig.update_layout(font=font_settings, bargap=0.1, yaxis_title="Frequency", xaxis_title=attr.replace('_', ' ').title(), showlegend=False)
-            save_and_upload(fig, f"{name}_{attr}", bucket, 'png')
+            jobs.append(chart_job(fig, f"{name}_{attr}", 'png'))
         
         for title, path in sunburst_rels.items():
-            create_sunburst(event_df, path, f"{title_prefix}: {title}", bucket)
+            jobs.append(create_sunburst(event_cube, path, f"{title_prefix}: {title}"))
+        yield title_prefix, [job for job in jobs if job]
 
-def plot_nested_relationships(df, bucket):
+def plot_nested_relationships(cube):
+    jobs = []
     relationships = {
         "Shaking Level and Alert Arrival": ["shaking_level", "alert_arrival_wrt_shaking"], "User Sentiment and Gender": ["users_sentiment", "user_s_gender"],
         "Action Taken and Gender": ["post_alert_action", "user_s_gender"], "Alert Type and Mode": ["alert_type", "alert_mode"],
@@ -188,10 +307,11 @@ def plot_nested_relationships(df, bucket):
         "Location and Alert Arrival": ["location_combined", "alert_arrival_wrt_shaking"]
     }
     for title, path in relationships.items():
-        if all(col in df.columns for col in path):
-            create_sunburst(df, path, title, bucket)
+        if all(col in cube.df.columns for col in path):
+            jobs.append(create_sunburst(cube, path, title))
     
-    create_sunburst(df, ["helpfulness", "helpfulness_reason"], "Helpfulness and Reason", bucket, text_info="label+percent parent")
+    jobs.append(create_sunburst(cube, ["helpfulness", "helpfulness_reason"], "Helpfulness and Reason", text_info="label+percent parent"))
+    return [job for job in jobs if job]
 
 def perform_sanity_checks(df):
     print("\n--- Data Sanity Checks ---")
@@ -208,22 +328,58 @@ def perform_sanity_checks(df):
         for index, row in strong_before.iterrows():
             print(f"Filename: {index}\\nReasoning: {row['reasoning']}\\n---")
 
-def main():
+def plot_dashboard(cube, events):
+    tabs = [("Relationships", plot_nested_relationships(cube))] + list(event_chart_groups(cube, events))
+    return [dashboard.bundle("analysis_dashboard", tabs)]
+
+def build_chart_jobs(df, events=None, dashboard_mode=False):
+    cube = AggregationCube(df)
+    events = detect_events(df) if events is None else events
+    jobs = []
+    plots = (plot_sample_sizes, plot_general_visualizations)
+    # The dashboard replaces the standalone sunburst and per-event files.
+    plots += (plot_dashboard,) if dashboard_mode else (plot_event_specific, plot_nested_relationships)
+    for plot in plots:
+        try:
+            jobs.extend(plot(cube, events) if plot in (plot_event_specific, plot_dashboard) else plot(cube))
+        except Exception as e:
+            print(f"Could not build charts in '{plot.__name__}'. Reason: {e}")
+    return jobs
+
+def main(workers=None, force=False, show_progress=False, output_dir=None, dashboard_mode=False):
+    dashboard_mode = dashboard_mode or config.DASHBOARD_EXPORT
+    metrics = Metrics("visualize")
     try:
-        storage_client = storage.Client(project=config.PROJECT_ID)
+        # Imported here so the chart-building functions load without the GCS client.
+        from google.cloud import storage
+        storage_client = instrument_storage(storage.Client(project=config.PROJECT_ID), metrics)
         bucket = storage_client.bucket(config.BUCKET)
     except Exception as e:
         print(f"Failed to initialize GCS client. Error: {e}")
         return
+    # Data is always read from GCS; charts, the chart manifest and the event list go to the target.
+    target, location = bucket, None
+    if output_dir:
+        target, location = instrument_storage(LocalStorageClient(output_dir), metrics).bucket(""), output_dir
 
-    df = load_and_preprocess_data(bucket)
+    with metrics.stage("load"):
+        df = load_and_preprocess_data(bucket)
 
     if df is not None:
-        plot_sample_sizes(df, bucket)
-        plot_general_visualizations(df, bucket)
-        plot_event_specific(df, bucket)
-        plot_nested_relationships(df, bucket)
+        with metrics.stage("chart_build"):
+            events = detect_events(df)
+            jobs = build_chart_jobs(df, events, dashboard_mode)
+        print_events(events)
+        save_events(target, events)
+        with metrics.stage("render_wall"):
+            render_charts(jobs, target, workers, force, metrics, show_progress, location)
         perform_sanity_checks(df)
 
+    metrics.print_summary()
+    metrics.write()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Same flags as `eews visualize`.
+    from eews_analysis.cli import main as cli
+
+    sys.exit(cli(["visualize", *sys.argv[1:]]))
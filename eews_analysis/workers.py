@@ -0,0 +1,18 @@
+import zlib
+
+# Worker partitions for sharded extraction (see sharding.py). Kept free of
+# third-party imports so the CLI can parse --worker without loading pandas
+# or pyarrow.
+
+
+def worker_spec(text):
+    # "I/N" -> (I, N), 0-based: "0/4" .. "3/4".
+    index, count = (int(part) for part in text.split("/"))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"worker must be I/N with 0 <= I < N, got {text}")
+    return index, count
+
+
+def owns(file_name, worker):
+    index, count = worker
+    return zlib.crc32(file_name.encode("utf-8")) % count == index
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from eews_analysis import config
+from eews_analysis.local import LocalBlob, LocalBucket, LocalStorageClient
+
+
+# Raised by name, like the google.api_core exceptions deadletter.classify() looks at.
+class ServiceUnavailable(Exception):
+    pass
+
+
+class NotFound(Exception):
+    pass
+
+
+class PermissionDenied(Exception):
+    pass
+
+
+class FlakyBlob(LocalBlob):
+    def upload_from_string(self, data, content_type=None):
+        if self.bucket.upload_failures:
+            raise self.bucket.upload_failures.pop(0)
+        super().upload_from_string(data, content_type)
+
+    def delete(self):
+        failure = self.bucket.delete_failures.pop(0) if self.bucket.delete_failures else None
+        if failure == "lost":
+            # The delete went through but its response never arrived.
+            super().delete()
+            raise ServiceUnavailable("503 connection reset")
+        if failure is not None:
+            raise failure
+        if not self.exists():
+            raise NotFound(f"404 {self.name}")
+        super().delete()
+
+
+class FlakyBucket(LocalBucket):
+    # A directory bucket whose uploads / copies / deletes fail from a script.
+
+    def __init__(self, bucket, copy_failures=(), delete_failures=(), upload_failures=()):
+        super().__init__(bucket.root, bucket.name)
+        self.copy_failures = list(copy_failures)
+        self.delete_failures = list(delete_failures)
+        self.upload_failures = list(upload_failures)
+        self.copies = 0
+
+    def blob(self, name):
+        return FlakyBlob(self, name)
+
+    def copy_blob(self, blob, destination_bucket, new_name):
+        self.copies += 1
+        if self.copy_failures:
+            raise self.copy_failures.pop(0)
+        return super().copy_blob(blob, destination_bucket, new_name)
+
+
+@pytest.fixture(autouse=True)
+def local_cache_dirs(tmp_path, monkeypatch):
+    # Keep the local caches and metrics out of the working tree.
+    monkeypatch.setattr(config, "RESPONSE_CACHE_DIR", str(tmp_path / "cache" / "responses"))
+    monkeypatch.setattr(config, "PREPROCESS_CACHE_DIR", str(tmp_path / "cache" / "images"))
+    monkeypatch.setattr(config, "LOCATION_CACHE_PATH", str(tmp_path / "cache" / "locations.json"))
+    monkeypatch.setattr(config, "LOCATION_UNMATCHED_REPORT", str(tmp_path / "cache" / "unmatched_locations.csv"))
+    monkeypatch.setattr(config, "METRICS_DIR", str(tmp_path / "cache" / "metrics"))
+
+
+@pytest.fixture
+def storage_client(tmp_path):
+    return LocalStorageClient(str(tmp_path / "gcs"))
+
+
+@pytest.fixture
+def bucket(storage_client):
+    return storage_client.bucket(config.BUCKET)
+
+
+def add_inputs(bucket, file_names, folder=None):
+    folder = folder or config.INPUT_PATH_1
+    blob_names = [os.path.join(folder, file_name) for file_name in file_names]
+    for blob_name in blob_names:
+        bucket.blob(blob_name).upload_from_string(os.urandom(32), content_type="image/png")
+    return blob_names
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from eews_analysis.aggregate import AggregationCube
+from eews_analysis.schema import explode_field
+
+MISSING = ["UNKNOWN", "NOT_APPLICABLE", None]
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(7)
+    size = 500
+
+    def choice(values):
+        return rng.choice(np.array(values, dtype=object), size=size)
+
+    recall = ["SAFETY_ADVICE", "ESTIMATED_MAGNITUDE", "ALERT_SOURCE"]
+    df = pd.DataFrame({
+        "alert_type": choice(["BE_AWARE_NOTIFICATION", "TAKE_ACTION_ALERT"] + MISSING),
+        "users_sentiment": choice(["POSITIVE", "NEGATIVE", "NEUTRAL", "MIXED", "UNKNOWN"]),
+        "location_combined": choice(["Istanbul", "Izmir", "Bursa", "NOT_APPLICABLE", None]),
+        "shaking_intensity_mmi": rng.choice([3.0, 4.0, 5.0, 6.5, np.nan], size=size),
+        "alert_info_recall": [list(rng.choice(recall, size=rng.integers(0, 3), replace=False)) or "UNKNOWN"
+                              for _ in range(size)],
+        "post_datetime": pd.Timestamp("2025-04-20") + pd.to_timedelta(rng.integers(0, 10 * 24, size=size), unit="h"),
+    }, index=[f"{i:04d}.png" for i in range(size)])
+    return df
+
+
+def per_chart_labels(df, column):
+    # What each chart used to compute for itself before the shared cube.
+    valid = df[column].dropna()
+    valid = valid[~valid.isin(MISSING)]
+    if column == "alert_info_recall":
+        return explode_field(valid, column).astype(str)
+    if pd.api.types.is_float_dtype(valid):
+        return valid.map(lambda value: f"{value:g}")
+    return valid.astype(str)
+
+
+def per_chart_path_counts(df, path):
+    plot_df = df[path].copy()
+    for column in path:
+        labels = plot_df[column].map(lambda value: f"{value:g}" if isinstance(value, float) else str(value))
+        plot_df[column] = labels
+        plot_df = plot_df[~plot_df[column].isin(["UNKNOWN", "NOT_APPLICABLE", "nan", "None"])]
+    return plot_df.groupby(path).size().to_dict()
+
+
+def cube_path_counts(cube, path):
+    table = cube.path_counts(path)
+    return {tuple(row[:-1]) if len(path) > 1 else row[0]: row[-1] for row in table.itertuples(index=False)}
+
+
+COLUMNS = ["alert_type", "users_sentiment", "location_combined", "shaking_intensity_mmi", "alert_info_recall"]
+PATHS = [
+    ["location_combined", "alert_type"],
+    ["location_combined", "users_sentiment"],
+    ["alert_type", "shaking_intensity_mmi"],
+    ["users_sentiment", "location_combined", "alert_type"],
+]
+
+
+@pytest.mark.parametrize("column", COLUMNS)
+def test_value_counts_match_per_chart_groupby(frame, column):
+    cube = AggregationCube(frame)
+    expected = per_chart_labels(frame, column)
+
+    assert cube.value_counts(column).to_dict() == expected.value_counts().to_dict()
+    assert cube.sample_size(column) == len(expected)
+    assert cube.row_count(column) == expected.index.nunique()
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_path_counts_match_per_chart_groupby(frame, path):
+    assert cube_path_counts(AggregationCube(frame), path) == per_chart_path_counts(frame, path)
+
+
+def test_numeric_matches_to_numeric(frame):
+    cube = AggregationCube(frame)
+    expected = pd.to_numeric(frame["shaking_intensity_mmi"], errors="coerce").dropna()
+    pd.testing.assert_series_equal(cube.numeric("shaking_intensity_mmi"), expected)
+
+
+def test_subset_matches_filtering_the_frame_first(frame):
+    mask = (frame["post_datetime"] >= "2025-04-23") & (frame["post_datetime"] <= "2025-04-24 23:59:59")
+    cube = AggregationCube(frame)
+    window = cube.subset("april_23_to_24", mask)
+    event_df = frame[mask]
+
+    for column in COLUMNS:
+        assert window.value_counts(column).to_dict() == per_chart_labels(event_df, column).value_counts().to_dict()
+    for path in PATHS:
+        assert cube_path_counts(window, path) == per_chart_path_counts(event_df, path)
+    assert cube.subset("april_23_to_24", mask) is window
+
+
+def test_results_are_memoized(frame):
+    cube = AggregationCube(frame)
+    assert cube.value_counts("alert_type") is cube.value_counts("alert_type")
+    assert cube.path_counts(PATHS[0]) is cube.path_counts(PATHS[0])
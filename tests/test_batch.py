@@ -0,0 +1,134 @@
+import json
+import os
+
+from conftest import add_inputs
+from eews_analysis import config
+from eews_analysis.batch import request_image_uri
+from eews_analysis.deadletter import PERMANENT, TRANSIENT, DeadLetterQueue
+from eews_analysis.local import FAKE_RESULT, LocalBatchBackend
+from eews_analysis.manifest import DONE, FAILED, PENDING, InputManifest
+from eews_analysis.process_data import process_all_tweets_batch
+
+
+class DroppingBatchBackend(LocalBatchBackend):
+    # Leaves some requests out of the predictions output entirely.
+
+    def __init__(self, bucket, responses_dir, dropped):
+        super().__init__(bucket, responses_dir)
+        self.dropped = set(dropped)
+
+    def poll(self, job):
+        state, output = super().poll(job)
+        path = output.split("/", 3)[3] + "/predictions.jsonl"
+        lines = self.bucket.blob(path).download_as_string().decode("utf-8").splitlines()
+        kept = [line for line in lines if os.path.basename(request_image_uri(json.loads(line))) not in self.dropped]
+        self.bucket.blob(path).upload_from_string("\n".join(kept) + "\n")
+        return state, output
+
+
+class RecordingBatchBackend(LocalBatchBackend):
+    def __init__(self, bucket, responses_dir):
+        super().__init__(bucket, responses_dir)
+        self.submitted = []
+
+    def submit(self, input_uri, output_uri_prefix):
+        requests_path = input_uri.split("/", 3)[3]
+        lines = self.bucket.blob(requests_path).download_as_string().decode("utf-8").splitlines()
+        self.submitted.extend(os.path.basename(request_image_uri(json.loads(line))) for line in lines if line.strip())
+        return super().submit(input_uri, output_uri_prefix)
+
+
+def write_canned(responses_dir, file_names):
+    os.makedirs(responses_dir, exist_ok=True)
+    for file_name in file_names:
+        with open(os.path.join(responses_dir, f"{file_name}.json"), "w", encoding="utf-8") as f:
+            f.write("```json\n" + json.dumps(dict(FAKE_RESULT, username=f"@{file_name}")) + "\n```")
+
+
+def read_results_file(bucket):
+    return json.loads(bucket.blob(os.path.join(config.OUTPUT_PATH, config.RESULTS_FILENAME)).download_as_string())
+
+
+def test_batch_round_trip(tmp_path, storage_client, bucket):
+    file_names = ["a.png", "b.png", "c.png"]
+    blob_names = add_inputs(bucket, file_names)
+    write_canned(str(tmp_path / "responses"), file_names)
+
+    process_all_tweets_batch(LocalBatchBackend(bucket, str(tmp_path / "responses")), storage_client)
+
+    results = read_results_file(bucket)
+    assert sorted(results) == file_names
+    assert results["b.png"]["username"] == "@b.png"
+    manifest = InputManifest.load(bucket)
+    assert all(manifest.entries[blob_name]["status"] == DONE for blob_name in blob_names)
+    assert DeadLetterQueue.load(bucket).entries == {}
+
+
+def test_batch_failed_line_is_dead_lettered(tmp_path, storage_client, bucket):
+    blob_names = add_inputs(bucket, ["a.png", "b.png"])
+    write_canned(str(tmp_path / "responses"), ["a.png"])
+
+    process_all_tweets_batch(LocalBatchBackend(bucket, str(tmp_path / "responses")), storage_client)
+
+    assert sorted(read_results_file(bucket)) == ["a.png"]
+    assert InputManifest.load(bucket).entries[blob_names[1]]["status"] == FAILED
+    dead_letters = DeadLetterQueue.load(bucket)
+    assert list(dead_letters.entries) == [blob_names[1]]
+    assert dead_letters.entries[blob_names[1]]["category"] == PERMANENT
+
+
+def test_batch_missing_prediction_is_dead_lettered(tmp_path, storage_client, bucket, capsys):
+    file_names = ["a.png", "b.png", "c.png"]
+    blob_names = add_inputs(bucket, file_names)
+    write_canned(str(tmp_path / "responses"), file_names)
+
+    backend = DroppingBatchBackend(bucket, str(tmp_path / "responses"), dropped=["c.png"])
+    process_all_tweets_batch(backend, storage_client)
+
+    assert sorted(read_results_file(bucket)) == ["a.png", "b.png"]
+    assert InputManifest.load(bucket).entries[blob_names[2]]["status"] == FAILED
+    assert "Error processing c.png: no prediction in the batch output" in capsys.readouterr().out
+
+    # Visible to --redrive as a transient failure.
+    dead_letters = DeadLetterQueue.load(bucket)
+    entry = dead_letters.entries[blob_names[2]]
+    assert entry["category"] == TRANSIENT
+    assert entry["error_class"] == "BatchPredictionError"
+    entry["next_attempt_after"] = 0
+    assert dead_letters.due() == [blob_names[2]]
+
+
+def test_batch_rerun_skips_done_files(tmp_path, storage_client, bucket):
+    add_inputs(bucket, ["a.png"])
+    write_canned(str(tmp_path / "responses"), ["a.png"])
+    process_all_tweets_batch(LocalBatchBackend(bucket, str(tmp_path / "responses")), storage_client)
+
+    backend = RecordingBatchBackend(bucket, str(tmp_path / "responses"))
+    process_all_tweets_batch(backend, storage_client)
+
+    assert backend.submitted == []
+    assert sorted(read_results_file(bucket)) == ["a.png"]
+
+
+def test_batch_cache_hits_are_not_resubmitted(tmp_path, storage_client, bucket):
+    blob_names = add_inputs(bucket, ["a.png", "b.png"])
+    write_canned(str(tmp_path / "responses"), ["a.png", "b.png"])
+    process_all_tweets_batch(LocalBatchBackend(bucket, str(tmp_path / "responses")), storage_client)
+
+    # Forget that the files were extracted; only the response cache knows them.
+    manifest = InputManifest.load(bucket)
+    for blob_name in blob_names:
+        manifest.mark(blob_name, PENDING)
+    manifest.save(bucket)
+    bucket.blob(os.path.join(config.OUTPUT_PATH, config.RESULTS_FILENAME)).delete()
+    bucket.blob(os.path.join(config.OUTPUT_PATH, config.RESULTS_KEYS_FILENAME)).delete()
+
+    backend = RecordingBatchBackend(bucket, str(tmp_path / "responses"))
+    process_all_tweets_batch(backend, storage_client)
+
+    assert backend.submitted == []
+    results = read_results_file(bucket)
+    assert sorted(results) == ["a.png", "b.png"]
+    assert results["a.png"]["username"] == "@a.png"
+    manifest = InputManifest.load(bucket)
+    assert all(entry["status"] == DONE for entry in manifest.entries.values())
@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+from eews_analysis import benchmark, config
+
+
+def test_benchmark_leaves_nothing_in_the_working_directory(tmp_path, monkeypatch):
+    work = tmp_path / "work"
+    work.mkdir()
+    monkeypatch.chdir(work)
+    output = tmp_path / "results" / "run.json"
+
+    report = benchmark.run([200], seed=1, output=str(output))
+
+    stages = [result["stage"] for result in report["results"]]
+    assert stages == ["generate", "write", "load", "clean_masks", "load_typed", "preprocess", "aggregate", "chart_build"]
+    assert json.loads(output.read_text())["seed"] == 1
+    assert os.listdir(work) == []
+
+
+def test_local_caches_are_redirected_and_restored(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "RESPONSE_CACHE_DIR", os.path.join(config.CACHE_DIR, "responses"))
+    benchmark_dir = config.BENCHMARK_DIR
+
+    with benchmark.local_caches(str(tmp_path)):
+        assert config.RESPONSE_CACHE_DIR == os.path.join(str(tmp_path), "responses")
+        assert config.BENCHMARK_DIR == benchmark_dir
+
+    assert config.RESPONSE_CACHE_DIR == os.path.join(config.CACHE_DIR, "responses")
+
+
+def test_benchmark_does_not_import_the_cloud_clients():
+    code = "import sys, eews_analysis.benchmark; print(sorted(m for m in sys.modules if m.startswith(('google.cloud', 'vertexai'))))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,164 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import add_inputs
+from eews_analysis import config
+from eews_analysis.cascade import Cascade, ModelScreen, screen_rules
+from eews_analysis.deadletter import DeadLetterQueue
+from eews_analysis.local import FakeCachedContext, FakeModel
+from eews_analysis.manifest import DONE, PENDING, InputManifest
+from eews_analysis.process_data import process_all_tweets
+from eews_analysis.response_cache import ResponseCache
+from eews_analysis.usage import TokenUsage
+
+IN_WINDOW = {"alert_source": "AEA", "magnitude_on_alert_screenshot": "5.3",
+             "post_datetime": "2025-04-23T12:59", "alert_time": "2025-04-23T12:49"}
+
+
+class FixedStage:
+    # A screening stage that answers from a table keyed by file name.
+
+    def __init__(self, answers, name="fixed", error=None):
+        self.answers = answers
+        self.name = name
+        self.error = error
+        self.calls = 0
+
+    def screen(self, image, file_name, image_hash=None, metrics=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return dict(IN_WINDOW, **self.answers.get(file_name, {}))
+
+
+def test_screen_rules_keep_only_screened_fields():
+    assert [rule["name"] for rule in screen_rules()] == ["magnitude", "post_date", "alert_date", "alert_source"]
+    assert screen_rules([{"name": "lang", "kind": "allow", "column": "alert_language", "values": ["tr"]}]) == []
+
+
+def test_in_window_and_unknown_answers_escalate():
+    unknown = {key: "UNKNOWN" for key in IN_WINDOW}
+    cascade = Cascade([FixedStage({"unknown.png": unknown})])
+
+    assert cascade.screen(None, "ok.png") == []
+    assert cascade.screen(None, "unknown.png") == []
+    assert cascade.escalated == 2
+    assert cascade.counts["fixed"]["passed"] == 2
+
+
+def test_drops_are_counted_per_rule():
+    cascade = Cascade([FixedStage({
+        "small.png": {"magnitude_on_alert_screenshot": "3.9"},
+        "late.png": {"post_datetime": "2025-08-01T10:00", "alert_source": "EQN"},
+        "eqn.png": {"alert_source": "EQN"},
+    })])
+
+    assert cascade.screen(None, "small.png") == ["magnitude"]
+    assert cascade.screen(None, "late.png") == ["post_date", "alert_source"]
+    assert cascade.screen(None, "eqn.png") == ["alert_source"]
+    assert cascade.screen(None, "ok.png") == []
+    assert cascade.skipped_by == {"magnitude": 1, "post_date": 1, "alert_source": 2}
+    assert dict(cascade.counts["fixed"]) == {"skipped": 3, "passed": 1}
+    assert cascade.escalated == 1
+
+
+def test_errors_escalate_and_later_stages_still_run():
+    failing = FixedStage({}, name="broken", error=RuntimeError("500 backend error"))
+    second = FixedStage({"small.png": {"magnitude_on_alert_screenshot": "3.9"}}, name="second")
+    cascade = Cascade([failing, second])
+
+    assert cascade.screen(None, "small.png") == ["magnitude"]
+    assert cascade.screen(None, "ok.png") == []
+    assert cascade.counts["broken"]["errors"] == 2
+    assert cascade.counts["second"]["skipped"] == 1
+
+    only_failing = Cascade([FixedStage({}, name="broken", error=RuntimeError("500"))])
+    assert only_failing.screen(None, "small.png") == []
+    assert only_failing.escalated == 1
+
+
+def test_first_stage_drop_skips_later_stages():
+    first = FixedStage({"eqn.png": {"alert_source": "EQN"}}, name="first")
+    second = FixedStage({}, name="second")
+    cascade = Cascade([first, second])
+
+    cascade.screen(None, "eqn.png")
+    assert second.calls == 0
+
+
+def test_savings_weigh_screen_tokens_by_cost_ratio(monkeypatch):
+    monkeypatch.setattr(config, "CASCADE_SCREEN_COST_RATIO", 0.5)
+    stage = FixedStage({"eqn.png": {"alert_source": "EQN"}})
+    stage.usage = TokenUsage()
+    stage.usage.prompt_tokens, stage.usage.output_tokens = 300, 100
+    cascade = Cascade([stage])
+    cascade.screen(None, "eqn.png")
+    full_usage = SimpleNamespace(requests=2, prompt_tokens=1800, output_tokens=200)
+
+    assert cascade.savings(full_usage) == {"skipped": 1, "avoided_tokens": 1000.0, "screen_tokens": 400,
+                                           "net_tokens": 800.0}
+
+
+class ScreenModel:
+    # Answers the screen prompt by screenshot name.
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.call_count = 0
+
+    def generate_content(self, contents, generation_config=None, safety_settings=None):
+        self.call_count += 1
+        fields = dict(IN_WINDOW)
+        for file_name, answers in self.answers.items():
+            if any(file_name in str(part) for part in contents):
+                fields.update(answers)
+        usage_metadata = SimpleNamespace(prompt_token_count=300, candidates_token_count=40, cached_content_token_count=0)
+        return SimpleNamespace(text=json.dumps(fields), usage_metadata=usage_metadata)
+
+
+def model_screen(model):
+    def generate(context, image, file_name, usage, metrics):
+        response = context.generate(image)
+        usage.record(response)
+        return response
+
+    cache = ResponseCache(prompt_hash="screen-test", model_name="screen-model")
+    return ModelScreen(FakeCachedContext(model, []), generate, cache=cache)
+
+
+@pytest.fixture
+def fast_limiter(monkeypatch):
+    monkeypatch.setattr(config, "REQUESTS_PER_SECOND", 1000.0)
+    monkeypatch.setattr(config, "MAX_REQUESTS_PER_SECOND", 1000.0)
+
+
+def test_screened_out_files_stay_pending(storage_client, bucket, fast_limiter):
+    blob_names = add_inputs(bucket, ["keep.png", "small.png", "eqn.png"])
+    screen_model = ScreenModel({"small.png": {"magnitude_on_alert_screenshot": "3.9"},
+                                "eqn.png": {"alert_source": "EQN"}})
+    full_model = FakeModel(latency=0.0)
+
+    process_all_tweets(context=FakeCachedContext(full_model, []), storage_client=storage_client,
+                       cascade=Cascade([model_screen(screen_model)]))
+
+    manifest = InputManifest.load(bucket)
+    assert [manifest.entries[blob_name]["status"] for blob_name in blob_names] == [DONE, PENDING, PENDING]
+    assert DeadLetterQueue.load(bucket).entries == {}
+    assert full_model.call_count == 1
+    assert screen_model.call_count == 3
+
+    # Next run: the screen answers come from the cache and the files stay deferred.
+    rerun_screen_model = ScreenModel({})
+    process_all_tweets(context=FakeCachedContext(full_model, []), storage_client=storage_client,
+                       cascade=Cascade([model_screen(rerun_screen_model)]))
+    assert rerun_screen_model.call_count == 0
+    assert full_model.call_count == 1
+    manifest = InputManifest.load(bucket)
+    assert [manifest.entries[blob_name]["status"] for blob_name in blob_names[1:]] == [PENDING, PENDING]
+
+    # Without the cascade they are extracted.
+    process_all_tweets(context=FakeCachedContext(full_model, []), storage_client=storage_client)
+    manifest = InputManifest.load(bucket)
+    assert all(manifest.entries[blob_name]["status"] == DONE for blob_name in blob_names)
@@ -0,0 +1,155 @@
+import json
+
+import pytest
+
+from eews_analysis import checkpoint
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashingBlob:
+    def __init__(self, blob, bucket):
+        self._blob = blob
+        self._bucket = bucket
+
+    def __getattr__(self, name):
+        return getattr(self._blob, name)
+
+    def upload_from_string(self, data, content_type=None):
+        if self._blob.name.endswith(checkpoint.KEYS_SUFFIX) and self._bucket.crash_on_keys:
+            raise Crash("process killed before the key sidecar was written")
+        self._blob.upload_from_string(data, content_type=content_type)
+
+
+class CrashingBucket:
+    def __init__(self, bucket):
+        self._bucket = bucket
+        self.crash_on_keys = False
+
+    def blob(self, name):
+        return CrashingBlob(self._bucket.blob(name), self)
+
+
+def result(file_name):
+    return {"username": f"@{file_name}", "post_location": "Istanbul"}
+
+
+def write_results(bucket, file_names, **kwargs):
+    with checkpoint.ShardWriter(bucket, **kwargs) as writer:
+        for file_name in file_names:
+            writer.add(file_name, result(file_name))
+    return writer
+
+
+def names(storage_client):
+    return [blob.name for blob in storage_client.list_blobs(checkpoint.config.BUCKET, prefix=checkpoint.shards_prefix())]
+
+
+def test_shards_are_written_with_key_sidecars(storage_client, bucket):
+    writer = write_results(bucket, ["a.png", "b.png", "c.png"], run_id="run", flush_every=2)
+
+    assert writer.records_written == 3
+    shard_names, key_names = checkpoint.list_shards(storage_client)
+    assert [name.rsplit("/", 1)[1] for name in shard_names] == ["run-00000.ndjson", "run-00001.ndjson"]
+    assert [name.rsplit("/", 1)[1] for name in key_names] == ["run-00000.keys", "run-00001.keys"]
+
+    assert bucket.blob(key_names[0]).download_as_string().decode("utf-8") == "a.png\nb.png\n"
+    lines = bucket.blob(shard_names[0]).download_as_string().decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"key": "a.png", "value": result("a.png")},
+        {"key": "b.png", "value": result("b.png")},
+    ]
+    assert checkpoint.read_completed_keys(storage_client, bucket) == {"a.png", "b.png", "c.png"}
+
+
+def test_flush_interval_triggers_a_flush():
+    class Clock:
+        now = 0.0
+
+        def __call__(self):
+            return self.now
+
+    class RecordingBucket:
+        def __init__(self):
+            self.uploads = []
+
+        def blob(self, name):
+            bucket = self
+
+            class Blob:
+                def upload_from_string(self, data, content_type=None):
+                    bucket.uploads.append(name)
+            return Blob()
+
+    clock = Clock()
+    bucket = RecordingBucket()
+    writer = checkpoint.ShardWriter(bucket, run_id="run", flush_every=100, flush_interval=5, clock=clock)
+    writer.add("a.png", result("a.png"))
+    assert bucket.uploads == []
+
+    clock.now = 6
+    writer.add("b.png", result("b.png"))
+    assert writer.records_written == 2
+    assert len(bucket.uploads) == 2
+
+
+def test_crash_mid_shard_resumes_without_duplicate_or_lost_keys(storage_client, bucket):
+    file_names = [f"{i:03d}.png" for i in range(10)]
+    crashing = CrashingBucket(bucket)
+
+    writer = checkpoint.ShardWriter(crashing, run_id="first", flush_every=4)
+    for file_name in file_names[:4]:
+        writer.add(file_name, result(file_name))
+    crashing.crash_on_keys = True
+    with pytest.raises(Crash):
+        for file_name in file_names[4:8]:
+            writer.add(file_name, result(file_name))
+
+    # The second shard landed but its sidecar did not, so only the first shard counts.
+    shard_names, key_names = checkpoint.list_shards(storage_client)
+    assert len(shard_names) == 2 and len(key_names) == 1
+    completed = checkpoint.read_completed_keys(storage_client, bucket)
+    assert completed == set(file_names[:4])
+
+    remaining = [file_name for file_name in file_names if file_name not in completed]
+    write_results(bucket, remaining, run_id="second", flush_every=4)
+
+    merged = checkpoint.compact_shards(storage_client, bucket)
+    assert sorted(merged) == file_names
+    assert merged == {file_name: result(file_name) for file_name in file_names}
+    keys = bucket.blob(checkpoint.results_keys_path()).download_as_string().decode("utf-8").splitlines()
+    assert sorted(keys) == file_names
+
+
+def test_torn_shard_line_is_skipped(storage_client, bucket):
+    write_results(bucket, ["a.png", "b.png"], run_id="run")
+    shard_names, _ = checkpoint.list_shards(storage_client)
+    blob = bucket.blob(shard_names[0])
+    blob.upload_from_string(blob.download_as_string() + b'{"key": "c.png", "val')
+
+    assert checkpoint.read_shard(bucket, shard_names[0]) == {"a.png": result("a.png"), "b.png": result("b.png")}
+
+
+def test_compaction_gives_the_same_result_set(storage_client, bucket):
+    bucket.blob(checkpoint.results_path()).upload_from_string(json.dumps({"old.png": result("old.png")}))
+    write_results(bucket, ["a.png", "b.png", "c.png"], run_id="one", flush_every=2)
+    write_results(bucket, ["d.png"], run_id="two")
+    before = checkpoint.read_completed_keys(storage_client, bucket)
+
+    merged = checkpoint.compact_shards(storage_client, bucket)
+
+    assert set(merged) == {"old.png", "a.png", "b.png", "c.png", "d.png"}
+    stored = json.loads(bucket.blob(checkpoint.results_path()).download_as_string())
+    assert stored == merged
+    assert names(storage_client) == []
+    assert checkpoint.read_completed_keys(storage_client, bucket) == before
+    assert checkpoint.compact_shards(storage_client, bucket) is None
+
+
+def test_legacy_results_file_gets_a_key_index(storage_client, bucket):
+    bucket.blob(checkpoint.results_path()).upload_from_string(json.dumps({"a.png": {}, "b.png": {}}))
+
+    assert checkpoint.read_completed_keys(storage_client, bucket) == {"a.png", "b.png"}
+    assert bucket.blob(checkpoint.results_keys_path()).exists()
@@ -0,0 +1,134 @@
+import os
+
+from conftest import FlakyBucket, NotFound, PermissionDenied, ServiceUnavailable, add_inputs
+from eews_analysis import config
+from eews_analysis.clean_data import clean_data, move_blob, move_files, plan_moves
+from eews_analysis.local import FAKE_RESULT, LocalStorageClient
+from eews_analysis.results_store import read_results, write_results
+
+
+def deleted_path(file_name):
+    return os.path.join(config.DELETED_FILES_PATH, file_name)
+
+
+def test_plan_moves_reports_unknown_files():
+    locations = {"a.png": f"{config.INPUT_PATH_1}/a.png", "b.png": f"{config.INPUT_PATH_2}/b.png"}
+    moves, missing = plan_moves(["a.png", "b.png", "c.png"], locations)
+    assert moves == [(f"{config.INPUT_PATH_1}/a.png", deleted_path("a.png")),
+                     (f"{config.INPUT_PATH_2}/b.png", deleted_path("b.png"))]
+    assert missing == ["c.png"]
+
+
+def test_move_blob_retries_transient_errors(bucket):
+    [blob_name] = add_inputs(bucket, ["a.png"])
+    flaky = FlakyBucket(bucket, copy_failures=[ServiceUnavailable("503")], delete_failures=[ServiceUnavailable("503")])
+    sleeps = []
+
+    assert move_blob(flaky, blob_name, deleted_path("a.png"), sleep=sleeps.append) == "moved"
+    assert not bucket.blob(blob_name).exists()
+    assert bucket.blob(deleted_path("a.png")).exists()
+    # The copy is not repeated once it has succeeded.
+    assert flaky.copies == 2
+    assert sleeps == [config.MOVE_RETRY_BACKOFF_SECONDS, config.MOVE_RETRY_BACKOFF_SECONDS * 2]
+
+
+def test_move_blob_not_found_after_copy_counts_as_moved(bucket):
+    [blob_name] = add_inputs(bucket, ["a.png"])
+    flaky = FlakyBucket(bucket, delete_failures=["lost"])
+
+    assert move_blob(flaky, blob_name, deleted_path("a.png"), sleep=lambda seconds: None) == "moved"
+    assert bucket.blob(deleted_path("a.png")).exists()
+
+
+def test_move_blob_source_gone_before_copy_is_missing(bucket):
+    flaky = FlakyBucket(bucket, copy_failures=[NotFound("404")])
+    assert move_blob(flaky, f"{config.INPUT_PATH_1}/gone.png", deleted_path("gone.png"),
+                     sleep=lambda seconds: None) == "missing"
+
+
+def test_move_blob_gives_up_on_permanent_errors(bucket):
+    [blob_name] = add_inputs(bucket, ["a.png"])
+    flaky = FlakyBucket(bucket, delete_failures=[PermissionDenied("403")])
+    sleeps = []
+
+    outcome = move_blob(flaky, blob_name, deleted_path("a.png"), sleep=sleeps.append)
+    assert isinstance(outcome, PermissionDenied)
+    assert sleeps == []
+    assert bucket.blob(blob_name).exists()
+
+
+def test_move_blob_gives_up_after_max_retries(bucket, monkeypatch):
+    monkeypatch.setattr(config, "MOVE_MAX_RETRIES", 2)
+    [blob_name] = add_inputs(bucket, ["a.png"])
+    flaky = FlakyBucket(bucket, copy_failures=[ServiceUnavailable("503")] * 5)
+
+    assert isinstance(move_blob(flaky, blob_name, deleted_path("a.png"), sleep=lambda seconds: None), ServiceUnavailable)
+    assert flaky.copies == 3
+
+
+def test_move_files_sorts_outcomes(bucket):
+    blob_names = add_inputs(bucket, ["a.png", "b.png"])
+    flaky = FlakyBucket(bucket, delete_failures=[PermissionDenied("403")])
+    moves = [(blob_names[0], deleted_path("a.png")), (blob_names[1], deleted_path("b.png")),
+             (f"{config.INPUT_PATH_1}/gone.png", deleted_path("gone.png"))]
+
+    outcomes = move_files(flaky, moves, workers=1)
+    assert outcomes == {"moved": [blob_names[1]], "missing": [f"{config.INPUT_PATH_1}/gone.png"], "failed": [blob_names[0]]}
+
+
+def write_corpus(bucket):
+    records = {
+        "keep.png": dict(FAKE_RESULT),
+        "low.png": dict(FAKE_RESULT, magnitude_on_alert_screenshot="3.9"),
+        "late.png": dict(FAKE_RESULT, post_datetime="2025-08-01T10:00"),
+    }
+    write_results(bucket, records)
+    return add_inputs(bucket, sorted(records))
+
+
+def test_clean_data_moves_removed_screenshots(storage_client, bucket):
+    write_corpus(bucket)
+
+    clean_data(storage_client=storage_client)
+
+    assert bucket.blob(f"{config.INPUT_PATH_1}/keep.png").exists()
+    for file_name in ("low.png", "late.png"):
+        assert not bucket.blob(f"{config.INPUT_PATH_1}/{file_name}").exists()
+        assert bucket.blob(deleted_path(file_name)).exists()
+    # The results are left as they are; the filter index hides the removed rows.
+    assert read_results(bucket, exclude_removed=True).index.tolist() == ["keep.png"]
+    assert sorted(read_results(bucket).index) == ["keep.png", "late.png", "low.png"]
+
+
+def test_clean_data_dry_run_changes_nothing(storage_client, bucket):
+    blob_names = write_corpus(bucket)
+
+    clean_data(dry_run=True, storage_client=storage_client)
+
+    assert all(bucket.blob(blob_name).exists() for blob_name in blob_names)
+    assert storage_client.list_blobs(config.BUCKET, prefix=config.DELETED_FILES_PATH) == []
+    assert not bucket.blob(os.path.join(config.OUTPUT_PATH, config.FILTER_INDEX_FILENAME)).exists()
+
+
+class FlakyStorageClient(LocalStorageClient):
+    def __init__(self, root, delete_failures):
+        super().__init__(root)
+        self.delete_failures = delete_failures
+
+    def bucket(self, name):
+        return FlakyBucket(super().bucket(name), delete_failures=self.delete_failures)
+
+
+def test_clean_data_retries_moves_that_failed(storage_client, bucket):
+    blob_names = write_corpus(bucket)
+    keep = f"{config.INPUT_PATH_1}/keep.png"
+
+    # The first delete fails for good, so one removed screenshot stays behind.
+    clean_data(workers=1, storage_client=FlakyStorageClient(storage_client.root, [PermissionDenied("403")]))
+    left_behind = [blob_name for blob_name in blob_names if bucket.blob(blob_name).exists() and blob_name != keep]
+    assert len(left_behind) == 1
+
+    clean_data(workers=1, storage_client=storage_client)
+    assert not bucket.blob(left_behind[0]).exists()
+    assert bucket.blob(deleted_path(os.path.basename(left_behind[0]))).exists()
+    assert [blob_name for blob_name in blob_names if bucket.blob(blob_name).exists()] == [keep]
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from eews_analysis import cli, startup
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    # Replaces the pipeline entry points with recorders; the modules are the ones the handlers import.
+    from eews_analysis import clean_data, process_data, visualize
+
+    calls = []
+    for module, name in [(process_data, "process_all_tweets"), (process_data, "process_all_tweets_batch"),
+                         (process_data, "redrive_failed"), (process_data, "merge_worker_results"), (clean_data, "clean_data"), (visualize, "main")]:
+        monkeypatch.setattr(module, name, lambda *args, _name=name, **kwargs: calls.append((_name, args, kwargs)))
+    return calls
+
+
+@pytest.mark.parametrize("argv, expected", [
+    (["extract"],
+     ("process_all_tweets", (), {"show_progress": False, "preprocess": None, "worker": None, "screen": None})),
+    (["extract", "--progress", "--preprocess"],
+     ("process_all_tweets", (), {"show_progress": True, "preprocess": True, "worker": None, "screen": None})),
+    (["extract", "--cascade"],
+     ("process_all_tweets", (), {"show_progress": False, "preprocess": None, "worker": None, "screen": True})),
+    (["extract", "--batch"], ("process_all_tweets_batch", (), {})),
+    (["extract", "--redrive", "--include-permanent"],
+     ("redrive_failed", (), {"include_permanent": True, "show_progress": False, "preprocess": None})),
+    (["clean", "--dry-run", "--workers", "4"], ("clean_data", (), {"dry_run": True, "workers": 4})),
+    (["visualize", "--force", "--dashboard", "--output-dir", "out"],
+     ("main", (None, True, False, "out", True), {})),
+])
+def test_subcommands_dispatch_to_the_pipeline(calls, argv, expected):
+    assert cli.main(argv) == 0
+    assert calls == [expected]
+
+
+def test_worker_flags(calls, capsys):
+    assert cli.main(["extract", "--worker", "1/3"]) == 0
+    assert calls[-1][2]["worker"] == (1, 3)
+    assert cli.main(["extract", "--merge"]) == 0
+    assert calls[-1][0] == "merge_worker_results"
+
+    for argv in (["extract", "--worker", "3/3"], ["extract", "--worker", "0/2", "--batch"]):
+        with pytest.raises(SystemExit):
+            cli.main(argv)
+    assert "--worker only applies to a normal extraction run" in capsys.readouterr().err
+
+
+def test_a_subcommand_is_required(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main([])
+    assert exit_info.value.code == 2
+    assert "extract" in capsys.readouterr().err
+
+
+def test_unknown_flags_are_rejected():
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(["clean", "--force"])
+
+
+def test_check_startup_passes_for_the_cli(monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    assert startup.check_startup(budget_ms=10000)
+    assert cli.main(["check-startup", "--budget-ms", "10000"]) == 0
+
+
+def test_check_startup_flags_heavy_imports_and_the_budget(monkeypatch, capsys):
+    monkeypatch.chdir(REPO_ROOT)
+    assert not startup.check_startup(budget_ms=10000, modules=("eews_analysis.schema",), commands=())
+    assert "imports heavy modules: pandas, numpy" in capsys.readouterr().out
+
+    assert not startup.check_startup(budget_ms=0, modules=(), commands=(("--help",),))
+    assert "eews --help" in capsys.readouterr().out
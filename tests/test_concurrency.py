@@ -0,0 +1,142 @@
+import threading
+import time
+
+import pytest
+
+from eews_analysis import config
+from eews_analysis.concurrency import AdaptiveRateLimiter
+from eews_analysis.local import FakeCachedContext, FakeModel
+from eews_analysis.process_data import extract_files
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_limiter(clock, rate=4.0, min_rate=0.5, max_rate=8.0, burst=None):
+    return AdaptiveRateLimiter(rate=rate, min_rate=min_rate, max_rate=max_rate, increase_step=0.5,
+                               decrease_factor=0.5, burst=burst, clock=clock, sleep=clock.sleep)
+
+
+def test_throttle_halves_rate_once_per_cooldown():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+
+    limiter.on_throttle()
+    assert limiter.rate == 2.0
+    # 429s from requests already in flight count as one signal.
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.rate == 2.0
+    assert limiter.throttle_count == 1
+
+    clock.now += 1.0 / 2.0
+    limiter.on_throttle()
+    assert limiter.rate == 1.0
+    assert limiter.throttle_count == 2
+
+
+def test_throttle_stops_at_min_rate():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+    for _ in range(10):
+        limiter.on_throttle()
+        clock.now += 10.0
+    assert limiter.rate == limiter.min_rate
+
+
+def test_throttle_drains_tokens():
+    clock = FakeClock()
+    limiter = make_limiter(clock, burst=4)
+    limiter.on_throttle()
+    assert limiter.tokens <= 0
+    limiter.acquire()
+    assert clock.sleeps and clock.sleeps[0] == pytest.approx(1.0 / limiter.rate)
+
+
+def test_success_recovers_about_one_step_per_second():
+    clock = FakeClock()
+    limiter = make_limiter(clock, rate=2.0)
+
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(2.0 + 0.5 / 2.0)
+
+    # One second's worth of successes at ~2 req/s adds back roughly one step.
+    limiter = make_limiter(clock, rate=2.0)
+    for _ in range(2):
+        limiter.on_success()
+    assert 2.4 < limiter.rate < 2.5
+
+
+def test_success_stops_at_max_rate():
+    clock = FakeClock()
+    limiter = make_limiter(clock, rate=7.9)
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.rate == limiter.max_rate
+
+
+def test_acquire_paces_requests_at_rate():
+    clock = FakeClock()
+    limiter = make_limiter(clock, rate=4.0, burst=1)
+    for _ in range(5):
+        limiter.acquire()
+    assert clock.now == pytest.approx(4 * 0.25)
+
+
+class CountingModel(FakeModel):
+    def __init__(self, latency):
+        super().__init__(latency=latency)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._count_lock = threading.Lock()
+
+    def generate_content(self, contents, generation_config=None, safety_settings=None):
+        with self._count_lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return super().generate_content(contents, generation_config, safety_settings)
+        finally:
+            with self._count_lock:
+                self.in_flight -= 1
+
+
+def blob_names(count):
+    return [f"{config.INPUT_PATH_1}/tweet_{i:03d}.png" for i in range(count)]
+
+
+def test_extract_files_bounds_requests_in_flight():
+    model = CountingModel(latency=0.05)
+    limiter = AdaptiveRateLimiter(rate=1000, min_rate=1, max_rate=1000, increase_step=0.5, decrease_factor=0.5)
+
+    results = extract_files(FakeCachedContext(model, []), blob_names(12), limiter=limiter, max_in_flight=3)
+
+    assert len(results) == 12
+    assert model.peak_in_flight == 3
+
+
+def test_extract_files_backs_off_on_quota_errors(monkeypatch):
+    monkeypatch.setattr(config, "MAX_QUOTA_RETRIES", 50)
+    model = FakeModel(latency=0.0, max_requests_per_second=5)
+    limiter = AdaptiveRateLimiter(rate=20, min_rate=1, max_rate=50, increase_step=0.5, decrease_factor=0.5)
+
+    started = time.monotonic()
+    results = extract_files(FakeCachedContext(model, []), blob_names(15), limiter=limiter, max_in_flight=4)
+
+    # Every file still succeeds; the limiter settled below the quota it started above.
+    assert sorted(results) == [f"tweet_{i:03d}.png" for i in range(15)]
+    assert model.throttled_count > 0
+    assert limiter.throttle_count > 0
+    assert limiter.rate < 20
+    assert model.call_count == 15
+    assert time.monotonic() - started < 30
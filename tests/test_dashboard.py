@@ -0,0 +1,46 @@
+import gzip
+import json
+import re
+
+import plotly.express as px
+
+from eews_analysis import config, dashboard
+from eews_analysis.visualize import chart_job, render_charts
+
+
+def figure(title):
+    return px.bar(x=["a", "b"], y=[1, 2], title=title)
+
+
+def test_dashboard_is_one_self_contained_gzip_page(storage_client, bucket):
+    titles = ["Location and Alert Type", "Helpfulness and Reason", "Event One: Sentiment", "Event Two: Sentiment"]
+    tabs = [("Relationships", [chart_job(figure(title), title) for title in titles[:2]]),
+            ("Event One", [chart_job(figure(titles[2]), titles[2])]),
+            ("Event Two", [chart_job(figure(titles[3]), titles[3])]),
+            ("Empty Event", [])]
+    job = dashboard.bundle("analysis_dashboard", tabs)
+
+    assert render_charts([job], bucket, workers=1) == []
+
+    names = [blob.name for blob in storage_client.list_blobs(config.BUCKET, prefix=config.VISUALIZATION_PATH)]
+    assert sorted(names) == [f"{config.VISUALIZATION_PATH}/analysis_dashboard.html.gz",
+                             f"{config.VISUALIZATION_PATH}/{config.CHART_MANIFEST_FILENAME}"]
+    page = gzip.decompress(bucket.blob(names[0]).download_as_string()).decode("utf-8")
+
+    # Every chart is embedded once, each tab gets a button, and the shared template is stored once.
+    for title in titles:
+        assert f'title="{title}"' in page
+    figures = re.findall(r'<script type="application/json" id="figure-\d+">(.*?)</script>', page)
+    assert [json.loads(figure)["layout"]["title"]["text"] for figure in figures] == titles
+    assert page.count("<button") == 3
+    [templates] = re.findall(r'<script type="application/json" id="templates">(.*?)</script>', page)
+    assert len(json.loads(templates)) == 1
+
+    # plotly.js is inlined: nothing is fetched from elsewhere.
+    assert re.search(r"<(script|link|img|iframe)[^>]+(src|href)=", page) is None
+    assert page.count("<script") == len(figures) + 3
+
+
+def test_dashboard_bytes_are_deterministic():
+    job = dashboard.bundle("analysis_dashboard", [("Tab", [chart_job(figure("Chart"), "Chart")])])
+    assert dashboard.render(job[2]) == dashboard.render(job[2])
@@ -0,0 +1,237 @@
+import json
+import os
+
+import pytest
+
+from conftest import add_inputs
+from eews_analysis import config
+from eews_analysis.deadletter import PERMANENT, TRANSIENT, BatchPredictionError, DeadLetterQueue, classify
+from eews_analysis.local import FAKE_RESULT, ResourceExhausted
+from eews_analysis.manifest import DONE, FAILED, InputManifest
+from eews_analysis.process_data import redrive_failed
+from eews_analysis.repair import UnrepairableResponse
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+class InvalidArgument(Exception):
+    pass
+
+
+class NotFound(Exception):
+    pass
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ScriptedContext:
+    # Fails the first `failures[file_name]` requests for a file, then answers.
+
+    def __init__(self, failures=None, error=ServiceUnavailable):
+        self.failures = dict(failures or {})
+        self.error = error
+        self.requests = []
+
+    def generate(self, image, **kwargs):
+        file_name = next(name for name in self.failures if name in str(image)) if self.failures else None
+        self.requests.append(str(image))
+        if file_name and self.failures[file_name] > 0:
+            self.failures[file_name] -= 1
+            raise self.error(f"503 backend unavailable for {file_name}")
+        from types import SimpleNamespace
+        return SimpleNamespace(text=json.dumps(FAKE_RESULT))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fast_limiter(monkeypatch):
+    monkeypatch.setattr(config, "REQUESTS_PER_SECOND", 1000)
+    monkeypatch.setattr(config, "MAX_REQUESTS_PER_SECOND", 1000)
+
+
+@pytest.mark.parametrize("error, category", [
+    (ResourceExhausted("429 Quota exceeded"), TRANSIENT),
+    (ServiceUnavailable("503"), TRANSIENT),
+    (UnrepairableResponse("no JSON object in response"), TRANSIENT),
+    (BatchPredictionError("no prediction in the batch output"), TRANSIENT),
+    (InvalidArgument("400 bad request"), PERMANENT),
+    (NotFound("404 image missing"), PERMANENT),
+    (ValueError("Response was blocked by safety filters"), PERMANENT),
+    (BatchPredictionError("Unable to process input image"), PERMANENT),
+])
+def test_classify(error, category):
+    assert classify(error) == category
+
+
+def test_record_backs_off_exponentially_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(config, "DEAD_LETTER_BACKOFF_SECONDS", 30)
+    monkeypatch.setattr(config, "DEAD_LETTER_MAX_BACKOFF_SECONDS", 100)
+    clock = FakeClock()
+    dead_letters = DeadLetterQueue(clock=clock)
+
+    waits = []
+    for _ in range(4):
+        dead_letters.record("INPUTS_1/a.png", ServiceUnavailable("503"), "x" * 10000)
+        waits.append(dead_letters.entries["INPUTS_1/a.png"]["next_attempt_after"] - clock.now)
+
+    assert waits == [30, 60, 100, 100]
+    entry = dead_letters.entries["INPUTS_1/a.png"]
+    assert entry["attempts"] == 4
+    assert entry["error_class"] == "ServiceUnavailable"
+    assert len(entry["last_response"]) == config.DEAD_LETTER_MAX_TEXT_CHARS
+
+
+def test_due_respects_backoff_category_and_attempt_cap(monkeypatch):
+    monkeypatch.setattr(config, "DEAD_LETTER_MAX_ATTEMPTS", 2)
+    clock = FakeClock()
+    dead_letters = DeadLetterQueue(clock=clock)
+    dead_letters.record("INPUTS_1/transient.png", ServiceUnavailable("503"))
+    dead_letters.record("INPUTS_1/permanent.png", InvalidArgument("400"))
+    dead_letters.record("INPUTS_1/exhausted.png", ServiceUnavailable("503"))
+    dead_letters.record("INPUTS_1/exhausted.png", ServiceUnavailable("503"))
+
+    assert dead_letters.due() == []
+    assert dead_letters.seconds_until_next() == config.DEAD_LETTER_BACKOFF_SECONDS
+
+    clock.now += config.DEAD_LETTER_BACKOFF_SECONDS
+    assert dead_letters.due() == ["INPUTS_1/transient.png"]
+    assert dead_letters.due(include_permanent=True) == ["INPUTS_1/permanent.png", "INPUTS_1/transient.png"]
+    assert dead_letters.counts() == {TRANSIENT: 2, PERMANENT: 1, "exhausted": 1}
+
+
+def test_adopt_prune_and_round_trip(bucket):
+    clock = FakeClock()
+    dead_letters = DeadLetterQueue(clock=clock)
+    dead_letters.record("INPUTS_1/a.png", ServiceUnavailable("503"))
+    dead_letters.adopt(["INPUTS_1/a.png", "INPUTS_1/legacy.png"])
+
+    assert dead_letters.entries["INPUTS_1/a.png"]["attempts"] == 1
+    assert dead_letters.due() == ["INPUTS_1/legacy.png"]
+    assert dead_letters.prune({"INPUTS_1/legacy.png"}) == ["INPUTS_1/a.png"]
+
+    dead_letters.save(bucket)
+    assert DeadLetterQueue.load(bucket).entries == dead_letters.entries
+    assert dead_letters.resolve("INPUTS_1/legacy.png")
+    assert not dead_letters.resolve("INPUTS_1/legacy.png")
+
+
+def dead_letter(storage_client, bucket, clock, errors):
+    # Inputs that failed in an earlier run: FAILED in the manifest, recorded in the queue and due now.
+    add_inputs(bucket, list(errors))
+    manifest = InputManifest()
+    manifest.refresh(storage_client)
+    dead_letters = DeadLetterQueue(clock=clock)
+    for file_name, error in errors.items():
+        blob_name = os.path.join(config.INPUT_PATH_1, file_name)
+        manifest.mark(blob_name, FAILED)
+        dead_letters.record(blob_name, error)
+    manifest.save(bucket)
+    dead_letters.save(bucket)
+    clock.now += config.DEAD_LETTER_BACKOFF_SECONDS
+
+
+def results(bucket):
+    blob = bucket.blob(os.path.join(config.OUTPUT_PATH, config.RESULTS_FILENAME))
+    return sorted(json.loads(blob.download_as_string())) if blob.exists() else []
+
+
+def redrive(storage_client, clock, context, include_permanent=False):
+    redrive_failed(context, include_permanent=include_permanent, storage_client=storage_client,
+                   sleep=clock.sleep, clock=clock)
+
+
+def test_successful_redrive_clears_the_queue(storage_client, bucket):
+    clock = FakeClock()
+    dead_letter(storage_client, bucket, clock, {"a.png": ServiceUnavailable("503"), "b.png": ServiceUnavailable("503")})
+
+    redrive(storage_client, clock, ScriptedContext())
+
+    assert results(bucket) == ["a.png", "b.png"]
+    assert DeadLetterQueue.load(bucket).entries == {}
+    assert InputManifest.load(bucket).blob_names(DONE) == ["INPUTS_1/a.png", "INPUTS_1/b.png"]
+    assert clock.sleeps == []
+
+
+def test_redrive_skips_permanent_failures_unless_asked(storage_client, bucket):
+    clock = FakeClock()
+    dead_letter(storage_client, bucket, clock, {"transient.png": ServiceUnavailable("503"),
+                                                "permanent.png": InvalidArgument("400")})
+
+    context = ScriptedContext()
+    redrive(storage_client, clock, context)
+    assert len(context.requests) == 1
+    assert results(bucket) == ["transient.png"]
+    assert list(DeadLetterQueue.load(bucket).entries) == ["INPUTS_1/permanent.png"]
+
+    redrive(storage_client, clock, context, include_permanent=True)
+    assert results(bucket) == ["permanent.png", "transient.png"]
+    assert DeadLetterQueue.load(bucket).entries == {}
+
+
+def test_redrive_waits_out_the_backoff_and_retries(storage_client, bucket):
+    clock = FakeClock()
+    dead_letter(storage_client, bucket, clock, {"a.png": ServiceUnavailable("503")})
+
+    redrive(storage_client, clock, ScriptedContext({"a.png": 1}))
+
+    # The retry fails again (attempt 2, so 2 x the base backoff), then succeeds after the wait.
+    assert clock.sleeps == [2 * config.DEAD_LETTER_BACKOFF_SECONDS]
+    assert results(bucket) == ["a.png"]
+    assert DeadLetterQueue.load(bucket).entries == {}
+
+
+def test_redrive_stops_at_the_attempt_cap(storage_client, bucket, monkeypatch):
+    monkeypatch.setattr(config, "DEAD_LETTER_MAX_ATTEMPTS", 4)
+    clock = FakeClock()
+    dead_letter(storage_client, bucket, clock, {"a.png": ServiceUnavailable("503")})
+
+    context = ScriptedContext({"a.png": 100})
+    redrive(storage_client, clock, context)
+
+    base = config.DEAD_LETTER_BACKOFF_SECONDS
+    assert clock.sleeps == [2 * base, 4 * base]
+    assert len(context.requests) == 3
+    entry = DeadLetterQueue.load(bucket).entries["INPUTS_1/a.png"]
+    assert entry["attempts"] == 4
+    assert InputManifest.load(bucket).entries["INPUTS_1/a.png"]["status"] == FAILED
+
+
+def test_redrive_prunes_files_no_longer_in_the_inputs(storage_client, bucket):
+    clock = FakeClock()
+    dead_letter(storage_client, bucket, clock, {"a.png": ServiceUnavailable("503")})
+    dead_letters = DeadLetterQueue.load(bucket, clock=clock)
+    dead_letters.record("INPUTS_1/deleted.png", ServiceUnavailable("503"))
+    dead_letters.save(bucket)
+
+    context = ScriptedContext()
+    redrive(storage_client, clock, context)
+
+    assert len(context.requests) == 1
+    assert DeadLetterQueue.load(bucket).entries == {}
+
+
+def test_redrive_adopts_failures_that_predate_the_queue(storage_client, bucket):
+    add_inputs(bucket, ["old.png"])
+    manifest = InputManifest()
+    manifest.refresh(storage_client)
+    manifest.mark("INPUTS_1/old.png", FAILED)
+    manifest.save(bucket)
+
+    redrive(storage_client, FakeClock(), ScriptedContext())
+
+    assert results(bucket) == ["old.png"]
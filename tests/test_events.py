@@ -0,0 +1,86 @@
+import warnings
+
+import pandas as pd
+
+from eews_analysis.events import PostTimeIndex, detect_events, event_windows
+
+
+def alerts(start, count, magnitude, minutes_apart=1):
+    times = pd.date_range(start, periods=count, freq=f"{minutes_apart}min")
+    return [{"alert_time": f"{time:%Y-%m-%dT%H:%M}", "magnitude_on_alert_screenshot": str(magnitude),
+             "post_datetime": f"{time:%Y-%m-%dT%H:%M}"} for time in times]
+
+
+def frame(records):
+    return pd.DataFrame(records, index=[f"{i}.png" for i in range(len(records))])
+
+
+def test_time_gaps_and_magnitudes_split_events():
+    df = frame(
+        alerts("2025-04-23T12:49", 5, 6.2)
+        + alerts("2025-04-23T12:52", 4, 4.4)     # same span, different quake
+        + alerts("2025-04-23T14:00", 3, 6.1)     # over an hour after the first: a new event
+        + alerts("2025-05-01T09:00", 1, 5.0)     # too few alerts
+    )
+
+    events = detect_events(df, gap_minutes=60, tolerance=0.5, min_alerts=2)
+
+    assert events["alerts"].tolist() == [5, 4, 3]
+    assert events["magnitude"].tolist() == [6.2, 4.4, 6.1]
+    assert events["name"].tolist() == ["event_2025_04_23_1249_m6_2", "event_2025_04_23_1252_m4_4",
+                                       "event_2025_04_23_1400_m6_1"]
+
+
+def test_magnitudes_within_tolerance_stay_one_event():
+    df = frame(alerts("2025-04-23T12:49", 3, 6.0) + alerts("2025-04-23T12:50", 3, 6.3))
+    events = detect_events(df, gap_minutes=60, tolerance=0.5, min_alerts=2)
+    assert events["alerts"].tolist() == [6]
+    assert events["start"].tolist() == [pd.Timestamp("2025-04-23T12:49")]
+    assert events["end"].tolist() == [pd.Timestamp("2025-04-23T12:52")]
+
+
+def test_unparseable_timestamps_are_ignored():
+    df = frame(alerts("2025-04-23T12:49", 3, 6.2) + [
+        {"alert_time": "UNKNOWN", "magnitude_on_alert_screenshot": "6.2", "post_datetime": "yesterday"},
+        {"alert_time": "2025-04-23T12:50", "magnitude_on_alert_screenshot": "UNKNOWN", "post_datetime": "UNKNOWN"},
+    ])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        events = detect_events(df, min_alerts=2)
+        index = PostTimeIndex(df)
+
+    assert events["alerts"].tolist() == [3]
+    assert len(index.positions) == 3
+
+
+def test_iso_variants_parse():
+    df = frame([{"alert_time": value, "magnitude_on_alert_screenshot": "5.0", "post_datetime": value}
+                for value in ("2025-04-23T12:49", "2025-04-23 12:50:30", "2025-04-23")])
+    assert len(PostTimeIndex(df).positions) == 3
+    assert detect_events(df, gap_minutes=24 * 60, min_alerts=1)["alerts"].tolist() == [3]
+
+
+def test_no_anchored_records_give_no_events():
+    df = frame([{"alert_time": "UNKNOWN", "magnitude_on_alert_screenshot": "5.0", "post_datetime": "2025-04-23"}])
+    assert detect_events(df).empty
+
+
+def test_window_includes_both_edges():
+    posts = ["2025-04-23T11:59", "2025-04-23T12:00", "2025-04-23T13:00", "2025-04-23T14:00", "2025-04-23T14:01"]
+    df = pd.DataFrame({"post_datetime": posts}, index=list("abcde"))
+    index = PostTimeIndex(df)
+    assert df.index[index.window("2025-04-23T12:00", "2025-04-23T14:00")].tolist() == ["b", "c", "d"]
+
+
+def test_event_windows_count_posts_after_the_last_alert():
+    df = frame(alerts("2025-04-23T12:49", 3, 6.2) + [
+        {"alert_time": "UNKNOWN", "magnitude_on_alert_screenshot": "UNKNOWN", "post_datetime": value}
+        for value in ("2025-04-23T12:48", "2025-04-23T13:51", "2025-04-23T13:52")
+    ])
+    events = detect_events(df, min_alerts=2)
+
+    [(event, positions)] = list(event_windows(df, events, post_window_hours=1))
+
+    # The window runs from the first alert to an hour after the last one (12:51).
+    assert sorted(df.index[positions]) == ["0.png", "1.png", "2.png", "4.png"]
+    assert events["posts"].tolist() == [4]
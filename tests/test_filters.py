@@ -0,0 +1,25 @@
+import warnings
+
+import pandas as pd
+
+from eews_analysis.filters import evaluate
+
+RULES = [
+    {"name": "magnitude", "kind": "range", "column": "magnitude_on_alert_screenshot", "min": 4.5, "max": 6.2},
+    {"name": "post_date", "kind": "date_window", "column": "post_datetime", "windows": [("2025-04-01", "2025-06-01")]},
+    {"name": "alert_source", "kind": "allow", "column": "alert_source", "values": ["AEA"]},
+]
+
+
+def test_evaluate_rules_and_missing_values():
+    df = pd.DataFrame({
+        "magnitude_on_alert_screenshot": ["5.3", "4.5", "UNKNOWN", "6.2", "7.0"],
+        "post_datetime": ["UNKNOWN", "2025-04-23T12:59", "2025-04-23 13:10:05", "2025-07-01T08:00", "2025-05-02"],
+        "alert_source": ["AEA", "UNKNOWN", "EQN", "AEA", "AEA"],
+    }, index=["a", "b", "c", "d", "e"])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        result = evaluate(df, RULES)
+
+    assert list(result.kept) == ["a"]
+    assert result.removed_by() == {"b": ["magnitude"], "c": ["alert_source"], "d": ["post_date"], "e": ["magnitude"]}
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from eews_analysis.locations import LocationNormalizer, edit_distance, fold
+
+# The hand-written replacement table visualize used before the gazetteer.
+REPLACEMENTS = {
+    "Near Antalya": "Antalya", "Mamak": "Ankara", "Antalya, Mugla, Izmir": "Izmir",
+    "Izmir karsiyaka": "Izmir", "Izmir guzelbache": "Izmir", "west of Istanbul": "Istanbul",
+    "Near Istanbul": "Istanbul", "Istanbul, Turkieh": "Istanbul", "Silivri, Istanbul": "Silivri",
+    "Silivri, Marmara": "Silivri", "near Silivri": "Silivri", "mugla, turkey": "Mugla",
+    "mugla fethiye": "Mugla", "eastern mediterranean sea": "eastern mediterranean",
+    "Near the coast of Turkey": "Edge of the marked area", "Turkey": "Edge of the marked area",
+}
+
+
+@pytest.fixture
+def normalizer(tmp_path):
+    return LocationNormalizer(path=str(tmp_path / "locations.json"))
+
+
+@pytest.mark.parametrize("raw, label", sorted(REPLACEMENTS.items()))
+def test_old_replacement_table(normalizer, raw, label):
+    assert normalizer.match(raw) == label
+
+
+@pytest.mark.parametrize("raw, label", [
+    ("Istanbl", "Istanbul"), ("Izmirr", "Izmir"), ("Ankra", "Ankara"), ("İzmir", "Izmir"), ("Kadıköy", "Istanbul"),
+])
+def test_fuzzy_and_diacritic_matches(normalizer, raw, label):
+    assert normalizer.match(raw) == label
+
+
+def test_fuzzy_matches_stay_within_max_edit_ratio(tmp_path):
+    strict = LocationNormalizer(path=str(tmp_path / "strict.json"), max_edit_ratio=0.1)
+    assert strict.match("Istanbl") is None
+    assert strict.match("Istanbul") == "Istanbul"
+
+    normalizer = LocationNormalizer(path=str(tmp_path / "locations.json"))
+    for raw in ("Istanbl", "Izmirr", "Ankra", "Bursaa"):
+        name = fold(normalizer.match(raw))
+        assert edit_distance(fold(raw), name) <= int(len(name) * normalizer.max_edit_ratio)
+
+
+@pytest.mark.parametrize("raw", ["Marmara", "Aegean region", "Londra", "Qwerty"])
+def test_regions_and_unknown_places_stay_unmatched(normalizer, raw):
+    assert normalizer.match(raw) is None
+
+
+def test_normalize_series_keeps_missing_rows(normalizer):
+    series = pd.Series(["Izmir karsiyaka", np.nan, "UNKNOWN", None, "Marmara", "Izmir karsiyaka"],
+                       index=list("abcdef"), name="post_location")
+
+    normalized = normalizer.normalize_series(series)
+
+    assert normalized.index.tolist() == list("abcdef")
+    assert normalized.name == "post_location"
+    assert normalized[["a", "c", "e", "f"]].tolist() == ["Izmir", "UNKNOWN", "Marmara", "Izmir"]
+    assert normalized[["b", "d"]].isna().all()
+    assert normalizer.unmatched == {"Marmara": 1}
+
+
+def test_normalize_returns_a_new_frame(normalizer):
+    df = pd.DataFrame({"post_location": ["near Silivri"], "user_approximate_location_on_alert": ["Mamak"]})
+    normalized = normalizer.normalize(df)
+    assert normalized.iloc[0].tolist() == ["Silivri", "Ankara"]
+    assert df.iloc[0].tolist() == ["near Silivri", "Mamak"]
+
+
+def test_memo_is_reused_until_the_settings_change(tmp_path):
+    path = str(tmp_path / "locations.json")
+    first = LocationNormalizer(path=path).load()
+    first.normalize_series(pd.Series(["Izmir karsiyaka", "Mamak"]))
+    first.save()
+
+    second = LocationNormalizer(path=path).load()
+    second.normalize_series(pd.Series(["Izmir karsiyaka", "Mamak"]))
+    assert second.memo_hits == 2
+
+    changed = LocationNormalizer(path=path, aliases={"Mamak": "Mamak"}).load()
+    assert changed.memo == {}
+    assert changed.normalize_series(pd.Series(["Mamak"])).tolist() == ["Mamak"]
@@ -0,0 +1,91 @@
+import os
+
+from conftest import add_inputs
+from eews_analysis import config
+from eews_analysis.manifest import DONE, FAILED, PENDING, InputManifest
+
+
+def test_refresh_adds_new_inputs_as_pending(storage_client, bucket):
+    add_inputs(bucket, ["a.png", "b.PNG"])
+    add_inputs(bucket, ["c.png"], folder=config.INPUT_PATH_2)
+    bucket.blob(os.path.join(config.INPUT_PATH_1, "notes.txt")).upload_from_string("not an image")
+
+    manifest = InputManifest()
+    assert manifest.refresh(storage_client) == (3, 0, 0)
+
+    assert manifest.blob_names(PENDING) == ["INPUTS_1/a.png", "INPUTS_1/b.PNG", "INPUTS_2/c.png"]
+    entry = manifest.entries["INPUTS_1/a.png"]
+    blob = bucket.blob("INPUTS_1/a.png")
+    assert entry == {"status": PENDING, "generation": blob.generation, "size": 32, "md5": blob.md5_hash}
+
+
+def test_refresh_diffs_against_the_previous_listing(storage_client, bucket):
+    add_inputs(bucket, ["same.png", "regenerated.png", "rewritten.png", "gone.png"])
+    manifest = InputManifest()
+    manifest.refresh(storage_client)
+    for blob_name in manifest.blob_names(PENDING):
+        manifest.mark(blob_name, DONE)
+
+    # A new generation of the object, and new content under the old generation.
+    regenerated = bucket.blob("INPUTS_1/regenerated.png")
+    os.utime(regenerated.path, ns=(regenerated.generation + 1, regenerated.generation + 1))
+    rewritten = bucket.blob("INPUTS_1/rewritten.png")
+    generation = rewritten.generation
+    rewritten.upload_from_string(b"new content")
+    os.utime(rewritten.path, ns=(generation, generation))
+    bucket.blob("INPUTS_1/gone.png").delete()
+    add_inputs(bucket, ["new.png"])
+
+    assert manifest.refresh(storage_client) == (1, 2, 1)
+
+    assert manifest.blob_names(DONE) == ["INPUTS_1/same.png"]
+    assert manifest.blob_names(PENDING) == ["INPUTS_1/new.png", "INPUTS_1/regenerated.png", "INPUTS_1/rewritten.png"]
+    assert manifest.entries["INPUTS_1/rewritten.png"]["changed"] is True
+    assert manifest.entries["INPUTS_1/rewritten.png"]["size"] == len(b"new content")
+    assert "changed" not in manifest.entries["INPUTS_1/new.png"]
+    assert "INPUTS_1/gone.png" not in manifest.entries
+
+    # Nothing moved since, so a second refresh is a no-op.
+    assert manifest.refresh(storage_client) == (0, 0, 0)
+
+
+def test_reconcile_skips_overwritten_inputs(storage_client, bucket):
+    add_inputs(bucket, ["a.png", "b.png", "c.png"])
+    manifest = InputManifest()
+    manifest.refresh(storage_client)
+    manifest.entries["INPUTS_1/b.png"]["changed"] = True
+
+    manifest.reconcile({"a.png", "b.png"})
+
+    assert manifest.counts() == {PENDING: 2, DONE: 1, FAILED: 0}
+    manifest.mark("INPUTS_1/b.png", DONE)
+    assert "changed" not in manifest.entries["INPUTS_1/b.png"]
+
+
+def test_save_and_load_round_trip(storage_client, bucket):
+    assert InputManifest.load(bucket).entries == {}
+
+    add_inputs(bucket, ["a.png", "b.png"])
+    manifest = InputManifest()
+    manifest.refresh(storage_client)
+    manifest.mark("INPUTS_1/b.png", FAILED)
+    manifest.save(bucket)
+
+    loaded = InputManifest.load(bucket)
+    assert loaded.entries == manifest.entries
+    assert loaded.blob_names(PENDING, FAILED) == ["INPUTS_1/a.png", "INPUTS_1/b.png"]
+
+
+def test_locations_prefer_the_first_input_folder(storage_client, bucket):
+    add_inputs(bucket, ["both.png", "one.png"])
+    add_inputs(bucket, ["both.png", "two.png"], folder=config.INPUT_PATH_2)
+    manifest = InputManifest()
+    manifest.refresh(storage_client)
+
+    assert manifest.locations() == {
+        "both.png": "INPUTS_1/both.png",
+        "one.png": "INPUTS_1/one.png",
+        "two.png": "INPUTS_2/two.png",
+    }
+    manifest.remove("INPUTS_1/both.png")
+    assert manifest.locations()["both.png"] == "INPUTS_2/both.png"
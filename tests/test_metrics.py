@@ -0,0 +1,75 @@
+import json
+import os
+
+from eews_analysis.metrics import Metrics, instrument_storage
+
+
+class ListingClient:
+    def __init__(self, names):
+        self.names = names
+        self.yielded = 0
+
+    def list_blobs(self, bucket_name, prefix="", fields=None):
+        for name in self.names:
+            self.yielded += 1
+            yield name
+
+
+def counter(metrics, name):
+    return sum(value for (counter_name, _), value in metrics.counters.items() if counter_name == name)
+
+
+def test_list_blobs_counts_while_yielding():
+    metrics = Metrics("test")
+    client = ListingClient([f"blob-{i}" for i in range(5)])
+    listing = instrument_storage(client, metrics).list_blobs("bucket")
+
+    assert next(listing) == "blob-0"
+    # Nothing is listed ahead of the caller.
+    assert client.yielded == 1
+    assert list(listing) == [f"blob-{i}" for i in range(1, 5)]
+
+    assert counter(metrics, "storage_objects_listed_total") == 5
+    assert metrics.stages["list"][1] == 1
+
+
+def test_abandoned_listing_counts_what_was_seen():
+    metrics = Metrics("test")
+    listing = instrument_storage(ListingClient(["a", "b", "c"]), metrics).list_blobs("bucket")
+    for name in listing:
+        if name == "b":
+            break
+    listing.close()
+
+    assert counter(metrics, "storage_objects_listed_total") == 2
+
+
+def test_runs_in_the_same_second_write_separate_files(tmp_path):
+    first = Metrics("process_data")
+    second = Metrics("process_data")
+    second.started = first.started
+    first.inc("files_processed_total", 1)
+    second.inc("files_processed_total", 2)
+
+    paths = {first.write(str(tmp_path)), second.write(str(tmp_path))}
+
+    assert len(paths) == 2
+    values = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            values.append(json.load(f)["counters"][0]["value"])
+    assert sorted(values) == [1, 2]
+    assert sorted(os.listdir(tmp_path))[-1] == "process_data.prom"
+
+
+def test_storage_traffic_is_counted(storage_client):
+    metrics = Metrics("test")
+    bucket = instrument_storage(storage_client, metrics).bucket("bucket")
+    bucket.blob("folder/a.txt").upload_from_string("hello")
+    assert bucket.blob("folder/a.txt").download_as_string() == b"hello"
+    assert [blob.name for blob in instrument_storage(storage_client, metrics).list_blobs("bucket", prefix="folder/")] == ["folder/a.txt"]
+
+    assert counter(metrics, "storage_bytes_uploaded_total") == 5
+    assert counter(metrics, "storage_bytes_downloaded_total") == 5
+    assert counter(metrics, "storage_objects_listed_total") == 1
+    assert set(metrics.stages) == {"upload", "download", "list"}
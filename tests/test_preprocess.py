@@ -0,0 +1,116 @@
+import io
+import os
+from types import SimpleNamespace
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image
+
+from eews_analysis import config, process_data
+from eews_analysis.preprocess import ImagePreprocessor, estimate_image_tokens, preprocess_image, preprocess_settings
+
+
+def screenshot(width=600, height=900, border=40):
+    # A flat border around a noisy "post" so the trim has something to remove.
+    image = Image.new("RGB", (width, height), (255, 255, 255))
+    content = Image.frombytes("RGB", (width - 2 * border, height - 2 * border),
+                              os.urandom((width - 2 * border) * (height - 2 * border) * 3))
+    image.paste(content, (border, border))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class RecordingPart:
+    @staticmethod
+    def from_uri(uri, mime_type):
+        return SimpleNamespace(uri=uri, mime_type=mime_type)
+
+    @staticmethod
+    def from_data(data, mime_type):
+        return SimpleNamespace(data=data, mime_type=mime_type)
+
+
+@pytest.fixture(autouse=True)
+def recording_part(monkeypatch):
+    monkeypatch.setattr(process_data, "Part", RecordingPart)
+
+
+def upload(bucket, file_name, data):
+    blob_name = os.path.join(config.INPUT_PATH_1, file_name)
+    bucket.blob(blob_name).upload_from_string(data, content_type="image/png")
+    return blob_name
+
+
+def test_estimate_image_tokens():
+    assert estimate_image_tokens(300, 300) == 258
+    assert estimate_image_tokens(768, 768) == 258
+    assert estimate_image_tokens(1080, 2400) == 2 * 4 * 258
+
+
+def test_preprocessing_is_deterministic():
+    data = screenshot()
+    settings = preprocess_settings()
+    first, first_stats = preprocess_image(data, settings)
+    second, second_stats = preprocess_image(data, settings)
+    assert first == second
+    assert first_stats == second_stats
+    assert first_stats["size"] == "520x820"
+
+
+def test_tall_screenshots_are_tiled_and_capped(monkeypatch):
+    settings = dict(preprocess_settings(), max_long_edge=500, tile_aspect=2.0)
+    tiles, stats = preprocess_image(screenshot(400, 2080, border=0), settings)
+    assert stats["tiles"] == len(tiles) == 3
+    for tile in tiles:
+        with Image.open(io.BytesIO(tile)) as image:
+            assert max(image.size) <= 500
+
+
+def test_same_image_reuses_the_cached_output(tmp_path, bucket):
+    data = screenshot()
+    first_blob = upload(bucket, "a.png", data)
+    second_blob = upload(bucket, "copy_of_a.png", data)
+    preprocessor = ImagePreprocessor(bucket, directory=str(tmp_path / "images"))
+
+    first = preprocessor.load(first_blob)
+    second = preprocessor.load(second_blob)
+
+    assert first == second
+    assert [row["cached"] for row in preprocessor.report] == [False, True]
+    assert preprocessor.totals()["bytes"] < preprocessor.totals()["original_bytes"]
+
+
+def test_changed_settings_miss_the_cache(tmp_path, bucket):
+    blob_name = upload(bucket, "a.png", screenshot())
+    ImagePreprocessor(bucket, directory=str(tmp_path / "images")).load(blob_name)
+
+    settings = dict(preprocess_settings(), quality=50)
+    preprocessor = ImagePreprocessor(bucket, directory=str(tmp_path / "images"), settings=settings)
+    preprocessor.load(blob_name)
+    assert preprocessor.report[0]["cached"] is False
+
+
+def test_unreadable_image_falls_back_to_the_original(tmp_path, bucket):
+    blob_name = upload(bucket, "broken.png", b"not a png")
+    preprocessor = ImagePreprocessor(bucket, directory=str(tmp_path / "images"))
+
+    image = process_data.build_image(blob_name, preprocessor=preprocessor)
+
+    assert image.uri == f"gs://{config.BUCKET}/{blob_name}"
+    assert image.mime_type == "image/png"
+    assert preprocessor.failures == ["broken.png"]
+    assert preprocessor.totals()["failed"] == 1
+    assert os.listdir(tmp_path / "images") == []
+
+
+def test_build_image_sends_tiles_with_a_caption(tmp_path, bucket, monkeypatch):
+    monkeypatch.setattr(config, "PREPROCESS_TILE_ASPECT", 2.0)
+    blob_name = upload(bucket, "tall.png", screenshot(400, 2080, border=0))
+    preprocessor = ImagePreprocessor(bucket, directory=str(tmp_path / "images"))
+
+    parts = process_data.build_image(blob_name, preprocessor=preprocessor)
+
+    assert parts[0] == "The screenshot is split into 3 overlapping parts, top to bottom."
+    assert [part.mime_type for part in parts[1:]] == ["image/webp"] * 3
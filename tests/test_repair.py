@@ -0,0 +1,160 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from eews_analysis import config
+from eews_analysis.concurrency import AdaptiveRateLimiter
+from eews_analysis.process_data import extract_file
+from eews_analysis.repair import RepairStats, UnrepairableResponse, parse_response, repair_response
+from eews_analysis.schema import FIELDS, UNKNOWN
+
+
+def valid_record(**overrides):
+    record = {key: UNKNOWN for key in FIELDS}
+    record.update(username="@user", alert_type="TAKE_ACTION_ALERT", alert_info_recall=["SAFETY_ADVICE"],
+                  magnitude_on_alert_screenshot="5.3", shaking_intensity_mmi="5")
+    record.update(overrides)
+    return record
+
+
+def kinds(repairs):
+    return sorted(kind for kind, _ in repairs)
+
+
+def test_valid_response_needs_no_repair():
+    record, repairs = repair_response("```json\n" + json.dumps(valid_record()) + "\n```")
+    assert record == valid_record()
+    assert repairs == []
+
+
+def test_code_fences_and_surrounding_text_are_stripped():
+    text = "Here is the extraction:\n```json\n" + json.dumps(valid_record()) + "\n```\nLet me know!"
+    record, repairs = repair_response(text)
+    assert record == valid_record()
+    assert kinds(repairs) == ["stray_fence", "surrounding_text"]
+
+
+def test_smart_quotes_are_straightened():
+    text = json.dumps(valid_record()).replace('"', "“", 1)
+    record, repairs = repair_response(text)
+    assert record == valid_record()
+    assert kinds(repairs) == ["smart_quotes"]
+
+
+def test_trailing_commas_are_removed():
+    text = json.dumps(valid_record())[:-1] + ",}"
+    text = text.replace('["SAFETY_ADVICE"]', '["SAFETY_ADVICE",]')
+    record, repairs = repair_response(text)
+    assert record == valid_record()
+    assert kinds(repairs) == ["trailing_comma"]
+
+
+def test_smart_quotes_and_trailing_commas_together():
+    text = json.dumps(valid_record()).replace('"', "”", 1)[:-1] + ",}"
+    record, repairs = repair_response(text)
+    assert record == valid_record()
+    assert kinds(repairs) == ["smart_quotes_and_trailing_comma"]
+
+
+def test_enum_values_are_repaired_or_dropped():
+    text = json.dumps(valid_record(
+        alert_type="take action alert",
+        alert_source="Google",
+        felt_shaking=None,
+        alert_info_recall=["safety-advice", "SOMETHING_ELSE"],
+        helpfulness=["HELPFUL"],
+    ))
+    record, repairs = repair_response(text)
+
+    assert record["alert_type"] == "TAKE_ACTION_ALERT"
+    assert record["alert_source"] == UNKNOWN
+    assert record["felt_shaking"] == UNKNOWN
+    assert record["alert_info_recall"] == ["SAFETY_ADVICE"]
+    assert record["helpfulness"] == "HELPFUL"
+    assert sorted(repairs) == sorted([
+        ("enum_case", "alert_type"),
+        ("enum_out_of_range", "alert_source"),
+        ("null_value", "felt_shaking"),
+        ("enum_case", "alert_info_recall"),
+        ("enum_out_of_range", "alert_info_recall"),
+        ("unexpected_list", "helpfulness"),
+    ])
+
+
+def test_numbers_and_keys_are_repaired():
+    record = valid_record(magnitude_on_alert_screenshot="M 5.3", shaking_intensity_mmi="14", extra="x")
+    del record["username"]
+    repaired, repairs = repair_response(json.dumps(record))
+
+    assert repaired["magnitude_on_alert_screenshot"] == "5.3"
+    assert repaired["shaking_intensity_mmi"] == UNKNOWN
+    assert repaired["username"] == UNKNOWN
+    assert "extra" not in repaired
+    assert sorted(repairs) == sorted([
+        ("number_format", "magnitude_on_alert_screenshot"),
+        ("number_out_of_range", "shaking_intensity_mmi"),
+        ("missing_key", "username"),
+        ("unexpected_key", "extra"),
+    ])
+
+
+@pytest.mark.parametrize("text", ["", "I can't read this screenshot.", "{not json at all}", "[1, 2]"])
+def test_unrepairable_responses_raise(text):
+    stats = RepairStats()
+    with pytest.raises(UnrepairableResponse):
+        parse_response(text, stats)
+    assert stats.unrepairable == 1
+
+
+def test_stats_count_valid_and_repaired():
+    stats = RepairStats()
+    parse_response(json.dumps(valid_record()), stats)
+    parse_response(json.dumps(valid_record())[:-1] + ",}", stats)
+
+    summary = stats.summary()
+    assert summary["valid"] == 1
+    assert summary["repaired"] == 1
+    assert summary["repair_kinds"] == {"trailing_comma": 1}
+
+
+class ScriptedContext:
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.calls = 0
+
+    def generate(self, image, **kwargs):
+        text = self.texts[min(self.calls, len(self.texts) - 1)]
+        self.calls += 1
+        return SimpleNamespace(text=text)
+
+
+def fast_limiter():
+    return AdaptiveRateLimiter(rate=1000, min_rate=1, max_rate=1000, increase_step=1, decrease_factor=0.5)
+
+
+def test_unrepairable_response_is_requested_again():
+    context = ScriptedContext(["Sorry, no JSON here.", json.dumps(valid_record())])
+    stats = RepairStats()
+
+    result = extract_file(context, "INPUTS_1/a.png", fast_limiter(), repair_stats=stats)
+
+    assert result == valid_record()
+    assert context.calls == 2
+    assert stats.rerequested == 1
+    assert stats.unrepairable == 1
+
+
+def test_rerequests_are_bounded():
+    context = ScriptedContext(["Sorry, no JSON here."])
+    stats = RepairStats()
+
+    assert extract_file(context, "INPUTS_1/a.png", fast_limiter(), repair_stats=stats) is None
+    assert context.calls == config.MAX_REREQUESTS + 1
+    assert stats.rerequested == config.MAX_REREQUESTS
+
+
+def test_repairable_response_is_not_requested_again():
+    context = ScriptedContext(["Here you go: " + json.dumps(valid_record(alert_type="take action alert"))])
+    assert extract_file(context, "INPUTS_1/a.png", fast_limiter())["alert_type"] == "TAKE_ACTION_ALERT"
+    assert context.calls == 1
@@ -0,0 +1,74 @@
+import os
+
+from conftest import add_inputs
+from eews_analysis import response_cache
+from eews_analysis.local import FakeCachedContext, FakeModel
+from eews_analysis.process_data import build_response_cache, extract_files
+from eews_analysis.response_cache import ResponseCache
+
+
+def make_cache(tmp_path, **kwargs):
+    options = dict(directory=str(tmp_path / "responses"), prompt_hash="prompt", model_name="model",
+                   generation_config={"temperature": 0})
+    options.update(kwargs)
+    return ResponseCache(**options)
+
+
+def set_mtime(cache, image_hash, seconds):
+    os.utime(cache._path(cache.key(image_hash)), (seconds, seconds))
+
+
+def test_renamed_copy_of_an_image_is_a_hit(bucket):
+    original, = add_inputs(bucket, ["a.png"])
+    renamed = "INPUTS_2/renamed.png"
+    bucket.copy_blob(bucket.blob(original), bucket, renamed)
+    model = FakeModel(latency=0)
+    context = FakeCachedContext(model, [])
+    cache = build_response_cache()
+
+    first = extract_files(context, [original], cache=cache, image_hashes={original: bucket.blob(original).md5_hash})
+    second = extract_files(context, [renamed], cache=cache, image_hashes={renamed: bucket.blob(renamed).md5_hash})
+
+    assert model.call_count == 1
+    assert second == {"renamed.png": first["a.png"]}
+    assert cache.stats()["hits"] == 1
+
+
+def test_prompt_model_or_config_change_invalidates_keys(tmp_path):
+    make_cache(tmp_path).put("md5", {"answer": 1})
+
+    assert make_cache(tmp_path).get("md5") == {"answer": 1}
+    assert make_cache(tmp_path, prompt_hash="new prompt").get("md5") is None
+    assert make_cache(tmp_path, model_name="new model").get("md5") is None
+    assert make_cache(tmp_path, generation_config={"temperature": 1}).get("md5") is None
+    assert make_cache(tmp_path).get("other md5") is None
+
+
+def test_lru_eviction_under_max_bytes(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=110)
+    for index, image_hash in enumerate(["a", "b", "c"]):
+        cache.put(image_hash, {"text": "x" * 20})
+        set_mtime(cache, image_hash, 1000 + index)
+    assert cache.evictions == 0
+
+    # Reading "a" makes it the most recently used, so "b" goes first.
+    assert cache.get("a") is not None
+    cache.put("d", {"text": "x" * 20})
+
+    assert cache.evictions == 1
+    assert cache.get("b") is None
+    assert all(cache.get(image_hash) is not None for image_hash in ["a", "c", "d"])
+    assert cache.total_bytes <= 110
+    assert make_cache(tmp_path).total_bytes == cache.total_bytes
+
+
+def test_failed_lru_touch_is_still_a_hit(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    cache.put("md5", {"answer": 1})
+
+    def utime(path, *args):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(response_cache.os, "utime", utime)
+    assert cache.get("md5") == {"answer": 1}
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,19 @@
+import warnings
+
+from eews_analysis.local import FAKE_RESULT
+from eews_analysis.results_store import POST_TIME_COLUMN, date_filter, read_results, write_results
+
+
+def test_date_filter_pushdown_sees_every_iso_variant(bucket):
+    records = {
+        "a.png": dict(FAKE_RESULT, post_datetime="UNKNOWN"),
+        "b.png": dict(FAKE_RESULT, post_datetime="2025-04-23T12:59"),
+        "c.png": dict(FAKE_RESULT, post_datetime="2025-04-23 13:10:05"),
+        "d.png": dict(FAKE_RESULT, post_datetime="2025-07-01T08:00"),
+    }
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        write_results(bucket, records)
+
+    df = read_results(bucket, columns=["post_datetime"], filters=date_filter(POST_TIME_COLUMN, "2025-04-01", "2025-06-01"))
+    assert sorted(df.index) == ["b.png", "c.png"]
@@ -0,0 +1,16 @@
+import warnings
+
+import pandas as pd
+
+from eews_analysis.schema import apply_schema
+
+
+def test_apply_schema_parses_iso_datetimes_without_warnings():
+    df = pd.DataFrame({"post_datetime": ["UNKNOWN", "2025-04-23T12:59", "2025-04-23 12:59:30", "2025-04-24", None]})
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        typed = apply_schema(df)
+    assert typed["post_datetime"].tolist()[1:4] == [
+        pd.Timestamp("2025-04-23 12:59"), pd.Timestamp("2025-04-23 12:59:30"), pd.Timestamp("2025-04-24"),
+    ]
+    assert typed["post_datetime"].isna().tolist() == [True, False, False, False, True]
@@ -0,0 +1,145 @@
+import json
+import os
+from collections import Counter
+
+import pytest
+
+from conftest import add_inputs
+from eews_analysis import config
+from eews_analysis.checkpoint import list_shards, read_shard
+from eews_analysis.deadletter import DeadLetterQueue
+from eews_analysis.local import FakeCachedContext, FakeModel
+from eews_analysis.manifest import DONE, FAILED, PENDING, InputManifest
+from eews_analysis.process_data import merge_worker_results, process_all_tweets
+from eews_analysis.sharding import merge_workers, worker_dead_letters_prefix
+from eews_analysis.workers import owns, worker_spec
+
+
+class InvalidArgument(Exception):
+    pass
+
+
+class RejectingModel(FakeModel):
+    # Fails permanently for the screenshots named in `rejected`.
+
+    def __init__(self, rejected):
+        super().__init__(latency=0.0)
+        self.rejected = set(rejected)
+
+    def generate_content(self, contents, generation_config=None, safety_settings=None):
+        if any(name in str(part) for part in contents for name in self.rejected):
+            raise InvalidArgument("400 unable to process input image")
+        return super().generate_content(contents, generation_config, safety_settings)
+
+
+@pytest.fixture(autouse=True)
+def fast_limiter(monkeypatch):
+    monkeypatch.setattr(config, "REQUESTS_PER_SECOND", 1000.0)
+    monkeypatch.setattr(config, "MAX_REQUESTS_PER_SECOND", 1000.0)
+
+
+def file_names(count):
+    return [f"tweet_{i:04d}.png" for i in range(count)]
+
+
+def run_workers(storage_client, count, model=None):
+    for index in range(count):
+        context = FakeCachedContext(model or FakeModel(latency=0.0), [])
+        process_all_tweets(context=context, storage_client=storage_client, worker=(index, count))
+
+
+def read_results_file(bucket):
+    return json.loads(bucket.blob(os.path.join(config.OUTPUT_PATH, config.RESULTS_FILENAME)).download_as_string())
+
+
+def test_worker_spec():
+    assert worker_spec("2/4") == (2, 4)
+    for text in ("4/4", "-1/4", "0/0", "1", "a/b"):
+        with pytest.raises(ValueError):
+            worker_spec(text)
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5])
+def test_every_file_has_exactly_one_owner(count):
+    owners = Counter(index for name in file_names(200) for index in range(count) if owns(name, (index, count)))
+    assert sum(owners.values()) == 200
+    assert set(owners) == set(range(count))
+
+
+@pytest.mark.parametrize("count", [1, 3])
+def test_workers_extract_each_file_once(storage_client, bucket, count):
+    names = file_names(24)
+    blob_names = add_inputs(bucket, names)
+
+    run_workers(storage_client, count)
+
+    # Workers leave the shared files to the merge.
+    assert not bucket.blob(os.path.join(config.OUTPUT_PATH, config.RESULTS_FILENAME)).exists()
+    shard_names, _ = list_shards(storage_client)
+    extracted = Counter(key for name in shard_names for key in read_shard(bucket, name))
+    assert sorted(extracted) == names
+    assert set(extracted.values()) == {1}
+
+    merge_worker_results(storage_client)
+    assert sorted(read_results_file(bucket)) == names
+    manifest = InputManifest.load(bucket)
+    assert all(manifest.entries[blob_name]["status"] == DONE for blob_name in blob_names)
+
+
+def test_copies_in_both_input_folders_land_on_one_worker(storage_client, bucket):
+    names = file_names(12)
+    add_inputs(bucket, names)
+    add_inputs(bucket, names[:6], folder=config.INPUT_PATH_2)
+
+    run_workers(storage_client, 3)
+
+    shard_names, _ = list_shards(storage_client)
+    extracted = Counter(key for name in shard_names for key in read_shard(bucket, name))
+    assert sorted(extracted) == names
+    assert set(extracted.values()) == {1}
+
+
+def test_merge_folds_worker_dead_letters_and_is_safe_to_rerun(storage_client, bucket):
+    names = file_names(20)
+    blob_names = add_inputs(bucket, names)
+    rejected = names[3]
+
+    run_workers(storage_client, 2, RejectingModel([rejected]))
+    counts = merge_workers(storage_client, bucket)
+    results = read_results_file(bucket)
+    dead_letters = DeadLetterQueue.load(bucket).entries
+
+    assert counts[DONE] == 19 and counts[FAILED] == 1
+    assert sorted(results) == sorted(set(names) - {rejected})
+    assert list(dead_letters) == [blob_names[3]]
+    assert storage_client.list_blobs(config.BUCKET, prefix=worker_dead_letters_prefix()) == []
+
+    # Nothing left to merge: a second run changes nothing.
+    assert merge_workers(storage_client, bucket) == counts
+    assert read_results_file(bucket) == results
+    assert DeadLetterQueue.load(bucket).entries == dead_letters
+    assert InputManifest.load(bucket).entries[blob_names[3]]["status"] == FAILED
+
+
+def test_merge_drops_dead_letters_a_worker_resolved(storage_client, bucket):
+    names = file_names(10)
+    blob_names = add_inputs(bucket, names)
+    rejected = names[0]
+    owner = next(index for index in range(2) if owns(rejected, (index, 2)))
+
+    run_workers(storage_client, 2, RejectingModel([rejected]))
+    merge_workers(storage_client, bucket)
+    assert blob_names[0] in DeadLetterQueue.load(bucket).entries
+
+    # Re-queue it for its owner only; the shared queue still lists it. The
+    # worker's dead-letter file is the whole truth for its partition, so the
+    # merge drops the entry once that worker has extracted the file.
+    manifest = InputManifest.load(bucket)
+    manifest.mark(blob_names[0], PENDING)
+    manifest.save(bucket)
+
+    process_all_tweets(context=FakeCachedContext(FakeModel(latency=0.0), []), storage_client=storage_client,
+                       worker=(owner, 2))
+    merge_workers(storage_client, bucket)
+    assert sorted(read_results_file(bucket)) == names
+    assert DeadLetterQueue.load(bucket).entries == {}
@@ -0,0 +1,75 @@
+import os
+
+import plotly.express as px
+import pytest
+
+from conftest import FlakyBucket, PermissionDenied, ServiceUnavailable
+from eews_analysis import config
+from eews_analysis.local import LocalStorageClient
+from eews_analysis.uploader import ParallelUploader, md5_base64, remote_md5s
+from eews_analysis.visualize import chart_job, render_charts
+
+
+def upload(uploader, path, data):
+    try:
+        return uploader.submit(path, data, "text/html").result()
+    finally:
+        uploader.close()
+
+
+def test_unchanged_objects_are_skipped(bucket):
+    bucket.blob("VIS/same.html").upload_from_string(b"same")
+    bucket.blob("VIS/old.html").upload_from_string(b"old")
+    remote_hashes = remote_md5s(bucket, "VIS/")
+    assert remote_hashes == {"VIS/same.html": md5_base64(b"same"), "VIS/old.html": md5_base64(b"old")}
+
+    uploader = ParallelUploader(bucket, remote_hashes, workers=2)
+    futures = [uploader.submit(path, data, "text/html")
+               for path, data in [("VIS/same.html", b"same"), ("VIS/old.html", b"new"), ("VIS/added.html", b"added")]]
+    uploader.close()
+
+    assert [future.result() for future in futures] == ["skipped", "uploaded", "uploaded"]
+    assert (uploader.uploaded, uploader.uploaded_bytes, uploader.skipped, uploader.skipped_bytes) == (2, 8, 1, 4)
+    assert bucket.blob("VIS/old.html").download_as_string() == b"new"
+
+
+def test_transient_errors_are_retried_with_backoff(bucket):
+    flaky = FlakyBucket(bucket, upload_failures=[ServiceUnavailable("503"), ConnectionError("reset")])
+    sleeps = []
+
+    assert upload(ParallelUploader(flaky, sleep=sleeps.append), "VIS/a.html", b"a") == "uploaded"
+    assert sleeps == [config.UPLOAD_RETRY_BACKOFF_SECONDS, config.UPLOAD_RETRY_BACKOFF_SECONDS * 2]
+    assert bucket.blob("VIS/a.html").download_as_string() == b"a"
+
+
+def test_retries_give_up_after_the_cap(bucket, monkeypatch):
+    monkeypatch.setattr(config, "UPLOAD_MAX_RETRIES", 2)
+    flaky = FlakyBucket(bucket, upload_failures=[ServiceUnavailable("503")] * 5)
+    uploader = ParallelUploader(flaky, sleep=lambda seconds: None)
+
+    with pytest.raises(ServiceUnavailable):
+        upload(uploader, "VIS/a.html", b"a")
+    assert uploader.retries == 2
+    assert len(flaky.upload_failures) == 2
+
+
+def test_permanent_errors_are_not_retried(bucket):
+    flaky = FlakyBucket(bucket, upload_failures=[PermissionDenied("403")])
+    sleeps = []
+
+    with pytest.raises(PermissionDenied):
+        upload(ParallelUploader(flaky, sleep=sleeps.append), "VIS/a.html", b"a")
+    assert sleeps == []
+
+
+def test_charts_render_to_a_local_directory(tmp_path):
+    output_dir = str(tmp_path / "charts")
+    target = LocalStorageClient(output_dir).bucket("")
+    jobs = [chart_job(px.bar(x=["a", "b"], y=[1, 2], title="Local Chart"), "Local Chart")]
+
+    assert render_charts(jobs, target, workers=1, location=output_dir) == []
+
+    path = os.path.join(output_dir, config.VISUALIZATION_PATH, "local_chart.html")
+    with open(path, "rb") as f:
+        assert b"Local Chart" in f.read()
+    assert os.path.exists(os.path.join(output_dir, config.VISUALIZATION_PATH, config.CHART_MANIFEST_FILENAME))
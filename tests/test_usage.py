@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+from eews_analysis import context_cache
+from eews_analysis.concurrency import AdaptiveRateLimiter
+from eews_analysis.context_cache import PrefixContext, open_context
+from eews_analysis.local import IMAGE_TOKENS, FakeCachedContext, FakeModel, estimate_tokens
+from eews_analysis.process_data import build_prefix, extract_files
+from eews_analysis.response_cache import ResponseCache
+from eews_analysis.usage import TokenUsage
+
+
+class RecordingModel(FakeModel):
+    def __init__(self, **kwargs):
+        super().__init__(latency=0, **kwargs)
+        self.requests = []
+
+    def generate_content(self, contents, **kwargs):
+        self.requests.append(list(contents))
+        return super().generate_content(contents, **kwargs)
+
+
+def fast_limiter():
+    return AdaptiveRateLimiter(rate=1000, min_rate=1, max_rate=1000, increase_step=1, decrease_factor=0.5)
+
+
+def blob_names(count):
+    return [f"INPUTS_1/{i:03d}.png" for i in range(count)]
+
+
+def test_cached_context_sends_the_prefix_once():
+    model = RecordingModel()
+    prefix = build_prefix()
+    context = FakeCachedContext(model, prefix)
+    usage = TokenUsage()
+
+    results = extract_files(context, blob_names(5), limiter=fast_limiter(), max_in_flight=2, usage=usage)
+
+    assert len(results) == 5
+    # One context served every request, and each request carried only its image.
+    assert [len(contents) for contents in model.requests] == [1] * 5
+    prefix_tokens = estimate_tokens(prefix)
+    summary = usage.summary()
+    assert summary["requests"] == 5
+    assert summary["cached_prompt_tokens"] == 5 * prefix_tokens
+    assert summary["uncached_prompt_tokens"] == 5 * IMAGE_TOKENS
+    assert summary["cached_fraction"] == prefix_tokens / (prefix_tokens + IMAGE_TOKENS)
+
+
+def test_prefix_context_reports_every_prompt_token_as_uncached():
+    model = RecordingModel()
+    prefix = build_prefix()
+    usage = TokenUsage()
+
+    extract_files(PrefixContext(model, prefix), blob_names(3), limiter=fast_limiter(), usage=usage)
+
+    assert all(len(contents) == len(prefix) + 1 for contents in model.requests)
+    summary = usage.summary()
+    assert summary["prompt_tokens"] == 3 * (estimate_tokens(prefix) + IMAGE_TOKENS)
+    assert summary["cached_prompt_tokens"] == 0
+    assert summary["cached_fraction"] == 0.0
+
+
+def test_cache_hits_are_not_counted_as_requests(tmp_path):
+    context = FakeCachedContext(RecordingModel(), build_prefix())
+    cache = ResponseCache(directory=str(tmp_path))
+    names = blob_names(2)
+    hashes = {name: "same image" for name in names}
+    usage = TokenUsage()
+
+    extract_files(context, names, limiter=fast_limiter(), max_in_flight=1, cache=cache, image_hashes=hashes, usage=usage)
+
+    assert usage.requests == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_record_tolerates_missing_usage_metadata():
+    usage = TokenUsage()
+    assert usage.record(SimpleNamespace(text="{}")) == (0, 0, 0)
+    assert usage.record(SimpleNamespace(usage_metadata=SimpleNamespace(prompt_token_count=None))) == (0, 0, 0)
+    assert usage.summary()["requests"] == 2
+    assert TokenUsage().summary()["avg_prompt_tokens"] == 0
+
+
+def test_open_context_falls_back_to_sending_the_prefix(monkeypatch):
+    class CachedContent:
+        @classmethod
+        def create(cls, **kwargs):
+            raise ValueError("cached content is below the minimum token count")
+
+    monkeypatch.setattr(context_cache, "caching", SimpleNamespace(CachedContent=CachedContent))
+    monkeypatch.setattr(context_cache, "GenerativeModel", lambda model_name: RecordingModel())
+
+    context = open_context("model", ["prompt"])
+
+    assert isinstance(context, PrefixContext)
+    context.generate("image")
+    assert context.model.requests == [["prompt", "image"]]
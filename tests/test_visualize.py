@@ -0,0 +1,100 @@
+import os
+
+import plotly.express as px
+import pytest
+
+from eews_analysis import config
+from eews_analysis.visualize import chart_filename, chart_job, render_charts
+
+
+class FailingUploadBucket:
+    def __init__(self, bucket, failing_title):
+        self._bucket = bucket
+        self.failing_name = chart_filename(failing_title, "html")
+
+    def blob(self, name):
+        if name.endswith(self.failing_name):
+            raise ConnectionError("upload refused")
+        return self._bucket.blob(name)
+
+    def list_blobs(self, prefix="", fields=None):
+        return self._bucket.list_blobs(prefix, fields)
+
+
+def figure(title):
+    return px.bar(x=["a", "b"], y=[1, 2], title=title)
+
+
+def uploaded(storage_client):
+    names = [os.path.basename(blob.name) for blob in storage_client.list_blobs(config.BUCKET, prefix=config.VISUALIZATION_PATH)]
+    return sorted(name for name in names if name != config.CHART_MANIFEST_FILENAME)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_failing_chart_does_not_abort_the_pool(storage_client, bucket, workers, monkeypatch):
+    monkeypatch.setattr(config, "UPLOAD_RETRY_BACKOFF_SECONDS", 0)
+    jobs = [
+        chart_job(figure("First Chart"), "First Chart"),
+        ("Broken Chart", "html", "{not a figure"),
+        chart_job(figure("Odd Format"), "Odd Format", file_type="svg"),
+        chart_job(figure("Upload Fails"), "Upload Fails"),
+        chart_job(figure("Last Chart"), "Last Chart"),
+    ]
+
+    failures = render_charts(jobs, FailingUploadBucket(bucket, "Upload Fails"), workers=workers)
+
+    assert sorted(failures) == ["Broken Chart", "Odd Format", "Upload Fails"]
+    assert uploaded(storage_client) == ["first_chart.html", "last_chart.html"]
+    html = bucket.blob(os.path.join(config.VISUALIZATION_PATH, "last_chart.html")).download_as_string()
+    assert b"Last Chart" in html
+
+
+class RecordingBucket:
+    def __init__(self, bucket):
+        self._bucket = bucket
+        self.uploads = []
+
+    def blob(self, name):
+        if not name.endswith(config.CHART_MANIFEST_FILENAME):
+            self.uploads.append(os.path.basename(name))
+        return self._bucket.blob(name)
+
+    def list_blobs(self, prefix="", fields=None):
+        return self._bucket.list_blobs(prefix, fields)
+
+
+def render(bucket, jobs, force=False):
+    recording = RecordingBucket(bucket)
+    failures = render_charts(jobs, recording, workers=1, force=force)
+    return sorted(recording.uploads), failures
+
+
+def test_unchanged_charts_are_skipped(bucket):
+    jobs = [chart_job(figure("First Chart"), "First Chart"), chart_job(figure("Second Chart"), "Second Chart")]
+    assert render(bucket, jobs) == (["first_chart.html", "second_chart.html"], [])
+
+    assert render(bucket, jobs) == ([], [])
+
+    changed = px.bar(x=["a", "b"], y=[1, 3], title="Second Chart")
+    jobs[1] = chart_job(changed, "Second Chart")
+    assert render(bucket, jobs) == (["second_chart.html"], [])
+
+
+def test_force_rerenders_every_chart(bucket):
+    jobs = [chart_job(figure("First Chart"), "First Chart"), chart_job(figure("Second Chart"), "Second Chart")]
+    render(bucket, jobs)
+    bucket.blob(os.path.join(config.VISUALIZATION_PATH, "first_chart.html")).upload_from_string("edited by hand")
+
+    # The manifest alone would skip both; forced charts are rendered again and
+    # only output that differs from the remote copy is uploaded.
+    assert render(bucket, jobs) == ([], [])
+    assert render(bucket, jobs, force=True) == (["first_chart.html"], [])
+    assert render(bucket, jobs) == ([], [])
+
+
+def test_failed_chart_is_retried_on_the_next_run(bucket):
+    good = chart_job(figure("Good Chart"), "Good Chart")
+    assert render(bucket, [good, ("Broken Chart", "html", "{not a figure")]) == (["good_chart.html"], ["Broken Chart"])
+
+    fixed = chart_job(figure("Broken Chart"), "Broken Chart")
+    assert render(bucket, [good, fixed]) == (["broken_chart.html"], [])